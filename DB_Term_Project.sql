@@ -26,6 +26,10 @@ ALTER USER db_superuser CREATEDB;
 CREATE USER db_manager WITH PASSWORD 'manager1234'; -- 관리자 (개인정보 보호 적용)
 CREATE USER db_resident WITH PASSWORD 'resident1234'; -- 통합 사용자 (로그인용)
 
+-- 역할별 문장 실행 시간 제한 (폭주하는 ILIKE 검색 등이 워커를 붙잡고 있지 못하도록)
+ALTER ROLE db_resident SET statement_timeout = '5s';
+ALTER ROLE db_manager SET statement_timeout = '30s'; -- 파티션 보관 등 배치 작업 포함
+
 -- (B) 추상 역할 (로그인 불가, 권한 그룹핑용)
 CREATE ROLE db_owner;            -- 📦 물품 소유자 역할
 CREATE ROLE db_borrower;         -- 🙋 대여 희망자 역할
@@ -40,41 +44,85 @@ CREATE DATABASE "DB_Term_Project" OWNER db_superuser;
 
 -- 4. [테이블 생성] Schema Creation
 
+-- (0) 단지 테이블 (Complexes) - 여러 아파트 단지를 하나의 플랫폼에서 운영 (Multi-Tenancy)
+-- 모든 테이블에 complex_id를 두고, 행 수준 보안(RLS)으로 현재 접속의 단지 행만 보이게 합니다.
+-- complex_id는 단지 그룹을 다른 Postgres 인스턴스(샤드)로 옮겨도 겹치지 않도록 운영자가 직접 부여합니다.
+-- (단지 -> 샤드 배치는 app.py의 COMPLEX_SHARDS)
+CREATE TABLE Complexes (
+    complex_id INTEGER PRIMARY KEY,
+    name VARCHAR(100) NOT NULL
+);
+
+-- 현재 접속의 단지 ID (app.py가 접속 시 options='-c app.complex_id=N'으로 지정, 미지정이면 NULL -> 아무 행도 안 보임)
+CREATE OR REPLACE FUNCTION current_complex_id()
+RETURNS INT LANGUAGE sql STABLE AS $$
+    SELECT NULLIF(current_setting('app.complex_id', true), '')::int
+$$;
+
 -- (1) 주민 테이블 (Residents)
+-- [Update] 아이디/전화번호는 단지 안에서만 유일
 CREATE TABLE Residents (
     resident_id SERIAL PRIMARY KEY,
-    user_id VARCHAR(50) UNIQUE NOT NULL,
+    user_id VARCHAR(50) NOT NULL,
     password VARCHAR(200) NOT NULL,
     name VARCHAR(50) NOT NULL,
-    phone_number VARCHAR(20) UNIQUE NOT NULL,
+    phone_number VARCHAR(20) NOT NULL,
     building VARCHAR(10) NOT NULL,
     unit VARCHAR(10) NOT NULL,
     points INTEGER DEFAULT 10000 CHECK (points >= 0),
     status VARCHAR(20) DEFAULT 'pending' 
         CHECK (status IN ('pending', 'approved', 'rejected')),
     is_manager BOOLEAN DEFAULT FALSE,
-    is_delivery_banned BOOLEAN DEFAULT FALSE -- [New] 배송 알바 활동 정지 여부
+    is_delivery_banned BOOLEAN DEFAULT FALSE, -- [New] 배송 알바 활동 정지 여부
+    complex_id INTEGER NOT NULL DEFAULT current_complex_id() REFERENCES Complexes(complex_id),
+    CONSTRAINT residents_user_id_key UNIQUE (complex_id, user_id),
+    CONSTRAINT residents_phone_number_key UNIQUE (complex_id, phone_number)
+);
+
+-- (1-1) 물품 카테고리 (Categories) - 모든 단지 공용 분류표
+-- 물품/연체료 정책의 category는 이 표의 이름을 참조합니다. (화면의 카테고리 목록도 이 표에서 읽음)
+CREATE TABLE Categories (
+    category_id SERIAL PRIMARY KEY,
+    name VARCHAR(50) NOT NULL UNIQUE,
+    icon VARCHAR(10) NOT NULL DEFAULT '',
+    sort_order SMALLINT NOT NULL DEFAULT 0
 );
 
+INSERT INTO Categories (name, icon, sort_order) VALUES
+    ('공구/수리', '🔧', 1), ('캠핑/레저', '⛺', 2), ('육아/장난감', '🧸', 3), ('주방/생활', '🍳', 4),
+    ('전자기기', '💻', 5), ('도서/취미', '📚', 6), ('기타', '🎸', 7);
+
 -- (2) 물품 테이블 (Items)
 -- [Update] 상태값 추가: disputed(분쟁), withdrawn(철회), expired(만료)
 CREATE TABLE Items (
     item_id SERIAL PRIMARY KEY,
     owner_id INTEGER NOT NULL,
     name VARCHAR(100) NOT NULL,
-    category VARCHAR(50),
+    category VARCHAR(50) REFERENCES Categories(name) ON UPDATE CASCADE,
     description TEXT,
     rent_fee INTEGER DEFAULT 0 CHECK (rent_fee >= 0),
     expiration_date DATE DEFAULT '9999-12-31',
     status VARCHAR(20) DEFAULT 'available' 
         CHECK (status IN ('available', 'rented', 'pending', 'under_repair', 'disputed', 'withdrawn', 'expired')),
+    late_fee_per_day INTEGER CHECK (late_fee_per_day >= 0), -- [New] 1일 연체료 (NULL이면 카테고리 정책 -> 1일 대여료 순으로 적용)
+    complex_id INTEGER NOT NULL DEFAULT current_complex_id() REFERENCES Complexes(complex_id),
+    cover_photo CHAR(64), -- [New] 대표 사진의 SHA-256 (목록 화면은 이 값으로 썸네일 URL을 만들어 사진마다 조회하지 않음)
     CONSTRAINT fk_owner FOREIGN KEY (owner_id) REFERENCES Residents(resident_id) ON DELETE CASCADE
 );
 
+-- 단지 선두(tenant-leading) 인덱스: 큰 단지의 행이 다른 단지 조회 범위에 섞이지 않도록
+CREATE INDEX idx_items_complex_status ON Items (complex_id, status, item_id);
+-- 카탈로그 카테고리 필터 (대여 가능한 물품만)
+CREATE INDEX idx_items_available_category ON Items (complex_id, category, item_id) WHERE status = 'available';
+-- 소유자별 물품 (내 물건 목록, 소유자 이력/분쟁 검색의 시작점)
+CREATE INDEX idx_items_owner ON Items (complex_id, owner_id);
+
 -- (3) 대여 테이블 (Rentals)
 -- [Update] 배송 및 반납 프로세스를 위한 상세 상태값 적용
+-- [Update] 대여 시작일(start_date) 기준 월별 범위 파티셔닝
+--          -> 파티션 키가 PK에 포함되어야 하므로 PK는 (rental_id, start_date)
 CREATE TABLE Rentals (
-    rental_id SERIAL PRIMARY KEY,
+    rental_id SERIAL,
     item_id INTEGER NOT NULL,
     borrower_id INTEGER NOT NULL,
     start_date DATE NOT NULL,
@@ -97,36 +145,1189 @@ CREATE TABLE Rentals (
             'arrived',          -- 도착 (최종 확인 대기)
             'completed'         -- 배송 완료 (정산 끝)
         )),
+
+    -- [New] 연체료 정산 (late_fee_through: 연체료를 부과한 마지막 날짜 = 증분 처리 워터마크)
+    late_fee_accrued INTEGER DEFAULT 0 CHECK (late_fee_accrued >= 0),
+    late_fee_through DATE,
+
+    complex_id INTEGER NOT NULL DEFAULT current_complex_id() REFERENCES Complexes(complex_id),
         
+    PRIMARY KEY (rental_id, start_date),
     CONSTRAINT fk_item FOREIGN KEY (item_id) REFERENCES Items(item_id) ON DELETE CASCADE,
     CONSTRAINT fk_borrower FOREIGN KEY (borrower_id) REFERENCES Residents(resident_id) ON DELETE CASCADE,
     CONSTRAINT fk_partner FOREIGN KEY (delivery_partner_id) REFERENCES Residents(resident_id) ON DELETE SET NULL
-);
+) PARTITION BY RANGE (start_date);
+
+-- 진행 중인 대여만 담는 부분 인덱스 (연체 처리, 배송 시장 등 대시보드 쿼리가 종료된 행을 읽지 않도록)
+CREATE INDEX idx_rentals_open ON Rentals (complex_id, status, delivery_status) WHERE status NOT IN ('returned', 'rejected');
+CREATE INDEX idx_rentals_borrower ON Rentals (complex_id, borrower_id);
+CREATE INDEX idx_rentals_item ON Rentals (item_id);
+-- 기사별 배송 이력 검색 (배정된 적 있는 대여만)
+CREATE INDEX idx_rentals_partner ON Rentals (complex_id, delivery_partner_id) WHERE delivery_partner_id IS NOT NULL;
 
 -- (4) 분쟁 테이블 (Disputes)
+-- [Update] 대여 건과 같은 파티션에 위치하도록 대여 시작일(rental_start_date)로 파티셔닝
 CREATE TABLE Disputes (
-    dispute_id SERIAL PRIMARY KEY,
-    rental_id INTEGER UNIQUE NOT NULL,
+    dispute_id SERIAL,
+    rental_id INTEGER NOT NULL,
+    rental_start_date DATE NOT NULL,
     manager_id INTEGER,
     reason TEXT NOT NULL,
     status VARCHAR(20) DEFAULT 'open' CHECK (status IN ('open', 'resolved')),
     resolution TEXT,
     compensation_amount INTEGER DEFAULT 0 CHECK (compensation_amount >= 0),
-    CONSTRAINT fk_rental FOREIGN KEY (rental_id) REFERENCES Rentals(rental_id) ON DELETE CASCADE,
+    complex_id INTEGER NOT NULL DEFAULT current_complex_id() REFERENCES Complexes(complex_id),
+    PRIMARY KEY (dispute_id, rental_start_date),
+    CONSTRAINT uq_dispute_rental UNIQUE (rental_id, rental_start_date),
+    CONSTRAINT fk_rental FOREIGN KEY (rental_id, rental_start_date) REFERENCES Rentals(rental_id, start_date) ON DELETE CASCADE,
     CONSTRAINT fk_manager FOREIGN KEY (manager_id) REFERENCES Residents(resident_id) ON DELETE SET NULL
+) PARTITION BY RANGE (rental_start_date);
+
+CREATE INDEX idx_disputes_complex_status ON Disputes (complex_id, status);
+
+-- 범위를 벗어난 행을 받아주는 기본 파티션 (정상 운영 시에는 비어 있어야 함)
+CREATE TABLE rentals_default PARTITION OF Rentals DEFAULT;
+CREATE TABLE disputes_default PARTITION OF Disputes DEFAULT;
+
+-- (5) 파티션 관리 (Hot / Archive)
+-- 분리(DETACH)된 과거 파티션을 보관하는 스키마
+CREATE SCHEMA archive;
+
+-- 월별 파티션 생성: p_from 월부터 (이번 달 + p_months_ahead) 월까지 없는 파티션을 만듭니다.
+-- 범위 밖 날짜(과거 이력 적재, 먼 미래 예약)로 기본 파티션에 들어간 행이 있으면 그 월의 파티션도 만들고,
+-- 기본 파티션의 행을 새 테이블로 옮긴 뒤 붙입니다. (기본 파티션에 같은 범위의 행이 남아 있으면 파티션을 만들 수 없음)
+-- 이미 archive로 분리된 월의 행은 옮길 곳이 없으므로 기본 파티션에 남습니다.
+CREATE OR REPLACE FUNCTION ensure_rental_partitions(p_from DATE, p_months_ahead INT DEFAULT 3)
+RETURNS INT LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+DECLARE
+    last_m DATE := (date_trunc('month', CURRENT_DATE) + make_interval(months => p_months_ahead))::date;
+    m DATE;
+    next_m DATE;
+    suffix TEXT;
+    created INT := 0;
+BEGIN
+    FOR m IN
+        SELECT generate_series(date_trunc('month', p_from), last_m, interval '1 month')::date
+        UNION
+        SELECT DISTINCT date_trunc('month', start_date)::date FROM public.rentals_default
+        ORDER BY 1
+    LOOP
+        suffix := to_char(m, 'YYYY_MM');
+        next_m := (m + interval '1 month')::date;
+        CONTINUE WHEN to_regclass('public.rentals_' || suffix) IS NOT NULL
+                   OR to_regclass('archive.rentals_' || suffix) IS NOT NULL;
+
+        IF EXISTS (SELECT 1 FROM public.rentals_default WHERE start_date >= m AND start_date < next_m) THEN
+            -- 부모와 같은 모양의 일반 테이블로 옮겨 담고 붙임 (분쟁이 대여를 참조하므로 분쟁부터 빼고, 대여부터 붙임)
+            EXECUTE format('CREATE TABLE public.rentals_%s (LIKE Rentals INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', suffix);
+            EXECUTE format('CREATE TABLE public.disputes_%s (LIKE Disputes INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', suffix);
+            EXECUTE format('WITH moved AS (DELETE FROM public.disputes_default WHERE rental_start_date >= %L AND rental_start_date < %L RETURNING *)
+                            INSERT INTO public.disputes_%s SELECT * FROM moved', m, next_m, suffix);
+            EXECUTE format('WITH moved AS (DELETE FROM public.rentals_default WHERE start_date >= %L AND start_date < %L RETURNING *)
+                            INSERT INTO public.rentals_%s SELECT * FROM moved', m, next_m, suffix);
+            EXECUTE format('ALTER TABLE Rentals ATTACH PARTITION public.rentals_%s FOR VALUES FROM (%L) TO (%L)', suffix, m, next_m);
+            EXECUTE format('ALTER TABLE Disputes ATTACH PARTITION public.disputes_%s FOR VALUES FROM (%L) TO (%L)', suffix, m, next_m);
+        ELSE
+            EXECUTE format('CREATE TABLE public.rentals_%s PARTITION OF Rentals FOR VALUES FROM (%L) TO (%L)', suffix, m, next_m);
+            EXECUTE format('CREATE TABLE public.disputes_%s PARTITION OF Disputes FOR VALUES FROM (%L) TO (%L)', suffix, m, next_m);
+        END IF;
+        created := created + 1;
+    END LOOP;
+    RETURN created;
+END $$;
+
+-- 이력 조회용 뷰 재생성: 현재(Hot) 테이블 + archive 스키마의 분리된 파티션을 UNION ALL
+-- 부모 테이블에 나중에 추가된 컬럼은 과거 파티션에 없을 수 있으므로 NULL로 채웁니다.
+CREATE OR REPLACE FUNCTION refresh_history_views()
+RETURNS VOID LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+DECLARE
+    v RECORD;
+    t RECORD;
+    sql TEXT;
+BEGIN
+    FOR v IN SELECT * FROM (VALUES ('rentals_history', 'rentals'), ('disputes_history', 'disputes')) AS x(view_name, base) LOOP
+        sql := format('SELECT * FROM public.%I', v.base);
+        FOR t IN
+            SELECT c.oid, c.relname FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = 'archive' AND c.relkind = 'r' AND c.relname ~ ('^' || v.base || '_\d{4}_\d{2}$')
+            ORDER BY c.relname
+        LOOP
+            sql := sql || ' UNION ALL SELECT ' || (
+                SELECT string_agg(
+                           CASE WHEN EXISTS (SELECT 1 FROM pg_attribute a2
+                                             WHERE a2.attrelid = t.oid AND a2.attname = a.attname AND NOT a2.attisdropped)
+                                THEN quote_ident(a.attname)
+                                ELSE format('NULL::%s AS %I', format_type(a.atttypid, a.atttypmod), a.attname) END,
+                           ', ' ORDER BY a.attnum)
+                FROM pg_attribute a
+                WHERE a.attrelid = ('public.' || v.base)::regclass AND a.attnum > 0 AND NOT a.attisdropped
+            ) || format(' FROM archive.%I', t.relname);
+        END LOOP;
+        -- 현재 접속 단지의 행만 (뷰는 RLS를 거치지 않음)
+        EXECUTE format('CREATE OR REPLACE VIEW public.%I AS SELECT * FROM (%s) h WHERE complex_id = current_complex_id()',
+                       v.view_name, sql);
+    END LOOP;
+END $$;
+
+-- 보관 기간(p_keep_months)이 지난 월 파티션 중 모든 대여가 종료(returned/rejected)되고
+-- 열린 분쟁이 없는 파티션을 분리하여 archive 스키마로 옮깁니다. (Hot 작업 집합 축소)
+CREATE OR REPLACE FUNCTION archive_cold_rental_partitions(p_keep_months INT DEFAULT 12)
+RETURNS SETOF TEXT LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+DECLARE
+    cutoff DATE := (date_trunc('month', CURRENT_DATE) - make_interval(months => p_keep_months))::date;
+    part RECORD;
+    suffix TEXT;
+    busy BOOLEAN;
+    fk RECORD;
+BEGIN
+    FOR part IN
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'public.rentals'::regclass AND c.relname ~ '^rentals_\d{4}_\d{2}$'
+        ORDER BY c.relname
+    LOOP
+        suffix := substr(part.relname, length('rentals_') + 1);
+        -- 파티션 범위 [월초, 다음 월초)가 보관 기준일 이전에 끝나야 Cold
+        CONTINUE WHEN (to_date(suffix, 'YYYY_MM') + interval '1 month')::date > cutoff;
+
+        EXECUTE format('SELECT EXISTS (SELECT 1 FROM public.%I WHERE status NOT IN (''returned'', ''rejected''))', part.relname)
+            INTO busy;
+        CONTINUE WHEN busy;
+        EXECUTE format('SELECT EXISTS (SELECT 1 FROM public.%I WHERE status <> ''resolved'')', 'disputes_' || suffix)
+            INTO busy;
+        CONTINUE WHEN busy;
+
+        -- 참조하는 쪽(Disputes)부터 분리하고, 부모 Rentals를 가리키던 FK는 보관 테이블끼리의 FK로 교체
+        EXECUTE format('ALTER TABLE Disputes DETACH PARTITION public.%I', 'disputes_' || suffix);
+        FOR fk IN
+            SELECT conname FROM pg_constraint
+            WHERE conrelid = ('public.disputes_' || suffix)::regclass AND contype = 'f'
+              AND confrelid = 'public.rentals'::regclass
+        LOOP
+            EXECUTE format('ALTER TABLE public.%I DROP CONSTRAINT %I', 'disputes_' || suffix, fk.conname);
+        END LOOP;
+        EXECUTE format('ALTER TABLE Rentals DETACH PARTITION public.%I', part.relname);
+
+        EXECUTE format('ALTER TABLE public.%I SET SCHEMA archive', part.relname);
+        EXECUTE format('ALTER TABLE public.%I SET SCHEMA archive', 'disputes_' || suffix);
+        EXECUTE format('ALTER TABLE archive.%I ADD FOREIGN KEY (rental_id, rental_start_date) REFERENCES archive.%I (rental_id, start_date)',
+                       'disputes_' || suffix, part.relname);
+        RETURN NEXT part.relname;
+    END LOOP;
+
+    PERFORM refresh_history_views();
+END $$;
+
+-- 올해 1월부터 3개월 뒤까지의 파티션 생성
+SELECT ensure_rental_partitions(date_trunc('year', CURRENT_DATE)::date, 3);
+
+-- (6) 알림 Outbox (Transactional Outbox)
+-- 상태 전이와 같은 트랜잭션 안에서 알림을 한 행 INSERT만 해두고, 실제 발송은 별도 워커(notification_worker.py)가
+-- 배치로 가져가 처리합니다. -> 요청 처리 경로에 발송 지연이 생기지 않고, 롤백된 전이는 알림도 함께 사라집니다.
+CREATE TABLE Notification_Outbox (
+    outbox_id BIGSERIAL PRIMARY KEY,
+    recipient_id INTEGER NOT NULL,
+    event_type VARCHAR(30) NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}',
+    status VARCHAR(10) DEFAULT 'pending' CHECK (status IN ('pending', 'sent', 'failed')),
+    attempts INTEGER DEFAULT 0,
+    next_attempt_at TIMESTAMPTZ DEFAULT now(), -- 재시도 백오프 시각
+    last_error TEXT,
+    created_at TIMESTAMPTZ DEFAULT now(),
+    sent_at TIMESTAMPTZ,
+    complex_id INTEGER NOT NULL DEFAULT current_complex_id() REFERENCES Complexes(complex_id),
+    CONSTRAINT fk_recipient FOREIGN KEY (recipient_id) REFERENCES Residents(resident_id) ON DELETE CASCADE
+);
+
+-- 워커는 발송 대기 중인 행만 읽음
+CREATE INDEX idx_outbox_pending ON Notification_Outbox (complex_id, next_attempt_at) WHERE status = 'pending';
+
+-- 대여 건 관련 알림 적재: p_recipients = 'borrower' | 'owner' | 'both' (행위자 본인에게는 보내지 않음)
+CREATE OR REPLACE FUNCTION notify_rental_event(p_rental_id INT, p_event TEXT, p_recipients TEXT,
+                                               p_actor_id INT, p_extra JSONB DEFAULT '{}')
+RETURNS VOID LANGUAGE sql AS $$
+    INSERT INTO Notification_Outbox (recipient_id, event_type, payload)
+    SELECT x.recipient_id, p_event,
+           jsonb_build_object('rental_id', r.rental_id, 'item_name', i.name) || p_extra
+      FROM Rentals r
+      JOIN Items i ON r.item_id = i.item_id
+     CROSS JOIN LATERAL (VALUES (r.borrower_id, 'borrower'), (i.owner_id, 'owner')) AS x(recipient_id, party)
+     WHERE r.rental_id = p_rental_id
+       AND p_recipients IN ('both', x.party)
+       AND x.recipient_id IS DISTINCT FROM p_actor_id
+$$;
+
+-- (7) 대여 생명주기 함수 (Server-side Transition)
+-- 조회 -> 검증(소유권/상태) -> 포인트 정산 -> 상태 변경을 한 번의 호출로 처리합니다.
+-- 대상 대여/물품 행을 FOR UPDATE로 먼저 잠그므로, 동시에 들어온 요청은 순서대로 처리되고
+-- 네트워크 왕복 동안 잠금을 쥐고 있지 않습니다. 검증 실패는 RAISE EXCEPTION(P0001)으로 알립니다.
+-- 포인트가 오가는 주민 행은 lock_residents()로 항상 resident_id 순서로 잠근 뒤 잔액을 확인하므로,
+-- 두 정산이 서로의 행을 반대 순서로 기다리는 교착이 생기지 않고 잔액 부족은 CHECK 위반 대신 안내 메시지로 알립니다.
+-- (그래도 남는 교착/직렬화 실패는 app.run_transition()이 트랜잭션을 처음부터 다시 실행)
+
+-- 배송비 금고 (Escrow): 대여 건마다 보관액 행을 따로 둡니다.
+-- 배송비는 대여자가 결제할 때 그 대여 건의 보관액으로 들어갔다가 기사에게 지급될 때 빠져나갑니다.
+-- 정산 함수는 어차피 대여 행을 FOR UPDATE로 잠그므로, 보관액 행도 그 대여 건의 요청끼리만 경쟁합니다.
+-- (단지 전체의 금고 잔액은 View_Escrow_Balance에서 합산해 읽음)
+CREATE TABLE Escrow_Holdings (
+    rental_id INTEGER PRIMARY KEY,
+    amount INTEGER NOT NULL DEFAULT 0 CHECK (amount >= 0),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    complex_id INTEGER NOT NULL DEFAULT current_complex_id() REFERENCES Complexes(complex_id)
+);
+
+-- 아직 지급되지 않은 보관액만 (관리자 화면 합산, 대사)
+CREATE INDEX idx_escrow_holdings_held ON Escrow_Holdings (complex_id) WHERE amount > 0;
+
+-- 금고 입금: 대여 건의 보관액 증가 (처음이면 행 생성)
+CREATE OR REPLACE FUNCTION escrow_deposit(p_rental_id INT, p_amount INT)
+RETURNS VOID LANGUAGE sql AS $$
+    INSERT INTO Escrow_Holdings (rental_id, amount) VALUES (p_rental_id, p_amount)
+    ON CONFLICT (rental_id) DO UPDATE
+       SET amount = Escrow_Holdings.amount + EXCLUDED.amount, updated_at = now()
+$$;
+
+-- 금고 지급: 대여 건의 보관액에서 p_payee에게 지급 (보관액이 모자라면 예외)
+CREATE OR REPLACE FUNCTION escrow_release(p_rental_id INT, p_amount INT, p_payee INT)
+RETURNS VOID LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE Escrow_Holdings SET amount = amount - p_amount, updated_at = now()
+     WHERE rental_id = p_rental_id AND amount >= p_amount;
+    IF NOT FOUND THEN RAISE EXCEPTION '금고에 이 대여 건의 배송비가 없어 정산할 수 없습니다.'; END IF;
+    UPDATE Residents SET points = points + p_amount WHERE resident_id = p_payee;
+END $$;
+
+-- 정산 당사자 주민 행 잠금 (NULL은 무시, 항상 resident_id 순서)
+CREATE OR REPLACE FUNCTION lock_residents(p_ids INT[])
+RETURNS VOID LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM 1 FROM Residents WHERE resident_id = ANY(p_ids) ORDER BY resident_id FOR UPDATE;
+END $$;
+
+-- 대여 승인: 대여자 결제(대여료 -> 소유자, 배송비 -> 금고), 물품 잠금, 경쟁 요청은 거절 후 대기열로 이동
+-- 반환값: 소유자에게 입금된 대여료
+CREATE OR REPLACE FUNCTION approve_rental(p_rental_id INT, p_actor_id INT)
+RETURNS INT LANGUAGE plpgsql AS $$
+DECLARE
+    v RECORD;
+    v_rent_total INT;
+    v_points INT;
+BEGIN
+    -- 같은 물품의 경쟁 신청을 동시에 승인하면 물품 행을 먼저 잠근 쪽만 진행하고, 다른 쪽은 기다렸다가 바뀐 상태를 봄
+    -- (아래 조인 FOR UPDATE의 행 잠금 순서를 실행 계획에 맡기지 않음: 대여 행부터 잠그면 자동 거절이 상대의 대여 행을 기다려 교착)
+    PERFORM 1 FROM Items WHERE item_id = (SELECT item_id FROM Rentals WHERE rental_id = p_rental_id) FOR UPDATE;
+
+    SELECT r.borrower_id, i.owner_id, i.rent_fee, r.start_date, r.end_date, r.delivery_fee,
+           r.item_id, r.status, i.status AS item_status
+      INTO v
+      FROM Rentals r JOIN Items i ON r.item_id = i.item_id
+     WHERE r.rental_id = p_rental_id
+       FOR UPDATE;
+
+    IF NOT FOUND THEN RAISE EXCEPTION '데이터 없음'; END IF;
+    IF v.owner_id <> p_actor_id THEN RAISE EXCEPTION '권한 없음'; END IF;
+    IF v.status <> 'requested' THEN RAISE EXCEPTION '이미 처리된 요청입니다. (현재 상태: %)', v.status; END IF;
+    IF v.item_status <> 'available' THEN RAISE EXCEPTION '물품이 대여 가능한 상태가 아닙니다. (현재 상태: %)', v.item_status; END IF;
+
+    v_rent_total := (v.end_date - v.start_date + 1) * v.rent_fee;
+
+    PERFORM lock_residents(ARRAY[v.borrower_id, v.owner_id]);
+    SELECT points INTO v_points FROM Residents WHERE resident_id = v.borrower_id;
+    IF v_points < v_rent_total + v.delivery_fee THEN
+        RAISE EXCEPTION '대여자의 포인트가 부족합니다. (필요 %P, 잔액 %P)', v_rent_total + v.delivery_fee, v_points;
+    END IF;
+
+    -- 포인트 정산 (대여자 -> 소유자 & 금고)
+    UPDATE Residents SET points = points - (v_rent_total + v.delivery_fee) WHERE resident_id = v.borrower_id;
+    IF v_rent_total > 0 THEN
+        UPDATE Residents SET points = points + v_rent_total WHERE resident_id = v.owner_id;
+    END IF;
+    IF v.delivery_fee > 0 THEN
+        PERFORM escrow_deposit(p_rental_id, v.delivery_fee);
+    END IF;
+
+    -- 승인 + 배송 상태 설정 (직거래면 대여자 본인을 배송 기사로 지정)
+    UPDATE Rentals
+       SET status = 'approved',
+           delivery_status = CASE WHEN v.delivery_fee > 0 THEN 'waiting_driver' ELSE 'accepted' END,
+           delivery_partner_id = CASE WHEN v.delivery_fee > 0 THEN delivery_partner_id ELSE v.borrower_id END
+     WHERE rental_id = p_rental_id;
+
+    UPDATE Items SET status = 'rented' WHERE item_id = v.item_id;
+
+    -- 동시 요청 자동 거절 (Auto-Reject) -> 신청 순서대로 대기열에 넣어 반납 시 차례대로 자동 신청
+    WITH rejected AS (
+        UPDATE Rentals SET status = 'rejected'
+         WHERE item_id = v.item_id AND status = 'requested' AND rental_id <> p_rental_id
+        RETURNING rental_id, borrower_id, end_date - start_date + 1 AS days, delivery_option
+    )
+    INSERT INTO Waitlist (item_id, resident_id, days, delivery_option)
+    SELECT v.item_id, borrower_id, days, COALESCE(delivery_option, 'pickup') FROM rejected ORDER BY rental_id
+    ON CONFLICT DO NOTHING;
+
+    PERFORM notify_rental_event(p_rental_id, 'rental_approved', 'borrower', p_actor_id);
+
+    RETURN v_rent_total;
+END $$;
+
+-- 배송 완료: 반납 배송이면 '도착' 처리, 대여 배송이면 금고 -> 기사 배송비 지급 후 대여 시작
+-- 반환값: (결과 'arrived' | 'completed', 지급된 배송비)
+CREATE OR REPLACE FUNCTION complete_delivery(p_rental_id INT, p_actor_id INT,
+                                             OUT outcome TEXT, OUT paid_fee INT)
+LANGUAGE plpgsql AS $$
+DECLARE
+    v RECORD;
+BEGIN
+    SELECT status, delivery_status, delivery_partner_id, delivery_fee
+      INTO v
+      FROM Rentals WHERE rental_id = p_rental_id
+       FOR UPDATE;
+
+    IF NOT FOUND THEN RAISE EXCEPTION '정보 없음'; END IF;
+    IF v.delivery_partner_id IS DISTINCT FROM p_actor_id THEN RAISE EXCEPTION '권한 없음'; END IF;
+    IF v.delivery_status <> 'picked_up' THEN RAISE EXCEPTION '픽업한 배송만 완료할 수 있습니다. (현재 상태: %)', v.delivery_status; END IF;
+
+    paid_fee := 0;
+    IF v.status IN ('rented', 'overdue') THEN
+        -- 반납하러 가는 배송: 소유자의 최종 확인을 기다림
+        UPDATE Rentals SET delivery_status = 'arrived' WHERE rental_id = p_rental_id;
+        outcome := 'arrived';
+        PERFORM notify_rental_event(p_rental_id, 'item_arrived', 'owner', p_actor_id);
+    ELSIF v.status = 'approved' THEN
+        -- 빌리러 가는 배송: 즉시 정산 후 대여 시작
+        IF v.delivery_fee > 0 THEN
+            PERFORM escrow_release(p_rental_id, v.delivery_fee, p_actor_id);
+            paid_fee := v.delivery_fee;
+        END IF;
+        UPDATE Rentals SET delivery_status = 'completed', status = 'rented' WHERE rental_id = p_rental_id;
+        outcome := 'completed';
+        PERFORM notify_rental_event(p_rental_id, 'item_arrived', 'borrower', p_actor_id);
+    ELSE
+        RAISE EXCEPTION '배송을 완료할 수 없는 상태입니다. (현재 상태: %)', v.status;
+    END IF;
+END $$;
+
+-- 배송 취소: 직거래(0원) 건이면 취소자가 500P를 내고 배송 대행으로 전환, 대행 건이면 다시 기사 대기로
+-- 반환값: 'converted' (직거래 -> 배송 대행) | 'released' (기사 대기 목록으로 복귀)
+CREATE OR REPLACE FUNCTION cancel_delivery(p_rental_id INT, p_actor_id INT)
+RETURNS TEXT LANGUAGE plpgsql AS $$
+DECLARE
+    v RECORD;
+    v_points INT;
+BEGIN
+    SELECT delivery_fee, delivery_partner_id, delivery_status
+      INTO v
+      FROM Rentals WHERE rental_id = p_rental_id
+       FOR UPDATE;
+
+    IF NOT FOUND THEN RAISE EXCEPTION '잘못된 접근'; END IF;
+    IF v.delivery_partner_id IS DISTINCT FROM p_actor_id OR v.delivery_status <> 'accepted' THEN
+        RAISE EXCEPTION '취소할 수 없는 상태입니다.';
+    END IF;
+
+    IF v.delivery_fee = 0 THEN
+        SELECT points INTO v_points FROM Residents WHERE resident_id = p_actor_id FOR UPDATE;
+        IF v_points < 500 THEN
+            RAISE EXCEPTION '직거래를 취소하고 배송 대행을 맡기려면 500P가 필요합니다. (잔액 부족)';
+        END IF;
+        -- 배송비 결제 (취소자 -> 금고): 이후 기사에게 지급될 때 금고에서 나갑니다.
+        UPDATE Residents SET points = points - 500 WHERE resident_id = p_actor_id;
+        PERFORM escrow_deposit(p_rental_id, 500);
+
+        UPDATE Rentals
+           SET delivery_partner_id = NULL, delivery_status = 'waiting_driver',
+               delivery_fee = 500, delivery_option = 'delivery'
+         WHERE rental_id = p_rental_id;
+        RETURN 'converted';
+    END IF;
+
+    UPDATE Rentals SET delivery_partner_id = NULL, delivery_status = 'waiting_driver'
+     WHERE rental_id = p_rental_id;
+    RETURN 'released';
+END $$;
+
+-- 반납 신청: 배송 반납이면 대여자가 배송비(500P)를 금고에 결제하고 기사 대기로, 직접 반납이면 대여자 본인이 기사
+-- 반환값: 결제한 배송비
+CREATE OR REPLACE FUNCTION request_return(p_rental_id INT, p_actor_id INT, p_option TEXT)
+RETURNS INT LANGUAGE plpgsql AS $$
+DECLARE
+    v RECORD;
+    v_fee INT := CASE WHEN p_option = 'delivery' THEN 500 ELSE 0 END;
+    v_points INT;
+BEGIN
+    SELECT borrower_id, status, delivery_status
+      INTO v
+      FROM Rentals WHERE rental_id = p_rental_id
+       FOR UPDATE;
+
+    IF NOT FOUND THEN RAISE EXCEPTION '존재하지 않는 대여 건입니다.'; END IF;
+    IF v.borrower_id <> p_actor_id THEN RAISE EXCEPTION '권한 없음'; END IF;
+    IF v.status NOT IN ('rented', 'overdue') THEN
+        RAISE EXCEPTION '이미 반납되었거나 반납할 수 없는 상태입니다. (현재 상태: %)', v.status;
+    END IF;
+    -- 같은 신청이 두 번 들어오면(더블 클릭) 두 번째는 바뀐 배송 상태를 보고 멈춤 (배송비 이중 결제 방지)
+    IF v.delivery_status NOT IN ('pending', 'completed') THEN
+        RAISE EXCEPTION '이미 반납 신청된 대여 건입니다. (배송 상태: %)', v.delivery_status;
+    END IF;
+
+    IF v_fee > 0 THEN
+        SELECT points INTO v_points FROM Residents WHERE resident_id = p_actor_id FOR UPDATE;
+        IF v_points < v_fee THEN
+            RAISE EXCEPTION '잔액이 부족하여 배송 반납을 신청할 수 없습니다.';
+        END IF;
+        -- 대여자 -> 이 대여 건의 금고 보관액 (기사에게 지급될 때 금고에서 나감)
+        UPDATE Residents SET points = points - v_fee WHERE resident_id = p_actor_id;
+        PERFORM escrow_deposit(p_rental_id, v_fee);
+    END IF;
+
+    -- 기존 배송 정보를 반납용으로 덮어쓰기 (직접 반납이면 본인이 기사)
+    UPDATE Rentals
+       SET delivery_option = p_option,
+           delivery_fee = v_fee,
+           delivery_partner_id = CASE WHEN v_fee > 0 THEN NULL ELSE p_actor_id END,
+           delivery_status = CASE WHEN v_fee > 0 THEN 'waiting_driver' ELSE 'accepted' END
+     WHERE rental_id = p_rental_id;
+    RETURN v_fee;
+END $$;
+
+-- 반납 확정: 조기 반납 환불(소유자 -> 대여자), 남은 연체료 정산, 금고 -> 기사 배송비 지급, 물품 재공개
+-- 반환값: (환불 금액, 이 대여 건에 부과된 연체료 누계)
+CREATE OR REPLACE FUNCTION confirm_return(p_rental_id INT, p_actor_id INT,
+                                          OUT refund INT, OUT late_fee INT)
+LANGUAGE plpgsql AS $$
+DECLARE
+    v RECORD;
+BEGIN
+    SELECT r.item_id, r.borrower_id, i.owner_id, i.rent_fee, r.end_date,
+           r.delivery_partner_id, r.delivery_fee, r.status, r.delivery_status
+      INTO v
+      FROM Rentals r JOIN Items i ON r.item_id = i.item_id
+     WHERE r.rental_id = p_rental_id
+       FOR UPDATE;
+
+    IF NOT FOUND THEN RAISE EXCEPTION '데이터 없음'; END IF;
+    IF v.owner_id <> p_actor_id THEN RAISE EXCEPTION '권한 없음'; END IF;
+    IF v.status NOT IN ('rented', 'overdue') OR v.delivery_status <> 'arrived' THEN
+        RAISE EXCEPTION '반납 확정할 수 없는 상태입니다. (대여: %, 배송: %)', v.status, v.delivery_status;
+    END IF;
+
+    PERFORM lock_residents(ARRAY[v.owner_id, v.borrower_id, v.delivery_partner_id]);
+
+    -- (A) 조기 반납 환불 (대여료는 소유자가 돌려줌)
+    refund := 0;
+    IF v.end_date > CURRENT_DATE THEN
+        refund := (v.end_date - CURRENT_DATE) * v.rent_fee;
+        IF refund > (SELECT points FROM Residents WHERE resident_id = v.owner_id) THEN
+            RAISE EXCEPTION '조기 반납 환불액(%P)보다 소유자 포인트가 적어 반납 확정할 수 없습니다.', refund;
+        END IF;
+        IF refund > 0 THEN
+            UPDATE Residents SET points = points - refund WHERE resident_id = v.owner_id;
+            UPDATE Residents SET points = points + refund WHERE resident_id = v.borrower_id;
+        END IF;
+        UPDATE Rentals SET end_date = CURRENT_DATE WHERE rental_id = p_rental_id;
+    END IF;
+
+    -- (A-2) 늦은 반납이면 배치가 아직 부과하지 않은 오늘까지의 연체료를 마저 정산
+    PERFORM accrue_late_fees(CURRENT_DATE, p_rental_id);
+    SELECT late_fee_accrued INTO late_fee FROM Rentals WHERE rental_id = p_rental_id;
+
+    -- (B) 배송비 정산 (금고 -> 기사)
+    IF v.delivery_partner_id IS NOT NULL AND v.delivery_fee > 0 THEN
+        PERFORM escrow_release(p_rental_id, v.delivery_fee, v.delivery_partner_id);
+    END IF;
+
+    -- (C) 상태 업데이트 (정상 종료)
+    UPDATE Rentals SET status = 'returned', delivery_status = 'completed' WHERE rental_id = p_rental_id;
+    UPDATE Items SET status = 'available' WHERE item_id = v.item_id;
+
+    PERFORM notify_rental_event(p_rental_id, 'return_confirmed', 'borrower', p_actor_id,
+                                jsonb_build_object('refund', refund, 'late_fee', late_fee));
+END $$;
+
+-- 분쟁 신고: 분쟁 등록 + 대여/물품 동결, 이미 도착한 배송이면 금고 -> 기사 배송비 지급
+-- 반환값: (새 분쟁 ID - 증거 사진 연결용, 기사 배송비 정산 여부)
+CREATE OR REPLACE FUNCTION report_dispute(p_rental_id INT, p_actor_id INT, p_reason TEXT,
+                                          OUT new_dispute_id INT, OUT driver_paid BOOLEAN)
+LANGUAGE plpgsql AS $$
+DECLARE
+    v RECORD;
+BEGIN
+    SELECT r.item_id, r.start_date, i.owner_id, r.status,
+           r.delivery_partner_id, r.delivery_fee, r.delivery_status
+      INTO v
+      FROM Rentals r JOIN Items i ON r.item_id = i.item_id
+     WHERE r.rental_id = p_rental_id
+       FOR UPDATE;
+
+    IF NOT FOUND THEN RAISE EXCEPTION '데이터 없음'; END IF;
+    IF v.owner_id <> p_actor_id THEN RAISE EXCEPTION '권한 없음'; END IF;
+    IF v.status NOT IN ('rented', 'overdue') THEN
+        RAISE EXCEPTION '분쟁을 신고할 수 없는 상태입니다. (현재 상태: %)', v.status;
+    END IF;
+
+    -- 분쟁 등록 및 상태 잠금 (Disputes는 대여 시작일로 파티셔닝)
+    INSERT INTO Disputes (rental_id, rental_start_date, manager_id, reason, status)
+    VALUES (p_rental_id, v.start_date, NULL, p_reason, 'open')
+    RETURNING dispute_id INTO new_dispute_id;
+
+    UPDATE Rentals SET status = 'disputed' WHERE rental_id = p_rental_id;
+    UPDATE Items SET status = 'disputed' WHERE item_id = v.item_id;
+
+    -- 이미 도착(arrived)한 배송이면 기사 업무는 끝난 것으로 보고 정산
+    IF v.delivery_partner_id IS NOT NULL AND v.delivery_fee > 0 AND v.delivery_status = 'arrived' THEN
+        PERFORM escrow_release(p_rental_id, v.delivery_fee, v.delivery_partner_id);
+        UPDATE Rentals SET delivery_status = 'completed' WHERE rental_id = p_rental_id;
+        driver_paid := TRUE;
+    ELSE
+        driver_paid := FALSE;
+    END IF;
+END $$;
+
+-- (8) 연체료 정산 (Late Fee)
+-- 카테고리별 1일 연체료 정책 (물품에 late_fee_per_day가 지정되어 있으면 물품 값이 우선)
+CREATE TABLE Late_Fee_Policies (
+    complex_id INTEGER NOT NULL DEFAULT current_complex_id() REFERENCES Complexes(complex_id),
+    category VARCHAR(50) NOT NULL REFERENCES Categories(name) ON UPDATE CASCADE,
+    daily_fee INTEGER NOT NULL CHECK (daily_fee >= 0),
+    PRIMARY KEY (complex_id, category)
 );
 
--- 5. [뷰 생성] 매니저 및 일반 사용자용 정보 조회 뷰
+-- 반납일이 지난 대여 전체의 연체료를 하나의 집합 연산으로 계산/부과합니다. (대여자 -> 소유자)
+-- 대여별 워터마크(late_fee_through) 이후 ~ p_as_of 까지의 일수만 부과하므로 여러 번 실행해도 중복 부과되지 않습니다.
+-- 대여자 잔액을 넘는 금액은 부과하지 않고(포인트는 음수가 될 수 없음) 워터마크만 전진합니다.
+-- p_rental_id를 주면 해당 대여 건만 처리합니다. (반납 확정 시 마지막 정산용)
+CREATE OR REPLACE FUNCTION accrue_late_fees(p_as_of DATE DEFAULT CURRENT_DATE, p_rental_id INT DEFAULT NULL,
+                                            OUT charged_rentals INT, OUT charged_total INT)
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+BEGIN
+    -- 잔액 한도 계산이 최신 값을 보도록 관련 대여자 행을 먼저 잠급니다. (항상 resident_id 순서)
+    PERFORM 1 FROM Residents
+     WHERE resident_id IN (SELECT borrower_id FROM Rentals
+                            WHERE status IN ('rented', 'overdue') AND end_date < p_as_of
+                              AND (p_rental_id IS NULL OR rental_id = p_rental_id))
+     ORDER BY resident_id
+       FOR UPDATE;
+
+    WITH due AS (
+        SELECT r.rental_id, r.start_date, r.borrower_id, i.owner_id,
+               (p_as_of - COALESCE(r.late_fee_through, r.end_date))
+                   * COALESCE(i.late_fee_per_day, lp.daily_fee, i.rent_fee) AS fee
+          FROM Rentals r
+          JOIN Items i ON r.item_id = i.item_id
+          LEFT JOIN Late_Fee_Policies lp ON lp.complex_id = i.complex_id AND lp.category = i.category
+         WHERE r.status IN ('rented', 'overdue')
+           AND COALESCE(r.late_fee_through, r.end_date) < p_as_of
+           AND (p_rental_id IS NULL OR r.rental_id = p_rental_id)
+    ),
+    capped AS (
+        -- 같은 대여자의 여러 건은 rental_id 순으로 잔액을 나눠 씀
+        SELECT d.*,
+               LEAST(d.fee, GREATEST(0, res.points - COALESCE(SUM(d.fee) OVER (
+                   PARTITION BY d.borrower_id ORDER BY d.rental_id
+                   ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING), 0))) AS amount
+          FROM due d JOIN Residents res ON res.resident_id = d.borrower_id
+    ),
+    charged AS (
+        UPDATE Rentals r
+           SET late_fee_accrued = r.late_fee_accrued + c.amount,
+               late_fee_through = p_as_of
+          FROM capped c
+         WHERE r.rental_id = c.rental_id AND r.start_date = c.start_date
+           AND r.status IN ('rented', 'overdue')
+           AND COALESCE(r.late_fee_through, r.end_date) < p_as_of -- 동시에 실행된 배치가 먼저 처리했으면 건너뜀
+        RETURNING c.borrower_id, c.owner_id, c.amount
+    ),
+    posted AS (
+        -- 한 주민이 대여자이자 소유자일 수 있으므로 증감을 합산해 한 번만 갱신
+        UPDATE Residents res SET points = res.points + x.delta
+          FROM (SELECT resident_id, SUM(delta) AS delta
+                  FROM (SELECT borrower_id AS resident_id, -amount AS delta FROM charged
+                        UNION ALL
+                        SELECT owner_id, amount FROM charged) t
+                 GROUP BY resident_id) x
+         WHERE res.resident_id = x.resident_id AND x.delta <> 0
+    )
+    SELECT COUNT(*) FILTER (WHERE amount > 0), COALESCE(SUM(amount), 0)
+      INTO charged_rentals, charged_total
+      FROM charged;
+END $$;
+
+-- (9) 추천 (Recommendations)
+-- recommendation_job.py / pricing_job.py가 대여 이력으로 오프라인 계산한 결과만 저장합니다.
+-- 조회 시에는 PK 인덱스로 한 번에 읽고, 현재 대여 가능한 물품만 걸러서 보여줍니다.
+CREATE TABLE Item_Recommendations ( -- "이 물품을 빌린 이웃들이 함께 빌린 물품"
+    item_id INTEGER NOT NULL,
+    rank SMALLINT NOT NULL,
+    recommended_item_id INTEGER NOT NULL,
+    score REAL NOT NULL,
+    complex_id INTEGER NOT NULL DEFAULT current_complex_id() REFERENCES Complexes(complex_id),
+    PRIMARY KEY (item_id, rank),
+    FOREIGN KEY (item_id) REFERENCES Items(item_id) ON DELETE CASCADE,
+    FOREIGN KEY (recommended_item_id) REFERENCES Items(item_id) ON DELETE CASCADE
+);
+
+CREATE TABLE Building_Popular_Items ( -- "우리 동 인기 물품"
+    complex_id INTEGER NOT NULL DEFAULT current_complex_id() REFERENCES Complexes(complex_id),
+    building VARCHAR(10) NOT NULL,
+    rank SMALLINT NOT NULL,
+    item_id INTEGER NOT NULL,
+    score REAL NOT NULL,
+    PRIMARY KEY (complex_id, building, rank),
+    FOREIGN KEY (item_id) REFERENCES Items(item_id) ON DELETE CASCADE
+);
+
+-- 카테고리별 추천 1일 대여료 (pricing_job.py가 주간 대여 수요를 예측해 계산, 물품 등록 화면에서 참고)
+CREATE TABLE Category_Price_Suggestions (
+    complex_id INTEGER NOT NULL DEFAULT current_complex_id() REFERENCES Complexes(complex_id),
+    category VARCHAR(50) NOT NULL REFERENCES Categories(name) ON UPDATE CASCADE,
+    suggested_fee INTEGER NOT NULL CHECK (suggested_fee >= 0),
+    expected_utilization REAL NOT NULL, -- 다음 주 예상 이용률 (예상 대여일 / (등록 물품 수 x 7일))
+    forecast_rental_days REAL NOT NULL, -- 다음 주 예상 대여일 합계
+    sample_rentals INTEGER NOT NULL,    -- 예측에 쓴 대여 건수
+    computed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (complex_id, category)
+);
+
+-- (10) 대여 상태 전이 로그 (Rental_Events)
+-- Rentals의 status / delivery_status / 배송 기사가 바뀔 때마다 트리거가 한 행씩 추가만 합니다. (수정/삭제 불가)
+-- 라우트와 생명주기 함수 어느 쪽에서 바꾸든 빠짐없이 기록되며, 같은 트랜잭션의 전이는 같은 시각(now())을 가집니다.
+-- 타임라인/처리 시간 통계는 이 로그만 읽으므로 Hot 테이블(Rentals)을 훑지 않습니다.
+-- 대여 파티션이 archive로 분리되어도 로그는 남도록 Rentals에 FK를 두지 않습니다.
+CREATE TABLE Rental_Events (
+    event_id BIGSERIAL PRIMARY KEY,
+    rental_id INTEGER NOT NULL,
+    occurred_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    status VARCHAR(20) NOT NULL,
+    delivery_status VARCHAR(20),
+    delivery_partner_id INTEGER,
+    complex_id INTEGER NOT NULL DEFAULT current_complex_id() REFERENCES Complexes(complex_id),
+    xid XID8 NOT NULL DEFAULT pg_current_xact_id() -- 전이를 일으킨 트랜잭션 (포인트 원장과 연결)
+);
+
+CREATE INDEX idx_rental_events_rental ON Rental_Events (rental_id, occurred_at); -- 대여 건 타임라인
+CREATE INDEX idx_rental_events_complex_time ON Rental_Events (complex_id, occurred_at); -- 기간별 통계
+CREATE INDEX idx_rental_events_xid ON Rental_Events (xid); -- 포인트 대사 시 트랜잭션 -> 대여 건 귀속
+
+-- 주민 계정에는 로그 INSERT 권한을 주지 않고, 트리거 함수(소유자 권한)만 기록합니다.
+CREATE OR REPLACE FUNCTION log_rental_transition()
+RETURNS TRIGGER LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+BEGIN
+    INSERT INTO Rental_Events (rental_id, status, delivery_status, delivery_partner_id, complex_id)
+    VALUES (NEW.rental_id, NEW.status, NEW.delivery_status, NEW.delivery_partner_id, NEW.complex_id);
+    RETURN NULL;
+END $$;
+
+-- 분할 테이블에 만든 트리거는 기존/새 파티션 모두에 적용됩니다.
+CREATE TRIGGER trg_rental_created AFTER INSERT ON Rentals
+    FOR EACH ROW EXECUTE FUNCTION log_rental_transition();
+CREATE TRIGGER trg_rental_transition AFTER UPDATE OF status, delivery_status, delivery_partner_id ON Rentals
+    FOR EACH ROW
+    WHEN (OLD.status IS DISTINCT FROM NEW.status
+       OR OLD.delivery_status IS DISTINCT FROM NEW.delivery_status
+       OR OLD.delivery_partner_id IS DISTINCT FROM NEW.delivery_partner_id)
+    EXECUTE FUNCTION log_rental_transition();
+
+-- (11) 사진 첨부 (Attachments)
+-- 물품 사진(등록 시 상태 기록)과 분쟁 증거 사진. 파일은 media_store.py가 내용 해시 경로에 저장하고 여기에는 해시만 둡니다.
+-- 같은 사진을 여러 번 올려도 파일은 하나이며, 썸네일은 thumbnail_worker.py가 thumb_status = 'pending' 행을 가져가 만듭니다.
+CREATE TABLE Attachments (
+    attachment_id SERIAL PRIMARY KEY,
+    sha256 CHAR(64) NOT NULL,
+    content_type VARCHAR(20) NOT NULL,
+    byte_size INTEGER NOT NULL,
+    item_id INTEGER REFERENCES Items(item_id) ON DELETE CASCADE,
+    dispute_id INTEGER, -- Disputes는 분할 테이블(PK: dispute_id, rental_start_date)이라 FK 없이 보관
+    uploaded_by INTEGER NOT NULL REFERENCES Residents(resident_id) ON DELETE CASCADE,
+    created_at TIMESTAMPTZ DEFAULT now(),
+    thumb_status VARCHAR(10) DEFAULT 'pending' CHECK (thumb_status IN ('pending', 'ready', 'failed')),
+    complex_id INTEGER NOT NULL DEFAULT current_complex_id() REFERENCES Complexes(complex_id),
+    CHECK ((item_id IS NULL) <> (dispute_id IS NULL)) -- 물품 또는 분쟁 중 하나에만 첨부
+);
+
+CREATE INDEX idx_attachments_item ON Attachments (item_id) WHERE item_id IS NOT NULL;
+CREATE INDEX idx_attachments_dispute ON Attachments (dispute_id) WHERE dispute_id IS NOT NULL;
+CREATE INDEX idx_attachments_thumb_pending ON Attachments (complex_id, attachment_id) WHERE thumb_status = 'pending';
+
+-- (12) 포인트 원장 & 대사 (Points Ledger / Reconciliation)
+-- Residents.points가 바뀔 때마다 트리거가 증감(delta)과 트랜잭션 ID(xid)를 원장에 추가합니다. (가입 시 초기 지급은 is_opening)
+-- 금고 보관액(Escrow_Holdings.amount)의 증감도 대여 건(rental_id) 계정으로 같은 원장에 남깁니다.
+-- 포인트는 주민과 금고 사이에서 옮겨지기만 하므로, 한 트랜잭션의 증감 합계는 항상 0이어야 합니다.
+CREATE TABLE Points_Ledger (
+    entry_id BIGSERIAL PRIMARY KEY,
+    xid XID8 NOT NULL DEFAULT pg_current_xact_id(),
+    resident_id INTEGER,
+    delta INTEGER NOT NULL,
+    is_opening BOOLEAN NOT NULL DEFAULT FALSE,
+    occurred_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    complex_id INTEGER NOT NULL REFERENCES Complexes(complex_id),
+    rental_id INTEGER, -- 금고 보관액 항목이면 대여 건 ID (resident_id는 NULL)
+    CONSTRAINT chk_ledger_account CHECK ((resident_id IS NULL) <> (rental_id IS NULL))
+);
+
+-- 대사는 이전 스냅샷 이후의 트랜잭션만 읽음
+CREATE INDEX idx_points_ledger_xid ON Points_Ledger (xid);
+-- 금고 대사는 대여 건별 원장 누계를 읽음
+CREATE INDEX idx_points_ledger_rental ON Points_Ledger (rental_id) WHERE rental_id IS NOT NULL;
+
+CREATE OR REPLACE FUNCTION log_points_change()
+RETURNS TRIGGER LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO Points_Ledger (resident_id, delta, is_opening, complex_id)
+        VALUES (NEW.resident_id, NEW.points, TRUE, NEW.complex_id);
+    ELSE
+        INSERT INTO Points_Ledger (resident_id, delta, complex_id)
+        VALUES (NEW.resident_id, NEW.points - OLD.points, NEW.complex_id);
+    END IF;
+    RETURN NULL;
+END $$;
+
+CREATE TRIGGER trg_points_opening AFTER INSERT ON Residents
+    FOR EACH ROW WHEN (NEW.points <> 0) EXECUTE FUNCTION log_points_change();
+CREATE TRIGGER trg_points_change AFTER UPDATE OF points ON Residents
+    FOR EACH ROW WHEN (OLD.points IS DISTINCT FROM NEW.points) EXECUTE FUNCTION log_points_change();
+
+CREATE OR REPLACE FUNCTION log_escrow_change()
+RETURNS TRIGGER LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+BEGIN
+    INSERT INTO Points_Ledger (rental_id, delta, complex_id)
+    VALUES (NEW.rental_id, NEW.amount - CASE WHEN TG_OP = 'INSERT' THEN 0 ELSE OLD.amount END, NEW.complex_id);
+    RETURN NULL;
+END $$;
+
+CREATE TRIGGER trg_escrow_opening AFTER INSERT ON Escrow_Holdings
+    FOR EACH ROW WHEN (NEW.amount <> 0) EXECUTE FUNCTION log_escrow_change();
+CREATE TRIGGER trg_escrow_change AFTER UPDATE OF amount ON Escrow_Holdings
+    FOR EACH ROW WHEN (OLD.amount IS DISTINCT FROM NEW.amount) EXECUTE FUNCTION log_escrow_change();
+
+-- 대사 시점의 잔액 스냅샷 (txn_snapshot: 이 스냅샷에 반영된 트랜잭션 = 다음 대사의 증분 시작점)
+-- 다음 대사의 기준이 되는 직전 스냅샷의 잔액만 남기고 그 이전 잔액 행은 지웁니다.
+CREATE TABLE Balance_Snapshots (
+    snapshot_id SERIAL PRIMARY KEY,
+    taken_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    txn_snapshot PG_SNAPSHOT NOT NULL,
+    entries_checked BIGINT,
+    resident_issues INTEGER,
+    transaction_issues INTEGER,
+    escrow_issues INTEGER
+);
+
+CREATE TABLE Balance_Snapshot_Rows (
+    snapshot_id INTEGER NOT NULL REFERENCES Balance_Snapshots(snapshot_id) ON DELETE CASCADE,
+    resident_id INTEGER NOT NULL,
+    balance INTEGER NOT NULL,
+    complex_id INTEGER NOT NULL REFERENCES Complexes(complex_id),
+    PRIMARY KEY (snapshot_id, resident_id)
+);
+
+-- 대사 결과 불일치
+--   resident: 직전 스냅샷 잔액 + 원장 증감(expected) != 현재 잔액(actual) -> 트리거를 거치지 않은 잔액 변경
+--   transaction: 한 트랜잭션의 증감 합계(actual)가 0(expected)이 아님 -> 포인트가 생기거나 사라진 정산
+--                rental_ids는 같은 트랜잭션에서 상태가 바뀐 대여 건 (Rental_Events.xid)
+--   escrow: 대여 건의 원장 누계(expected) != 금고 보관액(actual), rental_ids는 그 대여 건
+CREATE TABLE Points_Discrepancies (
+    discrepancy_id SERIAL PRIMARY KEY,
+    snapshot_id INTEGER NOT NULL REFERENCES Balance_Snapshots(snapshot_id),
+    kind VARCHAR(12) NOT NULL CHECK (kind IN ('resident', 'transaction', 'escrow')),
+    resident_id INTEGER,
+    xid XID8,
+    rental_ids INTEGER[],
+    expected INTEGER NOT NULL,
+    actual INTEGER NOT NULL,
+    complex_id INTEGER NOT NULL REFERENCES Complexes(complex_id)
+);
+
+CREATE INDEX idx_points_discrepancies_snapshot ON Points_Discrepancies (complex_id, snapshot_id);
+
+-- 샤드 전체(모든 단지)를 한 번에 대사합니다. REPEATABLE READ 트랜잭션에서 호출해야
+-- 잔액 스냅샷과 원장이 같은 시점을 보게 됩니다. 직전 스냅샷 이후 커밋된 원장 항목만 읽으므로 대여 건수와 무관하게 빠릅니다.
+CREATE OR REPLACE FUNCTION reconcile_points(OUT snapshot INT, OUT entries_checked BIGINT,
+                                            OUT resident_issues INT, OUT transaction_issues INT,
+                                            OUT escrow_issues INT)
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+DECLARE
+    v_prev RECORD;
+BEGIN
+    IF current_setting('transaction_isolation') NOT IN ('repeatable read', 'serializable') THEN
+        RAISE EXCEPTION '일관된 스냅샷을 위해 REPEATABLE READ 트랜잭션에서 실행해야 합니다.';
+    END IF;
+    IF NOT pg_try_advisory_xact_lock(hashtext('reconcile_points')) THEN
+        RAISE EXCEPTION '다른 포인트 대사가 실행 중입니다.';
+    END IF;
+
+    SELECT s.snapshot_id, s.txn_snapshot INTO v_prev
+      FROM Balance_Snapshots s ORDER BY s.snapshot_id DESC LIMIT 1;
+
+    INSERT INTO Balance_Snapshots (txn_snapshot) VALUES (pg_current_snapshot())
+    RETURNING snapshot_id INTO snapshot;
+
+    -- 직전 스냅샷에는 보이지 않던(그 이후 커밋된) 원장 항목 (첫 실행이면 전체)
+    CREATE TEMP TABLE new_entries ON COMMIT DROP AS
+    SELECT l.xid, l.resident_id, l.rental_id, l.delta, l.is_opening, l.complex_id
+      FROM Points_Ledger l
+     WHERE v_prev.snapshot_id IS NULL
+        OR (l.xid >= pg_snapshot_xmin(v_prev.txn_snapshot) AND NOT pg_visible_in_snapshot(l.xid, v_prev.txn_snapshot));
+    GET DIAGNOSTICS entries_checked = ROW_COUNT;
+
+    INSERT INTO Balance_Snapshot_Rows (snapshot_id, resident_id, balance, complex_id)
+    SELECT snapshot, r.resident_id, r.points, r.complex_id FROM Residents r;
+
+    -- (1) 주민별: 직전 잔액 + 증감 합계 = 현재 잔액
+    INSERT INTO Points_Discrepancies (snapshot_id, kind, resident_id, expected, actual, complex_id)
+    SELECT snapshot, 'resident', r.resident_id, COALESCE(p.balance, 0) + COALESCE(e.delta, 0), r.points, r.complex_id
+      FROM Residents r
+      LEFT JOIN Balance_Snapshot_Rows p ON p.snapshot_id = v_prev.snapshot_id AND p.resident_id = r.resident_id
+      LEFT JOIN (SELECT n.resident_id, SUM(n.delta) AS delta FROM new_entries n GROUP BY n.resident_id) e
+             ON e.resident_id = r.resident_id
+     WHERE COALESCE(p.balance, 0) + COALESCE(e.delta, 0) <> r.points;
+    GET DIAGNOSTICS resident_issues = ROW_COUNT;
+
+    -- (2) 트랜잭션별: 초기 지급을 제외한 증감 합계 = 0
+    INSERT INTO Points_Discrepancies (snapshot_id, kind, xid, rental_ids, expected, actual, complex_id)
+    SELECT snapshot, 'transaction', t.xid,
+           (SELECT array_agg(DISTINCT ev.rental_id ORDER BY ev.rental_id) FROM Rental_Events ev WHERE ev.xid = t.xid),
+           0, t.net, t.complex_id
+      FROM (SELECT n.xid, n.complex_id, SUM(n.delta) AS net
+              FROM new_entries n WHERE NOT n.is_opening
+             GROUP BY n.xid, n.complex_id) t
+     WHERE t.net <> 0;
+    GET DIAGNOSTICS transaction_issues = ROW_COUNT;
+
+    -- (3) 금고 대여 건별: 원장 누계 = 현재 보관액 (이번에 움직였거나 아직 보관 중인 건만 확인)
+    INSERT INTO Points_Discrepancies (snapshot_id, kind, rental_ids, expected, actual, complex_id)
+    SELECT snapshot, 'escrow', ARRAY[h.rental_id], l.total, h.amount, h.complex_id
+      FROM (SELECT e.rental_id FROM Escrow_Holdings e WHERE e.amount > 0
+            UNION
+            SELECT n.rental_id FROM new_entries n WHERE n.rental_id IS NOT NULL) c
+      JOIN Escrow_Holdings h ON h.rental_id = c.rental_id
+     CROSS JOIN LATERAL (SELECT COALESCE(SUM(pl.delta), 0) AS total
+                           FROM Points_Ledger pl WHERE pl.rental_id = h.rental_id) l
+     WHERE l.total <> h.amount;
+    GET DIAGNOSTICS escrow_issues = ROW_COUNT;
+
+    UPDATE Balance_Snapshots s
+       SET entries_checked = reconcile_points.entries_checked,
+           resident_issues = reconcile_points.resident_issues,
+           transaction_issues = reconcile_points.transaction_issues,
+           escrow_issues = reconcile_points.escrow_issues
+     WHERE s.snapshot_id = snapshot;
+    DELETE FROM Balance_Snapshot_Rows b WHERE b.snapshot_id < v_prev.snapshot_id;
+END $$;
+
+-- (13) 카테고리별 대여 가능 물품 수 (Category Facets)
+-- 물품이 등록/상태 변경/카테고리 변경/삭제될 때 트리거가 (단지, 카테고리, 소유자 동) 행의 개수를 증감합니다.
+-- 카탈로그 화면은 물품을 다시 세지 않고 이 표에서 카테고리별 개수(단지 전체 / 우리 동)를 읽습니다.
+-- 만료된 물품은 대시보드 접속 시 status가 'expired'로 바뀌면서 빠집니다.
+CREATE TABLE Category_Counts (
+    complex_id INTEGER NOT NULL REFERENCES Complexes(complex_id),
+    category VARCHAR(50) NOT NULL REFERENCES Categories(name) ON UPDATE CASCADE,
+    building VARCHAR(10) NOT NULL,
+    available_count INTEGER NOT NULL DEFAULT 0 CHECK (available_count >= 0),
+    PRIMARY KEY (complex_id, category, building)
+);
+
+CREATE OR REPLACE FUNCTION maintain_category_counts()
+RETURNS TRIGGER LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.status = 'available' AND OLD.category IS NOT NULL THEN
+        UPDATE Category_Counts c SET available_count = c.available_count - 1
+         WHERE c.complex_id = OLD.complex_id AND c.category = OLD.category
+           AND c.building = (SELECT r.building FROM Residents r WHERE r.resident_id = OLD.owner_id);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.status = 'available' AND NEW.category IS NOT NULL THEN
+        INSERT INTO Category_Counts (complex_id, category, building, available_count)
+        SELECT NEW.complex_id, NEW.category, r.building, 1 FROM Residents r WHERE r.resident_id = NEW.owner_id
+        ON CONFLICT (complex_id, category, building)
+        DO UPDATE SET available_count = Category_Counts.available_count + 1;
+    END IF;
+    RETURN NULL;
+END $$;
+
+CREATE TRIGGER trg_category_counts_insert AFTER INSERT ON Items
+    FOR EACH ROW EXECUTE FUNCTION maintain_category_counts();
+CREATE TRIGGER trg_category_counts_update AFTER UPDATE OF status, category, owner_id ON Items
+    FOR EACH ROW
+    WHEN (OLD.status IS DISTINCT FROM NEW.status
+       OR OLD.category IS DISTINCT FROM NEW.category
+       OR OLD.owner_id IS DISTINCT FROM NEW.owner_id)
+    EXECUTE FUNCTION maintain_category_counts();
+CREATE TRIGGER trg_category_counts_delete AFTER DELETE ON Items
+    FOR EACH ROW EXECUTE FUNCTION maintain_category_counts();
+
+-- (14) 대기열 (Waitlist)
+-- 대여 중/분쟁 중인 물품에 줄을 서 두면, 물품이 다시 'available'이 되는 순간(반납 확정, 분쟁 종료)
+-- 트리거가 맨 앞 주민의 대여 신청('requested')을 대신 만들고 알림을 보냅니다. (대여자가 카탈로그를 계속 확인할 필요 없음)
+-- 물품이 철회/만료되면 대기열은 취소됩니다.
+-- 차례가 되어 만들어진 신청을 소유자가 거절하면, 물품이 여전히 'available'이므로 다음 주민에게 차례가 넘어갑니다.
+CREATE TABLE Waitlist (
+    entry_id SERIAL PRIMARY KEY,
+    item_id INTEGER NOT NULL REFERENCES Items(item_id) ON DELETE CASCADE,
+    resident_id INTEGER NOT NULL REFERENCES Residents(resident_id) ON DELETE CASCADE,
+    days INTEGER NOT NULL CHECK (days >= 1), -- 차례가 되면 그날부터 빌릴 일수
+    delivery_option VARCHAR(10) NOT NULL CHECK (delivery_option IN ('pickup', 'delivery')),
+    status VARCHAR(10) NOT NULL DEFAULT 'waiting' CHECK (status IN ('waiting', 'promoted', 'cancelled')),
+    joined_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    rental_id INTEGER, -- 차례가 되어 만들어진 대여 신청
+    complex_id INTEGER NOT NULL DEFAULT current_complex_id() REFERENCES Complexes(complex_id)
+);
+
+CREATE UNIQUE INDEX uq_waitlist_waiting ON Waitlist (item_id, resident_id) WHERE status = 'waiting'; -- 물품당 한 번만 줄 섬
+CREATE INDEX idx_waitlist_queue ON Waitlist (item_id, entry_id) WHERE status = 'waiting';             -- 선착순 / 순번 계산
+CREATE INDEX idx_waitlist_resident ON Waitlist (complex_id, resident_id) WHERE status = 'waiting';     -- 내 대기 목록
+CREATE INDEX idx_waitlist_rental ON Waitlist (rental_id) WHERE rental_id IS NOT NULL;                    -- 거절된 신청이 대기열 차례였는지
+
+-- 맨 앞부터 신청할 수 있는 주민을 찾아 대여 신청 생성 (승인은 기존처럼 소유자가 함)
+CREATE OR REPLACE FUNCTION promote_waitlist(p_item Items)
+RETURNS VOID LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+DECLARE
+    w RECORD;
+    v_rental_id INT;
+BEGIN
+    FOR w IN SELECT wl.entry_id, wl.resident_id, wl.days, wl.delivery_option, r.status AS resident_status
+               FROM Waitlist wl JOIN Residents r ON r.resident_id = wl.resident_id
+              WHERE wl.item_id = p_item.item_id AND wl.status = 'waiting'
+              ORDER BY wl.entry_id
+                FOR UPDATE OF wl
+    LOOP
+        IF w.resident_status <> 'approved' OR w.resident_id = p_item.owner_id THEN
+            UPDATE Waitlist SET status = 'cancelled' WHERE entry_id = w.entry_id;
+            CONTINUE;
+        END IF;
+
+        INSERT INTO Rentals (item_id, borrower_id, start_date, end_date, delivery_option, delivery_fee, complex_id)
+        VALUES (p_item.item_id, w.resident_id, CURRENT_DATE,
+                GREATEST(LEAST(CURRENT_DATE + w.days - 1, p_item.expiration_date), CURRENT_DATE),
+                w.delivery_option, CASE WHEN w.delivery_option = 'delivery' THEN 500 ELSE 0 END, p_item.complex_id)
+        RETURNING rental_id INTO v_rental_id;
+
+        UPDATE Waitlist SET status = 'promoted', rental_id = v_rental_id WHERE entry_id = w.entry_id;
+        PERFORM notify_rental_event(v_rental_id, 'waitlist_promoted', 'both', NULL);
+        EXIT;
+    END LOOP;
+END $$;
+
+CREATE OR REPLACE FUNCTION advance_waitlist()
+RETURNS TRIGGER LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+BEGIN
+    IF NEW.status IN ('withdrawn', 'expired') THEN
+        UPDATE Waitlist SET status = 'cancelled' WHERE item_id = NEW.item_id AND status = 'waiting';
+        RETURN NULL;
+    END IF;
+
+    -- 'available'로 돌아옴
+    PERFORM promote_waitlist(NEW);
+    RETURN NULL;
+END $$;
+
+CREATE TRIGGER trg_waitlist_advance AFTER UPDATE OF status ON Items
+    FOR EACH ROW
+    WHEN (OLD.status IS DISTINCT FROM NEW.status AND NEW.status IN ('available', 'withdrawn', 'expired'))
+    EXECUTE FUNCTION advance_waitlist();
+
+-- 대기열 차례로 만들어진 신청이 거절되면 다음 주민에게 차례를 넘김
+-- (승인 시 경쟁 요청 자동 거절은 물품이 이미 'rented'이므로 넘기지 않음)
+CREATE OR REPLACE FUNCTION advance_waitlist_on_reject()
+RETURNS TRIGGER LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+DECLARE
+    v_item Items;
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM Waitlist WHERE rental_id = NEW.rental_id AND status = 'promoted') THEN
+        RETURN NULL;
+    END IF;
+    SELECT * INTO v_item FROM Items WHERE item_id = NEW.item_id FOR UPDATE;
+    IF v_item.status = 'available' THEN
+        PERFORM promote_waitlist(v_item);
+    END IF;
+    RETURN NULL;
+END $$;
+
+CREATE TRIGGER trg_waitlist_advance_on_reject AFTER UPDATE OF status ON Rentals
+    FOR EACH ROW
+    WHEN (OLD.status = 'requested' AND NEW.status = 'rejected')
+    EXECUTE FUNCTION advance_waitlist_on_reject();
+
+-- (15) 물품 변경 알림 (검색 자동완성 색인)
+-- 웹 워커는 대여 가능한 물품 이름을 메모리 색인(catalog_index.py)으로 들고 있고, 이 트리거가 커밋 시점에 보내는
+-- 알림(LISTEN item_changes)으로 바뀐 물품만 반영합니다. 알림에는 변경 후 상태를 담으므로 순서가 겹쳐도 결과가 같습니다.
+CREATE OR REPLACE FUNCTION notify_item_change()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+DECLARE
+    v Items;
+BEGIN
+    v := CASE WHEN TG_OP = 'DELETE' THEN OLD ELSE NEW END;
+    PERFORM pg_notify('item_changes', json_build_object(
+        'complex_id', v.complex_id,
+        'item_id', v.item_id,
+        'name', v.name,
+        'available', TG_OP <> 'DELETE' AND v.status = 'available' AND v.expiration_date >= CURRENT_DATE
+    )::text);
+    RETURN NULL;
+END $$;
+
+CREATE TRIGGER trg_item_change_insert AFTER INSERT ON Items
+    FOR EACH ROW EXECUTE FUNCTION notify_item_change();
+CREATE TRIGGER trg_item_change_update AFTER UPDATE OF name, status, expiration_date ON Items
+    FOR EACH ROW
+    WHEN (OLD.name IS DISTINCT FROM NEW.name
+       OR OLD.status IS DISTINCT FROM NEW.status
+       OR OLD.expiration_date IS DISTINCT FROM NEW.expiration_date)
+    EXECUTE FUNCTION notify_item_change();
+CREATE TRIGGER trg_item_change_delete AFTER DELETE ON Items
+    FOR EACH ROW EXECUTE FUNCTION notify_item_change();
+
+-- (16) 주민 평판 (Ratings / Reputation)
+-- 반납 확정 후 소유자가 대여자를, 배송이 끝나면 물건을 받은 쪽(대여 배송은 대여자, 반납 배송은 소유자)이 기사를 1~5점으로 평가합니다.
+-- 주민별 집계(평가 수/합계, 대여 건수, 분쟁 건수)는 평가/대여 시작/분쟁 신고 때마다 트리거가 한 행만 증감하므로,
+-- 승인 대기 목록, 배송 시장, 카탈로그는 이 표를 조인해 점수를 함께 읽고 정렬합니다. (다시 집계하지 않음)
+CREATE TABLE Ratings (
+    rating_id SERIAL PRIMARY KEY,
+    rental_id INTEGER NOT NULL,
+    rater_id INTEGER NOT NULL REFERENCES Residents(resident_id) ON DELETE CASCADE,
+    ratee_id INTEGER NOT NULL REFERENCES Residents(resident_id) ON DELETE CASCADE,
+    role VARCHAR(10) NOT NULL CHECK (role IN ('borrower', 'partner')), -- 평가받는 역할
+    score SMALLINT NOT NULL CHECK (score BETWEEN 1 AND 5),
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    complex_id INTEGER NOT NULL DEFAULT current_complex_id() REFERENCES Complexes(complex_id),
+    UNIQUE (rental_id, rater_id, ratee_id)
+);
+
+-- score: 평균 평점(평가가 적을 때는 4점 3개를 더한 값으로 보정) x 분쟁 비율 감점(분쟁 1건당 비율의 절반)
+CREATE TABLE Resident_Reputation (
+    resident_id INTEGER PRIMARY KEY REFERENCES Residents(resident_id) ON DELETE CASCADE,
+    rating_count INTEGER NOT NULL DEFAULT 0,
+    rating_sum INTEGER NOT NULL DEFAULT 0,
+    rental_count INTEGER NOT NULL DEFAULT 0,  -- 대여자로서 대여가 시작된 건수
+    dispute_count INTEGER NOT NULL DEFAULT 0, -- 그중 분쟁이 신고된 건수
+    score NUMERIC(3, 2) GENERATED ALWAYS AS (
+        (rating_sum + 12)::NUMERIC / (rating_count + 3)
+        * (1 - 0.5 * LEAST(dispute_count::NUMERIC / GREATEST(rental_count, 1), 1))
+    ) STORED,
+    complex_id INTEGER NOT NULL REFERENCES Complexes(complex_id)
+);
+
+-- 집계 행이 아직 없는 주민(평가/대여 이력 없음)의 점수
+CREATE OR REPLACE FUNCTION default_reputation_score()
+RETURNS NUMERIC LANGUAGE sql IMMUTABLE AS $$ SELECT 4.00::NUMERIC(3, 2) $$;
+
+CREATE OR REPLACE FUNCTION maintain_reputation()
+RETURNS TRIGGER LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+DECLARE
+    v_resident_id INT;
+    d_count INT := 0;
+    d_sum INT := 0;
+    d_rentals INT := 0;
+    d_disputes INT := 0;
+BEGIN
+    -- TG_ARGV[0]: 이벤트 종류 (Rentals/Disputes는 파티션에서 발동하므로 TG_TABLE_NAME 대신 인자로 구분)
+    IF TG_ARGV[0] = 'rating' THEN
+        v_resident_id := NEW.ratee_id; d_count := 1; d_sum := NEW.score;
+    ELSIF TG_ARGV[0] = 'rental' THEN
+        v_resident_id := NEW.borrower_id; d_rentals := 1;
+    ELSE -- disputes: 분쟁 대상 대여의 대여자
+        SELECT r.borrower_id INTO v_resident_id FROM Rentals r
+         WHERE r.rental_id = NEW.rental_id AND r.start_date = NEW.rental_start_date;
+        IF v_resident_id IS NULL THEN RETURN NULL; END IF;
+        d_disputes := 1;
+    END IF;
+
+    INSERT INTO Resident_Reputation AS rr (resident_id, rating_count, rating_sum, rental_count, dispute_count, complex_id)
+    VALUES (v_resident_id, d_count, d_sum, d_rentals, d_disputes, NEW.complex_id)
+    ON CONFLICT (resident_id) DO UPDATE
+       SET rating_count = rr.rating_count + EXCLUDED.rating_count,
+           rating_sum = rr.rating_sum + EXCLUDED.rating_sum,
+           rental_count = rr.rental_count + EXCLUDED.rental_count,
+           dispute_count = rr.dispute_count + EXCLUDED.dispute_count;
+    RETURN NULL;
+END $$;
+
+CREATE TRIGGER trg_reputation_rating AFTER INSERT ON Ratings
+    FOR EACH ROW EXECUTE FUNCTION maintain_reputation('rating');
+CREATE TRIGGER trg_reputation_rental AFTER UPDATE OF status ON Rentals
+    FOR EACH ROW WHEN (OLD.status = 'approved' AND NEW.status = 'rented')
+    EXECUTE FUNCTION maintain_reputation('rental');
+CREATE TRIGGER trg_reputation_dispute AFTER INSERT ON Disputes
+    FOR EACH ROW EXECUTE FUNCTION maintain_reputation('dispute');
+
+-- 평가 등록: p_target = 'borrower'(소유자가 반납 확정된 대여자를) | 'partner'(배송을 받은 쪽이 기사를)
+-- 반환값: 평가받은 주민 ID
+CREATE OR REPLACE FUNCTION rate_resident(p_rental_id INT, p_actor_id INT, p_target TEXT, p_score INT)
+RETURNS INT LANGUAGE plpgsql AS $$
+DECLARE
+    v RECORD;
+    v_ratee_id INT;
+BEGIN
+    SELECT r.borrower_id, i.owner_id, r.status, r.delivery_option, r.delivery_status, r.delivery_partner_id
+      INTO v
+      FROM Rentals r JOIN Items i ON r.item_id = i.item_id
+     WHERE r.rental_id = p_rental_id;
+
+    IF NOT FOUND THEN RAISE EXCEPTION '데이터 없음'; END IF;
+
+    IF p_target = 'borrower' AND v.owner_id = p_actor_id AND v.status = 'returned' THEN
+        v_ratee_id := v.borrower_id;
+    ELSIF p_target = 'partner' AND v.delivery_option = 'delivery' AND v.delivery_status = 'completed'
+          AND v.delivery_partner_id IS NOT NULL AND v.delivery_partner_id <> p_actor_id
+          AND ((v.borrower_id = p_actor_id AND v.status IN ('rented', 'overdue'))          -- 대여 배송을 받은 대여자
+            OR (v.owner_id = p_actor_id AND v.status IN ('returned', 'disputed'))) THEN   -- 반납 배송을 받은 소유자
+        v_ratee_id := v.delivery_partner_id;
+    ELSE
+        RAISE EXCEPTION '평가할 수 없는 대여 건입니다.';
+    END IF;
+
+    INSERT INTO Ratings (rental_id, rater_id, ratee_id, role, score)
+    VALUES (p_rental_id, p_actor_id, v_ratee_id, p_target, p_score)
+    ON CONFLICT (rental_id, rater_id, ratee_id) DO NOTHING;
+    IF NOT FOUND THEN RAISE EXCEPTION '이미 평가한 대여 건입니다.'; END IF;
+
+    RETURN v_ratee_id;
+END $$;
+
+-- (17) 단지별 데이터 격리 (Row Level Security)
+-- 모든 단지 테이블에 같은 정책을 적용: 현재 접속 단지(current_complex_id())의 행만 조회/수정/삽입 가능
+-- 테이블 소유자(스크립트 실행 계정)와 SECURITY DEFINER 함수(파티션 관리, 연체료 배치)는 전체 단지를 대상으로 동작합니다.
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['residents', 'items', 'rentals', 'disputes', 'notification_outbox',
+                             'late_fee_policies', 'item_recommendations', 'building_popular_items',
+                             'rental_events', 'attachments', 'points_ledger', 'balance_snapshot_rows',
+                             'points_discrepancies', 'category_counts', 'waitlist', 'escrow_holdings',
+                             'ratings', 'resident_reputation',
+                             'category_price_suggestions'] LOOP
+        EXECUTE format('ALTER TABLE %I ENABLE ROW LEVEL SECURITY', t);
+        EXECUTE format('CREATE POLICY complex_isolation ON %I USING (complex_id = current_complex_id()) '
+                       'WITH CHECK (complex_id = current_complex_id())', t);
+    END LOOP;
+END $$;
+
+-- 기본 단지 (단지를 추가하면 app.py의 COMPLEX_SHARDS에 배치할 샤드를 지정)
+INSERT INTO Complexes (complex_id, name) VALUES (1, '기본 단지');
+
+-- 6. [뷰 생성] 매니저 및 일반 사용자용 정보 조회 뷰
 -- 비밀번호 등 민감 정보를 제외하고, 배송 정지 여부(is_delivery_banned)를 포함한 뷰입니다.
+-- 뷰는 소유자 권한으로 실행되어 RLS가 적용되지 않으므로 단지 조건을 직접 포함합니다.
 CREATE OR REPLACE VIEW View_Manager_Residents AS
 SELECT resident_id, user_id, name, phone_number, building, unit, points, status, is_manager, is_delivery_banned
-FROM Residents;
+FROM Residents
+WHERE complex_id = current_complex_id();
 
--- 6. [권한 부여] Security & Permissions (RBAC)
+-- 단지 금고 잔액 = 대여 건별 보관액의 합 (읽을 때 합산)
+CREATE OR REPLACE VIEW View_Escrow_Balance AS
+SELECT COALESCE(SUM(amount), 0)::INT AS held, COUNT(*)::INT AS open_rentals
+FROM Escrow_Holdings
+WHERE complex_id = current_complex_id() AND amount > 0;
+
+-- 이력 조회용 뷰 (Hot 파티션 + archive 스키마의 보관 파티션)
+-- 최초에는 Hot 테이블만 포함하며, archive_cold_rental_partitions() 실행 시 자동으로 재생성됩니다.
+SELECT refresh_history_views();
+
+-- 7. [권한 부여] Security & Permissions (RBAC)
 
 -- [A] 기본 접속 허용
 GRANT CONNECT ON DATABASE "DB_Term_Project" TO db_manager, db_resident;
 GRANT USAGE ON SCHEMA public TO db_manager, db_resident, db_owner, db_borrower, db_delivery_partner;
+GRANT SELECT ON Complexes TO db_manager, db_resident; -- 로그인/가입 화면의 단지 선택
+GRANT SELECT ON Categories TO db_manager, db_resident;
 
 -- [B] 세부 역할별 권한 정의 (기능 단위 분리)
 
@@ -134,7 +1335,7 @@ GRANT USAGE ON SCHEMA public TO db_manager, db_resident, db_owner, db_borrower,
 GRANT SELECT, INSERT, UPDATE, DELETE ON Items TO db_owner; 
 GRANT SELECT, UPDATE ON Rentals TO db_owner;
 GRANT UPDATE (points) ON Residents TO db_owner; -- 수익 수취
-GRANT SELECT ON Disputes TO db_owner; -- 분쟁 내역 조회
+GRANT SELECT, INSERT ON Disputes TO db_owner; -- 분쟁 신고 및 내역 조회
 
 -- 🙋 2. 대여자 (Borrower)
 GRANT SELECT ON Items TO db_borrower;
@@ -167,11 +1368,84 @@ GRANT INSERT ON Residents TO db_resident;
 -- [D] 매니저 (db_manager) 권한
 -- 개인정보 보호(Residents 조회 불가) 정책 유지
 GRANT SELECT, INSERT, UPDATE ON ALL TABLES IN SCHEMA public TO db_manager;
-GRANT DELETE ON Items, Rentals TO db_manager;
+GRANT DELETE ON Items, Rentals, Late_Fee_Policies, Item_Recommendations, Building_Popular_Items, Category_Price_Suggestions TO db_manager;
 REVOKE DELETE ON Residents, Disputes FROM db_manager;
 REVOKE SELECT ON Residents FROM db_manager; -- ★ 핵심 보안 설정
+REVOKE INSERT, UPDATE ON Complexes FROM db_manager; -- 단지 등록은 운영자(스크립트)만
 GRANT SELECT ON View_Manager_Residents TO db_manager; 
 
+-- 이력 조회 뷰 및 파티션 관리 함수 (관리 함수는 매니저 계정의 배치 작업만 실행)
+GRANT SELECT ON Rentals_History, Disputes_History TO db_owner, db_borrower, db_delivery_partner, db_manager;
+REVOKE ALL ON FUNCTION ensure_rental_partitions(DATE, INT), refresh_history_views(), archive_cold_rental_partitions(INT) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION ensure_rental_partitions(DATE, INT), refresh_history_views(), archive_cold_rental_partitions(INT) TO db_manager;
+
+-- 알림 Outbox: 주민 계정은 적재(INSERT)만, 발송 워커(매니저 계정)는 조회/상태 갱신
+GRANT INSERT ON Notification_Outbox TO db_owner, db_borrower, db_delivery_partner;
+REVOKE ALL ON FUNCTION notify_rental_event(INT, TEXT, TEXT, INT, JSONB) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION notify_rental_event(INT, TEXT, TEXT, INT, JSONB) TO db_owner, db_delivery_partner, db_manager;
+
+-- 연체료 배치 (매니저 배치 작업 + 반납 확정 시 소유자 호출)
+REVOKE ALL ON FUNCTION accrue_late_fees(DATE, INT) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION accrue_late_fees(DATE, INT) TO db_manager, db_owner;
+GRANT SELECT ON Late_Fee_Policies TO db_owner, db_borrower, db_delivery_partner;
+
+-- 추천 결과 (배치는 매니저 계정이 갱신, 주민은 조회만)
+GRANT SELECT ON Item_Recommendations, Building_Popular_Items, Category_Price_Suggestions TO db_owner, db_borrower, db_delivery_partner;
+
+-- 상태 전이 로그 (추가 전용: 트리거만 기록하고 모든 계정은 조회만)
+REVOKE INSERT, UPDATE ON Rental_Events FROM db_manager;
+REVOKE ALL ON FUNCTION log_rental_transition() FROM PUBLIC;
+GRANT SELECT ON Rental_Events TO db_owner, db_borrower, db_delivery_partner, db_manager;
+
+-- 사진 첨부 (물품 등록/분쟁 신고는 소유자 역할, 썸네일 워커는 매니저 계정으로 thumb_status만 갱신)
+GRANT SELECT ON Attachments TO db_owner, db_borrower, db_delivery_partner;
+GRANT INSERT ON Attachments TO db_owner;
+REVOKE INSERT, UPDATE ON Attachments FROM db_manager;
+GRANT UPDATE (thumb_status) ON Attachments TO db_manager;
+
+-- 카테고리 (분류표는 운영자만 수정, 개수는 트리거만 갱신)
+REVOKE INSERT, UPDATE ON Categories, Category_Counts FROM db_manager;
+REVOKE ALL ON FUNCTION maintain_category_counts() FROM PUBLIC;
+GRANT SELECT ON Category_Counts TO db_owner, db_borrower, db_delivery_partner;
+
+-- 대기열 (줄 서기/취소는 대여자, 승인 시 경쟁 요청 이동은 소유자, 차례 진행은 트리거)
+GRANT SELECT, INSERT ON Waitlist TO db_borrower, db_owner;
+GRANT UPDATE (status) ON Waitlist TO db_borrower;
+REVOKE ALL ON FUNCTION advance_waitlist(), advance_waitlist_on_reject(), promote_waitlist(Items) FROM PUBLIC;
+
+-- 자동완성 색인 알림 (트리거만 호출)
+REVOKE ALL ON FUNCTION notify_item_change() FROM PUBLIC;
+
+-- 포인트 원장 / 대사 (트리거와 대사 함수만 기록, 매니저 계정은 조회와 대사 실행만)
+REVOKE INSERT, UPDATE ON Points_Ledger, Balance_Snapshots, Balance_Snapshot_Rows, Points_Discrepancies FROM db_manager;
+REVOKE ALL ON FUNCTION log_points_change(), reconcile_points() FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION reconcile_points() TO db_manager;
+
+-- 배송비 금고 (결제는 대여자/소유자/기사 역할, 지급은 소유자/기사 역할, 증감은 트리거가 원장에 기록)
+GRANT SELECT, INSERT, UPDATE ON Escrow_Holdings TO db_owner, db_borrower, db_delivery_partner;
+REVOKE INSERT, UPDATE ON Escrow_Holdings FROM db_manager;
+REVOKE ALL ON FUNCTION escrow_deposit(INT, INT), escrow_release(INT, INT, INT), log_escrow_change() FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION escrow_deposit(INT, INT) TO db_owner, db_borrower, db_delivery_partner;
+GRANT EXECUTE ON FUNCTION escrow_release(INT, INT, INT) TO db_owner, db_delivery_partner;
+GRANT SELECT ON View_Escrow_Balance TO db_manager;
+
+-- 평판 (평가 등록은 소유자/대여자 역할, 집계는 트리거만 갱신)
+GRANT SELECT, INSERT ON Ratings TO db_owner, db_borrower;
+GRANT SELECT ON Ratings, Resident_Reputation TO db_delivery_partner;
+GRANT SELECT ON Resident_Reputation TO db_owner, db_borrower;
+REVOKE INSERT, UPDATE ON Ratings, Resident_Reputation FROM db_manager;
+REVOKE ALL ON FUNCTION maintain_reputation(), rate_resident(INT, INT, TEXT, INT) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION rate_resident(INT, INT, TEXT, INT) TO db_owner, db_borrower;
+
+-- 대여 생명주기 함수 (호출자 권한으로 실행되므로 위 테이블 권한이 그대로 적용됨)
+REVOKE ALL ON FUNCTION approve_rental(INT, INT), confirm_return(INT, INT), report_dispute(INT, INT, TEXT),
+                       complete_delivery(INT, INT), cancel_delivery(INT, INT), request_return(INT, INT, TEXT),
+                       lock_residents(INT[]) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION approve_rental(INT, INT), confirm_return(INT, INT), report_dispute(INT, INT, TEXT) TO db_owner;
+GRANT EXECUTE ON FUNCTION complete_delivery(INT, INT), cancel_delivery(INT, INT) TO db_delivery_partner;
+GRANT EXECUTE ON FUNCTION request_return(INT, INT, TEXT) TO db_borrower;
+GRANT EXECUTE ON FUNCTION lock_residents(INT[]) TO db_owner, db_borrower, db_delivery_partner;
+
 -- 매니저 업무 수행을 위한 특정 컬럼 권한 (승인, 배송정지 등)
 GRANT SELECT (resident_id, is_delivery_banned) ON Residents TO db_manager; 
 GRANT UPDATE (status, is_delivery_banned) ON Residents TO db_manager;
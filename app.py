@@ -1,51 +1,360 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import Flask, render_template, request, redirect, url_for, session, flash, send_file, jsonify, get_flashed_messages
 import psycopg2
 from psycopg2 import errors
+from psycopg2.extras import Json
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import date, datetime
+import os
+import random
+import threading
+import time
+import catalog_cache
+import catalog_index
+import media_store
+import query_monitor
+import repository
+from query_monitor import TimedCursor
 
 app = Flask(__name__)
-app.secret_key = 'super_secret_key'  # 실제 배포시엔 복잡한 값 사용
+app.secret_key = os.environ.get('SECRET_KEY', 'super_secret_key')  # 운영 서버(gunicorn.conf.py)는 SECRET_KEY 환경변수가 없으면 시작하지 않음
+
+# 느린 쿼리 로그 / 라우트별 시간 예산 (설정값은 query_monitor.SETTINGS 참고)
+# 실행 계획은 백그라운드 스레드가 같은 접속 인자(풀 키 = 계정 + 단지)로 새로 접속해서 수집
+query_monitor.init_app(app, connect_args=lambda conn: getattr(conn, 'pool_key', None))
+# 사진 업로드를 내용 해시 저장소로 바로 스트리밍 (설정값은 media_store.SETTINGS 참고)
+media_store.init_app(app)
 
 # ==========================================
 # 1. DB 접속 정보 (이원화 전략)
 # ==========================================
+# 운영 환경에서는 환경변수로 지정합니다. (기본값은 로컬 개발용)
 MANAGER_CONF = {
-    'host': 'localhost', 'dbname': 'DB_Term_Project', 'port': '5432',
-    'user': 'db_manager', 'password': 'manager1234' 
+    'host': os.environ.get('DB_HOST', 'localhost'),
+    'dbname': os.environ.get('DB_NAME', 'DB_Term_Project'),
+    'port': os.environ.get('DB_PORT', '5432'),
+    'user': os.environ.get('DB_MANAGER_USER', 'db_manager'),
+    'password': os.environ.get('DB_MANAGER_PASSWORD', 'manager1234'),
 }
 
 RESIDENT_CONF = {
-    'host': 'localhost', 'dbname': 'DB_Term_Project', 'port': '5432',
-    'user': 'db_resident', 'password': 'resident1234'
+    'host': os.environ.get('DB_HOST', 'localhost'),
+    'dbname': os.environ.get('DB_NAME', 'DB_Term_Project'),
+    'port': os.environ.get('DB_PORT', '5432'),
+    'user': os.environ.get('DB_RESIDENT_USER', 'db_resident'),
+    'password': os.environ.get('DB_RESIDENT_PASSWORD', 'resident1234'),
+}
+
+# 샤드(Postgres 인스턴스)별 접속 정보 (계정은 위 역할별 정보를 그대로 사용)
+# replica_dsn: 읽기 전용 복제본(Replica) 접속 정보 (host/port 등). None 이면 모든 쿼리를 Primary로 보냅니다.
+#              예: 'host=localhost port=5433'
+SHARDS = {
+    'default': {'host': MANAGER_CONF['host'], 'port': MANAGER_CONF['port'],
+                'replica_dsn': os.environ.get('DB_REPLICA_DSN') or None},
 }
 
-def get_db_connection():
+# 단지(complex_id) -> 샤드 배치. 목록에 없는 단지는 'default' 샤드에 둡니다.
+# 큰 단지(또는 단지 그룹)를 별도 인스턴스로 옮겨 다른 단지와 자원을 나눠 쓰지 않게 할 수 있습니다.
+# 예: COMPLEX_SHARDS = {7: 'large', 8: 'large'}, SHARDS['large'] = {'host': 'db-large', 'port': '5432', 'replica_dsn': None}
+COMPLEX_SHARDS = {}
+
+def shard_for(complex_id):
+    return SHARDS[COMPLEX_SHARDS.get(complex_id, 'default')]
+
+def shard_conf(conf, shard):
+    """역할별 접속 정보(conf)를 해당 샤드의 host/port로 바꾼 접속 정보"""
+    return {**conf, 'host': shard['host'], 'port': shard['port']}
+
+def connect_complex(conf, complex_id, **kwargs):
+    """
+    단지가 배치된 샤드에 접속하고, 접속 옵션으로 현재 단지(app.complex_id)를 지정하는 함수
+    DB의 행 수준 보안(RLS) 정책이 이 값으로 다른 단지의 행을 걸러내므로, 쿼리마다 단지 조건을 붙일 필요가 없습니다.
+    (별도 SET 문 없이 접속 시 함께 전달되어 추가 왕복이 없음)
+    """
+    return psycopg2.connect(**complex_params(conf, complex_id), **kwargs)
+
+def complex_params(conf, complex_id):
+    params = shard_conf(conf, shard_for(complex_id))
+    if complex_id is not None:
+        params['options'] = f"-c app.complex_id={int(complex_id)}"
+    return params
+
+def list_complexes():
+    """모든 샤드의 단지 목록 [(complex_id, name)] (로그인/가입 화면, 단지별 배치 작업용)"""
+    complexes = []
+    for name, shard in SHARDS.items():
+        conn = psycopg2.connect(**shard_conf(MANAGER_CONF, shard))
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT complex_id, name FROM Complexes ORDER BY complex_id")
+            # 다른 샤드로 옮긴 단지의 예전 행은 건너뜀
+            complexes.extend(c for c in cur.fetchall() if COMPLEX_SHARDS.get(c[0], 'default') == name)
+        finally:
+            cur.close()
+            conn.close()
+    return sorted(complexes)
+
+# ==========================================
+# 접속 풀 (워커 프로세스별)
+# ==========================================
+# 요청마다 새로 접속하면 인증(SCRAM) + 백엔드 프로세스 생성 + 카탈로그 캐시 적재 비용을 매번 치르므로,
+# 웹 요청용 연결은 conn.close() 시 끊지 않고 프로세스 안의 풀에 반납했다가 재사용합니다.
+# 풀은 접속 정보(샤드, 계정, 단지, Replica 여부)별로 따로 두어 RLS 단지 옵션이 섞이지 않습니다.
+# fork 전에 만든 연결을 자식이 함께 쓰면 안 되므로, 운영 서버는 워커가 뜬 뒤(post_worker_init) warm_up()에서 채웁니다.
+POOL_SETTINGS = {
+    'max_idle_per_key': int(os.environ.get('DB_POOL_MAX_IDLE', '4')), # 접속 정보별로 남겨둘 유휴 연결 수
+    'idle_timeout_s': int(os.environ.get('DB_POOL_IDLE_TIMEOUT', '300')), # 오래 쉰 연결은 버림 (DB 재시작/방화벽 끊김 대비)
+    'warm_connections': int(os.environ.get('DB_POOL_WARM', '2')),      # 워커 시작 시 단지별로 미리 열어둘 연결 수
+}
+_pool = {}  # 접속 정보 키 -> [(연결, 반납 시각)]
+
+class PooledConnection(psycopg2.extensions.connection):
+    """close() 하면 실제로 끊지 않고 풀에 반납되는 연결 (기존 라우트의 conn.close() 를 그대로 사용)"""
+    pool_key = None
+    replica = False # replica_connect()로 꺼낸 연결이면 True
+
+    def close(self):
+        if self.pool_key is not None and not self.closed and self._release():
+            return
+        super().close()
+
+    def _release(self):
+        idle = _pool.setdefault(self.pool_key, [])
+        if len(idle) >= POOL_SETTINGS['max_idle_per_key']:
+            return False
+        try:
+            self.rollback() # 커밋하지 않은 트랜잭션은 되돌린 뒤 반납
+        except psycopg2.Error:
+            return False
+        idle.append((self, time.monotonic()))
+        return True
+
+def pooled_connect(*args, **kwargs):
+    """psycopg2.connect 와 같은 인자로 풀에서 연결을 꺼내고, 없으면 새로 접속"""
+    key = (args, tuple(sorted(kwargs.items())))
+    idle = _pool.get(key, [])
+    while idle:
+        conn, released_at = idle.pop()
+        if not conn.closed and time.monotonic() - released_at < POOL_SETTINGS['idle_timeout_s']:
+            return conn
+        psycopg2.extensions.connection.close(conn)
+    conn = psycopg2.connect(*args, connection_factory=PooledConnection, **kwargs)
+    conn.pool_key = key
+    return conn
+
+def close_pool():
+    """풀에 남은 연결을 모두 끊음 (워커 종료 시)"""
+    for idle in _pool.values():
+        for conn, _ in idle:
+            psycopg2.extensions.connection.close(conn)
+    _pool.clear()
+
+def get_db_connection(readonly=False, complex_id=None):
     # 매니저 권한이 세션에 있으면 매니저 계정으로 접속
-    if session.get('is_manager'):
-        return psycopg2.connect(**MANAGER_CONF)
-    else:
-        # 일반 유저나 비로그인 상태면 주민 계정으로 접속
-        return psycopg2.connect(**RESIDENT_CONF)
+    # 일반 유저나 비로그인 상태면 주민 계정으로 접속
+    conf = MANAGER_CONF if session.get('is_manager') else RESIDENT_CONF
+    # 로그인/가입 화면처럼 세션에 단지가 없을 때는 호출하는 쪽이 지정
+    if complex_id is None:
+        complex_id = session.get('complex_id')
+
+    # 조회 전용 요청은 Replica로 라우팅 (Replica 장애/지연 시 Primary로 대체)
+    if readonly and shard_for(complex_id)['replica_dsn']:
+        conn = _connect_replica(conf, complex_id)
+        if conn is not None:
+            return conn
+    return pooled_connect(**complex_params(conf, complex_id), cursor_factory=TimedCursor)
+
+def replica_connect(conf, complex_id):
+    """단지가 배치된 샤드의 Replica에 읽기 전용 연결 (풀에서 재사용)"""
+    conn = pooled_connect(dsn=shard_for(complex_id)['replica_dsn'], dbname=conf['dbname'], user=conf['user'],
+                          password=conf['password'], options=f"-c app.complex_id={int(complex_id)}",
+                          cursor_factory=TimedCursor)
+    if not conn.readonly:
+        conn.set_session(readonly=True)
+    conn.replica = True
+    return conn
+
+def _connect_replica(conf, complex_id):
+    """
+    Replica에 읽기 전용으로 접속하는 함수 (Read-Your-Writes 보장)
+    세션에 기록된 마지막 쓰기 위치(write_lsn)까지 Replica가 재생(replay)하지 못했다면
+    None을 반환하여 Primary에서 읽도록 합니다. (예: 승인 직후 예전 잔액이 보이는 문제 방지)
+    """
+    try:
+        conn = replica_connect(conf, complex_id)
+    except psycopg2.OperationalError as e:
+        print(f"Replica connection failed: {e}")
+        return None
 
-def get_system_manager_id():
-    """시스템 금고 역할을 할 매니저(관리자)의 ID를 조회"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    # 가장 먼저 가입한(ID가 가장 작은) 매니저를 시스템 계정으로 간주
-    cur.execute("SELECT resident_id FROM Residents WHERE is_manager = TRUE ORDER BY resident_id ASC LIMIT 1")
-    manager = cur.fetchone()
-    cur.close()
-    conn.close()
-    return manager[0] if manager else None
+    write_lsn = session.get('write_lsn')
+    if write_lsn:
+        cur = conn.cursor()
+        # Replica가 아니면(pg_last_wal_replay_lsn() IS NULL) 따라잡지 못한 것으로 간주
+        cur.execute("SELECT COALESCE(pg_last_wal_replay_lsn() >= %s::pg_lsn, FALSE)", (write_lsn,))
+        caught_up = cur.fetchone()[0]
+        cur.close()
+        if not caught_up:
+            conn.close()
+            return None
+        # 한 번 따라잡으면 이후 조회는 토큰 검사가 필요 없음
+        session.pop('write_lsn', None)
+    return conn
+
+def commit_write(conn):
+    """
+    쓰기 트랜잭션을 커밋하고, 커밋 직후 Primary의 WAL 위치(LSN)를 세션에 기록하는 함수
+    포인트 이동이나 상태 변경 후에는 conn.commit() 대신 이 함수를 사용합니다.
+    """
+    conn.commit()
+    if shard_for(session.get('complex_id'))['replica_dsn']:
+        cur = conn.cursor()
+        cur.execute("SELECT pg_current_wal_lsn()::text")
+        session['write_lsn'] = cur.fetchone()[0]
+        cur.close()
+        conn.commit()
+
+# ==========================================
+# 포인트 정산 트랜잭션 실행기 (교착/직렬화 실패 시 자동 재시도)
+# ==========================================
+# 포인트가 오가는 전이(승인, 배송 취소, 반납 신청, 반납 확정)는 DB 함수 한 번의 호출이 트랜잭션 전체입니다.
+# 함수 안에서 물품 -> 대여 -> 주민(resident_id 순) 순서로 FOR UPDATE 잠금을 잡으므로 보통은 순서대로 처리되지만,
+# 다른 순서로 잠그는 경로(배치, 관리자 화면)와 만나 교착(40P01)이나 직렬화 실패(40001)가 나면
+# PostgreSQL이 한쪽을 통째로 되돌리므로, 같은 호출을 처음부터 다시 실행해도 이중 정산이 생기지 않습니다.
+# 재시도 사이에는 full jitter 지수 백오프로 기다려 같은 충돌이 같은 박자로 반복되지 않게 하고,
+# max_attempts번 모두 실패하면 마지막 오류를 그대로 올려 라우트의 기존 except가 처리합니다.
+TX_RETRY = {
+    'max_attempts': 4,
+    'base_delay_s': 0.02,
+    'max_delay_s': 0.5,
+}
+_tx_counters = {'retries': 0, 'aborts': 0}  # 워커별 누적 (관리자 탭에 표시)
+_tx_lock = threading.Lock()
+
+def run_transition(conn, query, params):
+    """전이 함수 호출 한 번을 실행하고 커밋한 뒤 결과 행을 반환 (교착/직렬화 실패는 재시도)"""
+    for attempt in range(1, TX_RETRY['max_attempts'] + 1):
+        cur = conn.cursor()
+        try:
+            cur.execute(query, params)
+            row = cur.fetchone()
+            commit_write(conn)
+            return row
+        except (errors.SerializationFailure, errors.DeadlockDetected):
+            conn.rollback()
+            with _tx_lock:
+                _tx_counters['aborts' if attempt == TX_RETRY['max_attempts'] else 'retries'] += 1
+            if attempt == TX_RETRY['max_attempts']:
+                raise
+            cap = min(TX_RETRY['max_delay_s'], TX_RETRY['base_delay_s'] * 2 ** (attempt - 1))
+            time.sleep(random.uniform(0, cap))
+        finally:
+            cur.close()
+
+def transaction_stats():
+    with _tx_lock:
+        return dict(_tx_counters)
+
+# ==========================================
+# 참조 데이터 캐시 & 워커 예열 (운영 서버)
+# ==========================================
+# 잘 바뀌지 않는 참조 데이터(단지 목록)는 워커 프로세스마다 한 번만 조회합니다.
+# 단지를 추가하면 서버를 다시 읽어야(kill -HUP) 로그인 화면에 나타납니다.
+_reference_cache = {}
+
+# 워커 시작 시 연결마다 한 번씩 실행하는 조회 (새 백엔드가 테이블/뷰의 카탈로그와 RLS 정책을 캐시에 올리게 함)
+WARM_QUERIES = [
+    "SELECT * FROM Items LIMIT 0",
+    "SELECT * FROM Rentals LIMIT 0",
+    "SELECT * FROM Disputes LIMIT 0",
+    "SELECT * FROM Rentals_History LIMIT 0",
+    "SELECT * FROM View_Manager_Residents LIMIT 0",
+]
+
+# 카테고리별 추천 대여료 (pricing_job.py가 하루 한 번 갱신하므로 워커는 단지별로 잠시 재사용)
+PRICE_CACHE_TTL_S = 600
+
+def price_suggestions(cur):
+    """{카테고리: (추천 1일 대여료, 다음 주 예상 이용률)}, 캐시가 없거나 오래됐을 때만 cur로 조회"""
+    cache = _reference_cache.setdefault('price_suggestions', {})
+    cached = cache.get(session['complex_id'])
+    if cached is None or time.monotonic() - cached[0] > PRICE_CACHE_TTL_S:
+        cur.execute("SELECT category, suggested_fee, expected_utilization FROM Category_Price_Suggestions")
+        cached = (time.monotonic(), {category: (fee, utilization) for category, fee, utilization in cur.fetchall()})
+        cache[session['complex_id']] = cached
+    return cached[1]
+
+def complex_choices():
+    """로그인/가입 화면의 단지 목록 (요청마다 모든 샤드에 접속하지 않도록 캐시)"""
+    if 'complexes' not in _reference_cache:
+        _reference_cache['complexes'] = list_complexes()
+    return _reference_cache['complexes']
+
+def form_complex_id():
+    """로그인/가입 폼에서 고른 단지 ID (비었거나 목록에 없는 값이면 None)"""
+    raw = request.form.get('complex_id', '')
+    if not raw.isdigit() or int(raw) not in {c[0] for c in complex_choices()}:
+        return None
+    return int(raw)
+
+def _warm_pool(connect):
+    """connect()로 연결을 warm_connections개 열어 WARM_QUERIES를 실행한 뒤 모두 풀에 반납"""
+    conns = [connect() for _ in range(POOL_SETTINGS['warm_connections'])]
+    for conn in conns:
+        cur = conn.cursor()
+        for sql in WARM_QUERIES:
+            cur.execute(sql)
+        cur.close()
+    for conn in conns:
+        conn.close()
+    return len(conns)
+
+def warm_up():
+    """
+    운영 서버 워커가 요청을 받기 전에 한 번 호출 (gunicorn.conf.py 의 post_worker_init)
+    배포 직후 첫 요청들이 템플릿 컴파일, 접속/인증, 카탈로그 적재 비용을 떠안지 않도록 미리 처리합니다.
+    """
+    started = time.perf_counter()
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name) # 컴파일 결과는 jinja 캐시에 남음
+
+    connected = 0
+    for complex_id, _ in complex_choices():
+        for conf in (RESIDENT_CONF, MANAGER_CONF):
+            connected += _warm_pool(lambda: pooled_connect(**complex_params(conf, complex_id), cursor_factory=TimedCursor))
+            if shard_for(complex_id)['replica_dsn']:
+                connected += _warm_pool(lambda: replica_connect(conf, complex_id))
+
+    start_catalog_index()
+    print(f"[warm_up:{os.getpid()}] 템플릿 {len(app.jinja_env.list_templates())}개, 단지 {len(complex_choices())}곳, "
+          f"연결 {connected}개 예열 ({(time.perf_counter() - started) * 1000:.0f}ms)")
+
+def start_catalog_index():
+    """검색 자동완성 색인: 샤드마다 변경 알림을 LISTEN 하는 스레드를 띄우고, 단지별 첫 적재가 끝날 때까지 기다림"""
+    def listen_connect(shard_name):
+        return psycopg2.connect(**shard_conf(MANAGER_CONF, SHARDS[shard_name]))
+
+    def reload(shard_name):
+        # 풀 연결은 요청 처리용이므로 스레드에서는 따로 접속
+        for complex_id, _ in complex_choices():
+            if COMPLEX_SHARDS.get(complex_id, 'default') != shard_name:
+                continue
+            conn = connect_complex(MANAGER_CONF, complex_id)
+            try:
+                catalog_index.load_complex(conn, complex_id)
+            finally:
+                conn.close()
+
+    # 다른 워커/배치의 물품 변경도 같은 알림으로 카탈로그 캐시를 무효화
+    catalog_index.subscribe(catalog_cache.on_item_change)
+    catalog_index.start(SHARDS, listen_connect, reload)
 # app.py
 
 def refresh_user_session(user_id):
     """
     DB에서 최신 회원 정보를 조회하여 세션(Session) 정보를 동기화하는 함수
     돈(Points)이나 상태(Status)가 변경된 직후에 호출하면 무결성이 보장됩니다.
+    (Replica가 방금 쓴 위치까지 따라오지 못했다면 자동으로 Primary에서 읽습니다.)
     """
-    conn = get_db_connection()
+    conn = get_db_connection(readonly=True)
     cur = conn.cursor()
     try:
         cur.execute("SELECT name, points, status, is_manager FROM Residents WHERE resident_id = %s", (user_id,))
@@ -62,32 +371,271 @@ def refresh_user_session(user_id):
         cur.close()
         conn.close()
 
+def action_response(tab, rental_id=None, *, ok):
+    """
+    승인/배송/반납 같은 액션 라우트의 응답을 만드는 함수
+    일반 링크 클릭은 기존처럼 대시보드 탭으로 리다이렉트하고, 대시보드 스크립트의 fetch 요청(Accept: application/json)이면
+    플래시 메시지 + 바뀐 대여 건의 상태 + 내 잔고만 JSON으로 돌려줍니다. (대시보드 전체 쿼리/렌더링 없이 화면을 부분 갱신)
+    ok는 라우트가 실제로 처리했는지 여부입니다. (대시보드는 ok일 때만 행을 지우므로, 플래시 색으로 추측하지 않고 라우트가 넘김)
+    """
+    if request.accept_mimetypes.best != 'application/json':
+        return redirect(url_for('index', tab=tab))
+
+    messages = get_flashed_messages(with_categories=True)
+    rental = None
+    conn = get_db_connection(readonly=True)
+    cur = conn.cursor()
+    try:
+        # 잔고와 대여 건 상태를 한 번에 조회 (rental_id가 없으면 대여 쪽은 NULL)
+        cur.execute("""
+            SELECT res.points, r.rental_id, r.status, r.delivery_status
+            FROM Residents res
+            LEFT JOIN Rentals r ON r.rental_id = %s
+            WHERE res.resident_id = %s
+        """, (rental_id, session['resident_id']))
+        row = cur.fetchone()
+        if row:
+            session['points'] = row[0]
+            if row[1] is not None:
+                rental = {'rental_id': row[1], 'status': row[2], 'delivery_status': row[3]}
+    finally:
+        cur.close()
+        conn.close()
+
+    return jsonify(ok=ok,
+                   messages=[{'category': category, 'message': message} for category, message in messages],
+                   points=session.get('points'),
+                   rental=rental)
+
+def history_tables(include_archive=False):
+    """
+    이력 조회에 사용할 (대여, 분쟁) 테이블 이름을 반환
+    기본은 Hot 파티션만 가진 Rentals/Disputes, 보관 이력 포함 시 archive 파티션까지 합친 뷰를 사용합니다.
+    """
+    if include_archive:
+        return 'Rentals_History', 'Disputes_History'
+    return 'Rentals', 'Disputes'
+
+# ==========================================
+# 이력 검색 (소유자/대여자/배송/분쟁 이력)
+# ==========================================
+# 대시보드는 이력마다 최근 HISTORY_PAGE_SIZE건만 그리고, 검색(/history/<종류>)과 '더 보기'는 서버에서 한 페이지씩 조회합니다.
+#   - 본인 조건(소유자/대여자/기사)이 인덱스로 범위를 좁히고, 기간은 파티션 키(대여 시작일)라 해당 월 파티션만 읽음
+#   - 페이지는 ID 내림차순 키셋(before = 이전 페이지 마지막 ID)이라 뒤 페이지도 OFFSET만큼 건너뛰지 않음
+# select의 컬럼은 model 필드와 같은 이름/순서이고 첫 컬럼은 페이지 커서로 쓰는 ID, names는 상대방 이름 컬럼 (물품명과 함께 검색어로 찾음)
+HISTORY_PAGE_SIZE = 50
+
+HISTORY_SEARCHES = {
+    # 내 물건의 지난 대여 (아직 평가하지 않은 대여자/반납 배송 기사는 평가 버튼)
+    'owner': {
+        'select': """
+            SELECT r.rental_id, i.name AS item_name, u.name AS borrower_name, r.start_date, r.end_date, r.status,
+                    (r.end_date - r.start_date + 1) * i.rent_fee AS total_income,
+                    r.status = 'returned' AND NOT EXISTS (
+                        SELECT 1 FROM Ratings g WHERE g.rental_id = r.rental_id AND g.rater_id = i.owner_id AND g.ratee_id = r.borrower_id
+                    ) AS can_rate_borrower,
+                    r.delivery_option = 'delivery' AND r.delivery_status = 'completed'
+                    AND r.delivery_partner_id IS NOT NULL AND r.delivery_partner_id <> i.owner_id AND NOT EXISTS (
+                        SELECT 1 FROM Ratings g WHERE g.rental_id = r.rental_id AND g.rater_id = i.owner_id AND g.ratee_id = r.delivery_partner_id
+                    ) AS can_rate_partner
+            FROM {rentals} r
+            JOIN Items i ON r.item_id = i.item_id
+            JOIN View_Manager_Residents u ON r.borrower_id = u.resident_id
+            WHERE i.owner_id = %s AND r.status IN ('returned', 'disputed')
+        """,
+        'model': repository.OwnerRentalLog,
+        'names': ('u.name',), 'status': 'r.status', 'statuses': ('returned', 'disputed'),
+        'date': 'r.start_date', 'id': 'r.rental_id',
+    },
+    # 내가 빌렸던 대여 (반납 완료/거절)
+    'borrower': {
+        'select': """
+            SELECT r.rental_id, i.name AS item_name, u.name AS owner_name, r.start_date, r.end_date, r.status,
+                    r.delivery_status, COALESCE(r.late_fee_accrued, 0) AS late_fee_accrued
+            FROM {rentals} r
+            JOIN Items i ON r.item_id = i.item_id
+            JOIN View_Manager_Residents u ON i.owner_id = u.resident_id
+            WHERE r.borrower_id = %s AND r.status IN ('rejected', 'returned')
+        """,
+        'model': repository.BorrowerRentalLog,
+        'names': ('u.name',), 'status': 'r.status', 'statuses': ('returned', 'rejected'),
+        'date': 'r.start_date', 'id': 'r.rental_id',
+    },
+    # 내가 완료한 배송 (반납 완료된 건은 대여자 -> 소유자, 그 외는 소유자 -> 대여자 경로)
+    'delivery': {
+        'select': """
+            SELECT r.rental_id, i.name AS item_name, r.delivery_fee,
+                    CASE WHEN r.status = 'returned' THEN u2.building ELSE u1.building END AS start_building,
+                    CASE WHEN r.status = 'returned' THEN u2.unit ELSE u1.unit END AS start_unit,
+                    CASE WHEN r.status = 'returned' THEN u1.building ELSE u2.building END AS end_building,
+                    CASE WHEN r.status = 'returned' THEN u1.unit ELSE u2.unit END AS end_unit,
+                    r.status
+            FROM {rentals} r
+            JOIN Items i ON r.item_id = i.item_id
+            JOIN View_Manager_Residents u1 ON i.owner_id = u1.resident_id
+            JOIN View_Manager_Residents u2 ON r.borrower_id = u2.resident_id
+            WHERE r.delivery_partner_id = %s AND r.delivery_status = 'completed'
+        """,
+        'model': repository.DeliveryLog,
+        'names': ('u1.name', 'u2.name'), 'status': 'r.status', 'statuses': ('rented', 'overdue', 'returned', 'disputed'),
+        'date': 'r.start_date', 'id': 'r.rental_id',
+    },
+    # 내 물건의 분쟁 기록 (소유자)
+    'owner_disputes': {
+        'select': """
+            SELECT d.dispute_id, i.name AS item_name, u.name AS borrower_name, d.reason, d.resolution, d.status,
+                    d.compensation_amount, r.rental_id
+            FROM {disputes} d
+            JOIN {rentals} r ON d.rental_id = r.rental_id
+            JOIN Items i ON r.item_id = i.item_id
+            JOIN View_Manager_Residents u ON r.borrower_id = u.resident_id
+            WHERE i.owner_id = %s
+        """,
+        'model': repository.OwnerDisputeLog,
+        'names': ('u.name',), 'status': 'd.status', 'statuses': ('open', 'resolved'),
+        'date': 'd.rental_start_date', 'id': 'd.dispute_id',
+    },
+    # 내 분쟁 기록 (대여자)
+    'borrower_disputes': {
+        'select': """
+            SELECT d.dispute_id, i.name AS item_name, u.name AS owner_name, d.reason, d.resolution, d.status,
+                    d.compensation_amount
+            FROM {disputes} d
+            JOIN {rentals} r ON d.rental_id = r.rental_id
+            JOIN Items i ON r.item_id = i.item_id
+            JOIN View_Manager_Residents u ON i.owner_id = u.resident_id
+            WHERE r.borrower_id = %s
+        """,
+        'model': repository.BorrowerDisputeLog,
+        'names': ('u.name',), 'status': 'd.status', 'statuses': ('open', 'resolved'),
+        'date': 'd.rental_start_date', 'id': 'd.dispute_id',
+    },
+}
+
+def search_history(cur, kind, resident_id, include_archive=False, keyword='', status='', date_from=None, date_to=None,
+                   before=None):
+    """
+    이력 한 페이지 (최신순)와 다음 페이지 커서(없으면 None)를 반환
+    keyword: 물품명 또는 상대방 이름, status: 종류별 상태 값 하나, date_from/date_to: 대여 시작일 범위
+    """
+    spec = HISTORY_SEARCHES[kind]
+    rentals_hist, disputes_hist = history_tables(include_archive)
+    query = spec['select'].format(rentals=rentals_hist, disputes=disputes_hist)
+    params = [resident_id]
+
+    if keyword:
+        columns = ('i.name',) + spec['names']
+        query += " AND (" + " OR ".join(f"{c} ILIKE %s" for c in columns) + ")"
+        params.extend([f'%{keyword}%'] * len(columns))
+    if status in spec['statuses']:
+        query += f" AND {spec['status']} = %s"
+        params.append(status)
+    if date_from:
+        query += f" AND {spec['date']} >= %s"
+        params.append(date_from)
+    if date_to:
+        query += f" AND {spec['date']} <= %s"
+        params.append(date_to)
+    if before:
+        query += f" AND {spec['id']} < %s"
+        params.append(before)
+
+    query += f" ORDER BY {spec['id']} DESC LIMIT %s"
+    params.append(HISTORY_PAGE_SIZE + 1) # 한 행 더 읽어서 다음 페이지 여부 판단
+    rows = repository.fetch_all(cur, spec['model'], query, params)
+    if len(rows) > HISTORY_PAGE_SIZE:
+        return rows[:HISTORY_PAGE_SIZE], rows[HISTORY_PAGE_SIZE - 1][0]
+    return rows, None
+
+# 카탈로그 한 페이지의 물품 수 (다음 페이지가 있는지는 한 행 더 읽어서 판단)
+CATALOG_PAGE_SIZE = 24
+
+def load_catalog_page(cur, where, params, facet_counts, facet_params, order_by, page):
+    """(물품 목록 한 페이지, 카테고리별 개수, 다음 페이지 여부)를 한 번의 조회로 가져옴"""
+    category_facets = []
+    items = []
+    cur.execute(f"""
+        WITH me AS (SELECT building FROM View_Manager_Residents WHERE resident_id = %s),
+        counts AS ({facet_counts}),
+        facets AS (
+            SELECT json_agg(json_build_array(c.name, c.icon, COALESCE(n.total, 0), COALESCE(n.mine, 0))
+                            ORDER BY c.sort_order) AS facets
+            FROM Categories c LEFT JOIN counts n ON n.category = c.name
+        )
+        SELECT i.*, f.facets
+        FROM facets f
+        LEFT JOIN LATERAL (
+            SELECT item_id, name, category, rent_fee, expiration_date, description, owner_id, cover_photo,
+                   COALESCE(rep.score, default_reputation_score()) AS owner_score
+            FROM Items LEFT JOIN Resident_Reputation rep ON rep.resident_id = owner_id
+            WHERE {where}
+            ORDER BY {order_by}
+            LIMIT %s OFFSET %s
+        ) i ON TRUE
+    """, (session['resident_id'], *facet_params, *params, CATALOG_PAGE_SIZE + 1, (page - 1) * CATALOG_PAGE_SIZE))
+    for row in cur.fetchall(): # 한 페이지(최대 CATALOG_PAGE_SIZE + 1행)라 한 번에 받음
+        category_facets = row[-1]
+        if row[0] is not None:
+            items.append(row[:-1])
+    return items[:CATALOG_PAGE_SIZE], category_facets, len(items) > CATALOG_PAGE_SIZE
+
+def _unit_sort_key(unit):
+    # 호수(unit)는 VARCHAR이므로 숫자 호수는 숫자 순서(층 -> 호)로, 나머지는 문자열 순서로 정렬
+    unit = str(unit)
+    return (0, int(unit), '') if unit.isdigit() else (1, 0, unit)
+
+def plan_delivery_batches(delivery_market):
+    """
+    배송 콜 대기 목록을 (방향, 출발 동, 도착 동) 단위로 묶어 다중 경유 경로를 만드는 함수
+    - 방향: 대여 배송(outbound, 소유자 -> 대여자) / 반납 배송(return, 대여자 -> 소유자)
+    - 같은 동 안에서는 호수(층) 오름차순으로 픽업/하차하여 오르내리는 동선을 최소화합니다.
+    이미 조회된 delivery_market 행만 사용하므로 추가 쿼리가 없습니다.
+    """
+    groups = {}
+    for call in delivery_market:
+        direction = 'return' if call.status in ('rented', 'overdue') else 'outbound'
+        groups.setdefault((direction, call.start_building, call.end_building), []).append(call)
+
+    batches = []
+    for (direction, start_building, end_building), calls in groups.items():
+        if len(calls) < 2:
+            continue  # 단건 콜은 기존 개별 수락으로 처리
+        pickups = sorted(calls, key=lambda c: _unit_sort_key(c.start_unit))
+        drops = sorted(calls, key=lambda c: _unit_sort_key(c.end_unit))
+        batches.append({
+            'direction': direction,
+            'start_building': start_building,
+            'end_building': end_building,
+            'rental_ids': [c.rental_id for c in pickups],
+            'total_fee': sum(c.delivery_fee for c in calls),
+            'pickups': [(c.start_unit, c.item_name) for c in pickups],  # (호수, 물품명)
+            'drops': [(c.end_unit, c.item_name) for c in drops],
+        })
+
+    # 한 번에 많이, 많이 버는 묶음을 먼저 노출
+    batches.sort(key=lambda b: (-len(b['rental_ids']), -b['total_fee']))
+    return batches
+
 # ==========================================
 # 2. 메인 대시보드 (데이터 조회)
 # ==========================================
 # app.py 의 index 함수 전체 교체
 @app.route('/')
 def index():
-    if 'user_id' not in session:
+    # 단지 정보가 없는 (단지 도입 이전) 세션은 다시 로그인
+    if 'user_id' not in session or 'complex_id' not in session:
         return redirect(url_for('login'))
     
     # [수정] URL에서 'tab' 파라미터를 가져옴 (기본값은 'home')
     active_tab = request.args.get('tab', 'home')
+    # [신규] 보관(archive)된 과거 이력까지 포함해서 볼지 여부 (기본: Hot 파티션만)
+    include_archive = request.args.get('archive') == '1'
+    rentals_hist, disputes_hist = history_tables(include_archive)
     
+    # 연체/만료 처리(쓰기)는 Primary에서 수행
     conn = get_db_connection()
     cur = conn.cursor()
 
-    # ================================================================
-    # [★핵심 추가★] 0-1. 접속 시 포인트 최신화 (DB -> Session 동기화)
-    # 세션에 저장된 포인트 대신 DB의 최신 포인트를 가져와 갱신합니다.
-    # ================================================================
-    cur.execute("SELECT points FROM Residents WHERE resident_id = %s", (session['resident_id'],))
-    result = cur.fetchone()
-    
-    if result:
-        session['points'] = result[0] 
-    # ================================================================
-
     # ======================================================
     # [추가] 0. 접속 시 자동 연체 처리 (Lazy Update)
     # 반납일(end_date)이 어제보다 과거이고, 상태가 아직 'rented'인 경우 -> 'overdue'로 변경
@@ -97,6 +645,7 @@ def index():
         SET status = 'overdue' 
         WHERE status = 'rented' AND end_date < CURRENT_DATE
     """)
+    swept = cur.rowcount
 
     # [추가] 0-2. 물품 공유 만료 처리 (Items)
     # 조건: 'available' 상태이면서, 만료일(expiration_date)이 오늘보다 이전인 경우 -> 'expired'
@@ -104,8 +653,32 @@ def index():
         UPDATE Items SET status = 'expired' 
         WHERE status = 'available' AND expiration_date < CURRENT_DATE
     """)
+    expired = cur.rowcount
+    swept += expired
 
-    conn.commit()
+    if swept:
+        commit_write(conn)
+    else:
+        conn.commit()
+    cur.close()
+    conn.close()
+    if expired:
+        catalog_cache.invalidate(session['complex_id'])
+
+    # 이하 대시보드 조회(목록, 이력, 배송 시장, 관리자 목록)는 모두 읽기 전용 -> Replica
+    conn = get_db_connection(readonly=True)
+    cur = conn.cursor()
+
+    # ================================================================
+    # [★핵심 추가★] 0-1. 접속 시 포인트 최신화 (DB -> Session 동기화)
+    # 세션에 저장된 포인트 대신 DB의 최신 포인트를 가져와 갱신합니다.
+    # ================================================================
+    cur.execute("SELECT points FROM Residents WHERE resident_id = %s", (session['resident_id'],))
+    result = cur.fetchone()
+    
+    if result:
+        session['points'] = result[0] 
+    # ================================================================
 
     # ======================================================
     # [수정] 1. 검색/필터 기능이 적용된 물품 목록 조회
@@ -115,64 +688,120 @@ def index():
     keyword = request.args.get('keyword', '').strip()
     category_filter = request.args.get('category', '')
     sort_option = request.args.get('sort', 'latest')  # 기본값: 최신순
+    page = max(request.args.get('page', 1, type=int), 1)
 
-    # 기본 쿼리: 대여 가능하고 만료되지 않은 물품
-    query = """
-        SELECT item_id, name, category, rent_fee, expiration_date, description, owner_id 
-        FROM Items 
-        WHERE status = 'available' AND expiration_date >= CURRENT_DATE
-    """
+    # 기본 조건: 대여 가능하고 만료되지 않은 물품
+    where = "status = 'available' AND expiration_date >= CURRENT_DATE"
     params = []
 
     # (1) 텍스트 검색 (상품명 또는 설명에 포함)
     if keyword:
-        query += " AND (name ILIKE %s OR description ILIKE %s)"
+        where += " AND (name ILIKE %s OR description ILIKE %s)"
         params.extend([f'%{keyword}%', f'%{keyword}%'])
-    
-    # (2) 카테고리 필터
+
+    # (2) 카테고리별 개수 (카테고리 필터를 고르기 전 기준, 단지 전체 / 우리 동)
+    # 검색어가 없으면 트리거가 유지하는 Category_Counts만 읽고, 검색어가 있으면 검색 결과를 카테고리별로 셈
+    if keyword:
+        facet_counts = f"""
+            SELECT category, COUNT(*) AS total,
+                   COUNT(*) FILTER (WHERE owner_id IN (SELECT resident_id FROM View_Manager_Residents
+                                                       WHERE building = (SELECT building FROM me))) AS mine
+            FROM Items WHERE {where} GROUP BY category
+        """
+    else:
+        facet_counts = """
+            SELECT category, SUM(available_count) AS total,
+                   SUM(available_count) FILTER (WHERE building = (SELECT building FROM me)) AS mine
+            FROM Category_Counts GROUP BY category
+        """
+    facet_params = list(params)
+
+    # (3) 카테고리 필터
     if category_filter:
-        query += " AND category = %s"
+        where += " AND category = %s"
         params.append(category_filter)
 
-    # (3) 정렬 (빠른 만료일순 vs 최신 등록순)
+    # (4) 정렬 (빠른 만료일순 vs 소유자 평판순 vs 최신 등록순)
     if sort_option == 'exp_date':
-        query += " ORDER BY expiration_date ASC, item_id DESC" # 만료일 임박한 순
+        order_by = "expiration_date ASC, item_id DESC" # 만료일 임박한 순
+    elif sort_option == 'reputation':
+        order_by = "owner_score DESC, item_id DESC" # 평판 좋은 소유자의 물품 먼저
     else:
-        query += " ORDER BY item_id DESC" # 최신 등록순 (기본)
+        order_by = "item_id DESC" # 최신 등록순 (기본)
+
+    # 물품 목록 한 페이지와 카테고리별 개수를 한 번의 조회로 가져옴 (개수는 모든 행의 마지막 컬럼, 물품이 없으면 개수만 있는 한 행)
+    # [(이름, 아이콘, 단지 전체 개수, 우리 동 개수)]
+    # 같은 조건의 결과는 워커 캐시(catalog_cache)에서 재사용 (동 정보가 없는 이전 세션은 캐시하지 않음)
+    category_facets = []
+    items = []
+    has_next_page = False
+    cache_key = None
+    if 'building' in session:
+        cache_key = catalog_cache.make_key(session['complex_id'], session['building'], keyword,
+                                           category_filter, sort_option, page)
+    cached = catalog_cache.get(cache_key) if cache_key else None
+    if cached is not None:
+        items, category_facets, has_next_page = cached
+    else:
+        cache_generation = catalog_cache.generation(session['complex_id'])
+        # 캐시에 넣을 결과는 Primary에서 읽음 (무효화된 변경을 아직 재생하지 못한 Replica의 목록이 ttl 동안 남지 않도록)
+        fill_conn = get_db_connection() if cache_key and conn.replica else conn
+        fill_cur = fill_conn.cursor() if fill_conn is not conn else cur
+        try:
+            items, category_facets, has_next_page = load_catalog_page(fill_cur, where, params, facet_counts,
+                                                                      facet_params, order_by, page)
+        finally:
+            if fill_conn is not conn:
+                fill_cur.close()
+                fill_conn.close()
+        if cache_key:
+            catalog_cache.put(cache_key, (items, category_facets, has_next_page), cache_generation)
 
-    cur.execute(query, tuple(params))
-    items = cur.fetchall()
+    # (5) [추천] 우리 동 인기 물품 (recommendation_job.py가 미리 계산한 상위 K개를 인덱스로 조회)
+    cur.execute("""
+        SELECT i.item_id, i.name, i.category, i.rent_fee
+        FROM View_Manager_Residents me
+        JOIN Building_Popular_Items b ON b.building = me.building
+        JOIN Items i ON b.item_id = i.item_id
+        WHERE me.resident_id = %s
+          AND i.status = 'available' AND i.expiration_date >= CURRENT_DATE
+          AND i.owner_id != me.resident_id
+        ORDER BY b.rank
+        LIMIT 4
+    """, (session['resident_id'],))
+    popular_items = cur.fetchall()
 
     # 2. [소유자]
     my_items = []
+    prices = {}
     incoming_requests = []
     arrived_returns = [] 
-    owner_history = []
+    owner_history, owner_history_next = [], None
     my_disputes = [] 
-    dispute_history = [] 
+    dispute_history, dispute_history_next = [], None
 
     # [수정됨] is_verified 대신 status가 'approved'인지 확인
     if session.get('status') == 'approved':
         # [수정] 내가 등록한 물건 조회 (철회된 물건은 제외)
-        cur.execute("""
-            SELECT * FROM Items 
-            WHERE owner_id = %s 
-              AND status != 'withdrawn'  -- [★추가] 철회된 건은 리스트에서 숨김
-            ORDER BY item_id DESC
-        """, (session['resident_id'],))
-        my_items = cur.fetchall()
-        
-        cur.execute("""
-            SELECT r.rental_id, i.name, u.name, r.start_date, r.end_date, r.status
+        my_items = repository.owned_items(cur, session['resident_id'])
+        prices = price_suggestions(cur)
+        
+        # 신청자 평판 (평점, 평가 수, 분쟁 건수, 대여 건수)도 함께 조회
+        incoming_requests = repository.fetch_all(cur, repository.RentalRequest, """
+            SELECT r.rental_id, i.name AS item_name, u.name AS borrower_name, r.start_date, r.end_date, r.status, r.item_id,
+                   COALESCE(rep.score, default_reputation_score()) AS borrower_score,
+                   COALESCE(rep.rating_count, 0) AS borrower_rating_count,
+                   COALESCE(rep.dispute_count, 0) AS borrower_dispute_count,
+                   COALESCE(rep.rental_count, 0) AS borrower_rental_count
             FROM Rentals r JOIN Items i ON r.item_id = i.item_id JOIN View_Manager_Residents u ON r.borrower_id = u.resident_id
+            LEFT JOIN Resident_Reputation rep ON rep.resident_id = r.borrower_id
             WHERE i.owner_id = %s AND r.status = 'requested'
         """, (session['resident_id'],))
-        incoming_requests = cur.fetchall()
 
         # (A) 반납 확인 대기 쿼리 
-        cur.execute("""
-            SELECT r.rental_id, i.name, u.name, 
-                    p.name, p.phone_number 
+        arrived_returns = repository.fetch_all(cur, repository.ArrivedReturn, """
+            SELECT r.rental_id, i.name AS item_name, u.name AS borrower_name,
+                    p.name AS partner_name, p.phone_number AS partner_phone
             FROM Rentals r 
             JOIN Items i ON r.item_id = i.item_id 
             JOIN View_Manager_Residents u ON r.borrower_id = u.resident_id
@@ -181,25 +810,14 @@ def index():
               AND r.delivery_status = 'arrived'
               AND r.status != 'disputed'  -- <--- [범인 후보 1순위] 이 줄이 없으면 무조건 뜹니다.
         """, (session['resident_id'],))
-        arrived_returns = cur.fetchall()
 
-        # [수정] 내 물건의 지난 대여 이력 조회
+        # [수정] 내 물건의 지난 대여 이력 조회 (최근 한 페이지, 검색/더 보기는 /history/owner)
         # 조건: 상태가 'returned'(반납확정) 또는 'disputed'(분쟁중) 인 것만 조회
-        cur.execute("""
-            SELECT r.rental_id, i.name, u.name, r.start_date, r.end_date, r.status, 
-                    (r.end_date - r.start_date + 1) * i.rent_fee as total_income
-            FROM Rentals r 
-            JOIN Items i ON r.item_id = i.item_id 
-            JOIN View_Manager_Residents u ON r.borrower_id = u.resident_id
-            WHERE i.owner_id = %s 
-              AND r.status IN ('returned', 'disputed') 
-            ORDER BY r.rental_id DESC
-        """, (session['resident_id'],))
-        owner_history = cur.fetchall()
+        owner_history, owner_history_next = search_history(cur, 'owner', session['resident_id'], include_archive)
 
         # (B) 진행 중인 분쟁 (기존 my_disputes 유지)
-        cur.execute("""
-            SELECT r.rental_id, i.name, u.name, d.status, d.resolution, d.dispute_id
+        my_disputes = repository.fetch_all(cur, repository.OwnerDispute, """
+            SELECT r.rental_id, i.name AS item_name, u.name AS borrower_name, d.status, d.resolution, d.dispute_id
             FROM Rentals r 
             JOIN Items i ON r.item_id = i.item_id 
             JOIN View_Manager_Residents u ON r.borrower_id = u.resident_id
@@ -208,93 +826,89 @@ def index():
               AND r.status = 'disputed'
             ORDER BY d.dispute_id DESC
         """, (session['resident_id'],))
-        my_disputes = cur.fetchall()
         
-        # (C) [신규] 전체 분쟁 기록 (과거 이력 포함)
-        cur.execute("""
-            SELECT d.dispute_id, i.name, u.name, d.reason, d.resolution, d.status, 
-                    d.compensation_amount, r.rental_id
-            FROM Disputes d
-            JOIN Rentals r ON d.rental_id = r.rental_id
-            JOIN Items i ON r.item_id = i.item_id
-            JOIN View_Manager_Residents u ON r.borrower_id = u.resident_id
-            WHERE i.owner_id = %s
-            ORDER BY d.dispute_id DESC
-        """, (session['resident_id'],))
-        dispute_history = cur.fetchall()
+        # (C) [신규] 전체 분쟁 기록 (과거 이력 포함, 최근 한 페이지)
+        dispute_history, dispute_history_next = search_history(cur, 'owner_disputes', session['resident_id'], include_archive)
 
     # render_template에 owner_history=owner_history 추가 필수!
 
     # 3. [대여자] 탭 데이터 조회 (Active vs History 분리)
     active_rentals = []
-    borrower_history = []
-    borrower_disputes = [] 
+    borrower_history, borrower_history_next = [], None
+    borrower_disputes, borrower_disputes_next = [], None
+    my_waitlist = []
     
     if session.get('status') == 'approved':
         # (A) 진행 중인 대여 (Active)
         # 조건: 요청중, 승인됨, 대여중, 연체됨, 분쟁중
-        cur.execute("""
-            SELECT r.rental_id, i.name, u.name, r.start_date, r.end_date, r.status, 
-                    r.delivery_status, 
-                    p.name, p.phone_number
+        # 배송받은 대여 건은 기사 평판과 평가 가능 여부(아직 평가 안 함)도 함께 조회
+        active_rentals = repository.fetch_all(cur, repository.ActiveRental, """
+            SELECT r.rental_id, i.name AS item_name, u.name AS owner_name, r.start_date, r.end_date, r.status,
+                    r.delivery_status,
+                    p.name AS partner_name, p.phone_number AS partner_phone,
+                    r.late_fee_accrued,
+                    COALESCE(prep.score, default_reputation_score()) AS partner_score,
+                    r.status IN ('rented', 'overdue') AND r.delivery_option = 'delivery' AND r.delivery_status = 'completed'
+                    AND r.delivery_partner_id <> r.borrower_id AND NOT EXISTS (
+                        SELECT 1 FROM Ratings g WHERE g.rental_id = r.rental_id AND g.rater_id = r.borrower_id AND g.ratee_id = r.delivery_partner_id
+                    ) AS can_rate_partner
             FROM Rentals r 
             JOIN Items i ON r.item_id = i.item_id 
             JOIN View_Manager_Residents u ON i.owner_id = u.resident_id 
             LEFT JOIN View_Manager_Residents p ON r.delivery_partner_id = p.resident_id
+            LEFT JOIN Resident_Reputation prep ON prep.resident_id = r.delivery_partner_id
             WHERE r.borrower_id = %s 
               AND r.status IN ('requested', 'approved', 'rented', 'overdue', 'disputed')
             ORDER BY r.rental_id DESC
         """, (session['resident_id'],))
-        active_rentals = cur.fetchall()
 
-        # (B) 지난 대여 이력 (History)
+        # (B) 지난 대여 이력 (History, 최근 한 페이지)
         # 조건: 거절됨(rejected), 반납완료(returned)
-        cur.execute("""
-            SELECT r.rental_id, i.name, u.name, r.start_date, r.end_date, r.status, 
-                    r.delivery_status
-            FROM Rentals r 
-            JOIN Items i ON r.item_id = i.item_id 
-            JOIN View_Manager_Residents u ON i.owner_id = u.resident_id 
-            WHERE r.borrower_id = %s 
-              AND r.status IN ('rejected', 'returned')
-            ORDER BY r.rental_id DESC
-        """, (session['resident_id'],))
-        borrower_history = cur.fetchall()
+        borrower_history, borrower_history_next = search_history(cur, 'borrower', session['resident_id'], include_archive)
 
-        # (C) [신규] 내 분쟁 기록 조회 (내가 대여자인 건)
+        # (C) [신규] 내 분쟁 기록 조회 (내가 대여자인 건, 최근 한 페이지)
+        borrower_disputes, borrower_disputes_next = search_history(cur, 'borrower_disputes', session['resident_id'],
+                                                                   include_archive)
+
+        # (D) 대기 중인 물품과 내 순번 (앞에 선 대기 인원 + 1)
         cur.execute("""
-            SELECT d.dispute_id, i.name, u.name, d.reason, d.resolution, d.status, 
-                    d.compensation_amount
-            FROM Disputes d
-            JOIN Rentals r ON d.rental_id = r.rental_id
-            JOIN Items i ON r.item_id = i.item_id
-            JOIN View_Manager_Residents u ON i.owner_id = u.resident_id 
-            WHERE r.borrower_id = %s
-            ORDER BY d.dispute_id DESC
+            SELECT w.entry_id, i.item_id, i.name, w.days, w.joined_at, i.status,
+                   (SELECT COUNT(*) FROM Waitlist q
+                    WHERE q.item_id = w.item_id AND q.status = 'waiting' AND q.entry_id <= w.entry_id)
+            FROM Waitlist w
+            JOIN Items i ON w.item_id = i.item_id
+            WHERE w.resident_id = %s AND w.status = 'waiting'
+            ORDER BY w.entry_id
         """, (session['resident_id'],))
-        borrower_disputes = cur.fetchall()
+        my_waitlist = cur.fetchall()
 
     # [중요] render_template에 변수명 변경/추가
     # my_rentals -> active_rentals 로 변경하고, borrower_history 추가
 
     # 4. [배송] 탭 로직
     delivery_market = []
+    delivery_batches = []
     my_deliveries = []
-    delivery_history = [] 
+    delivery_history, delivery_history_next = [], None
+    delivery_totals = (0, 0)
     if session.get('status') == 'approved':
         # [수정] WHERE 절 마지막에 AND r.borrower_id != %s 추가
         # 의미: 내가 빌린 건(Borrower가 나인 건)은 배송 시장 리스트에서 제외
-        cur.execute("""
-            SELECT r.rental_id, i.name, r.delivery_fee, 
-                    CASE WHEN r.status IN ('rented', 'overdue') THEN u2.building ELSE u1.building END,
-                    CASE WHEN r.status IN ('rented', 'overdue') THEN u2.unit ELSE u1.unit END,
-                    CASE WHEN r.status IN ('rented', 'overdue') THEN u1.building ELSE u2.building END,
-                    CASE WHEN r.status IN ('rented', 'overdue') THEN u1.unit ELSE u2.unit END,
-                    r.status
+        # 배송을 맡기는 대여자의 평판이 좋은 콜부터 (평점, 평가 수)
+        delivery_market = repository.fetch_all(cur, repository.DeliveryCall, """
+            SELECT r.rental_id, i.name AS item_name, r.delivery_fee,
+                    CASE WHEN r.status IN ('rented', 'overdue') THEN u2.building ELSE u1.building END AS start_building,
+                    CASE WHEN r.status IN ('rented', 'overdue') THEN u2.unit ELSE u1.unit END AS start_unit,
+                    CASE WHEN r.status IN ('rented', 'overdue') THEN u1.building ELSE u2.building END AS end_building,
+                    CASE WHEN r.status IN ('rented', 'overdue') THEN u1.unit ELSE u2.unit END AS end_unit,
+                    r.status,
+                    COALESCE(rep.score, default_reputation_score()) AS borrower_score,
+                    COALESCE(rep.rating_count, 0) AS borrower_rating_count
             FROM Rentals r 
             JOIN Items i ON r.item_id = i.item_id 
             JOIN View_Manager_Residents u1 ON i.owner_id = u1.resident_id 
             JOIN View_Manager_Residents u2 ON r.borrower_id = u2.resident_id
+            LEFT JOIN Resident_Reputation rep ON rep.resident_id = r.borrower_id
             WHERE 
                 (
                     (r.status = 'approved' AND r.delivery_option = 'delivery' AND r.delivery_partner_id IS NULL)
@@ -302,18 +916,20 @@ def index():
                     (r.status IN ('rented', 'overdue') AND r.delivery_status = 'waiting_driver')
                 )
                 AND r.borrower_id != %s  -- [핵심] 내 요청은 안 보이게 처리
+            ORDER BY borrower_score DESC, r.rental_id
         """, (session['resident_id'],))
-        delivery_market = cur.fetchall()
 
+        # [신규] 같은 동-동 구간, 같은 방향의 콜을 묶음 배송 경로로 계획
+        delivery_batches = plan_delivery_batches(delivery_market)
 
         # 내 배송 현황도 동일하게 적용
         # [배송] 내 배송 현황 (기사 입장에서 보는 뷰)
-        cur.execute("""
-            SELECT r.rental_id, i.name, r.delivery_fee, 
-                    CASE WHEN r.status IN ('rented', 'overdue') THEN u2.building ELSE u1.building END,
-                    CASE WHEN r.status IN ('rented', 'overdue') THEN u2.unit ELSE u1.unit END,
-                    CASE WHEN r.status IN ('rented', 'overdue') THEN u1.building ELSE u2.building END,
-                    CASE WHEN r.status IN ('rented', 'overdue') THEN u1.unit ELSE u2.unit END,
+        my_deliveries = repository.fetch_all(cur, repository.MyDelivery, """
+            SELECT r.rental_id, i.name AS item_name, r.delivery_fee,
+                    CASE WHEN r.status IN ('rented', 'overdue') THEN u2.building ELSE u1.building END AS start_building,
+                    CASE WHEN r.status IN ('rented', 'overdue') THEN u2.unit ELSE u1.unit END AS start_unit,
+                    CASE WHEN r.status IN ('rented', 'overdue') THEN u1.building ELSE u2.building END AS end_building,
+                    CASE WHEN r.status IN ('rented', 'overdue') THEN u1.unit ELSE u2.unit END AS end_unit,
                     r.delivery_status, r.status,
                     -- [추가] 출발지/목적지 전화번호 로직
                     CASE WHEN r.status IN ('rented', 'overdue') THEN u2.phone_number ELSE u1.phone_number END as start_phone,
@@ -324,38 +940,35 @@ def index():
             JOIN View_Manager_Residents u2 ON r.borrower_id = u2.resident_id
             WHERE r.delivery_partner_id = %s AND r.delivery_status != 'completed'
         """, (session['resident_id'],))
-        my_deliveries = cur.fetchall()
 
-        # (C) [신규] 배송 완료 이력 (delivery_history)
+        # (C) [신규] 배송 완료 이력 (delivery_history, 최근 한 페이지)
         # 조건: 내가 파트너이고, 배송 상태가 'completed' 인 것
-        # 경로 로직: 반납 완료된 건(returned)은 [대여자->소유자], 대여 중인 건(rented)은 [소유자->대여자]
-        cur.execute("""
-            SELECT r.rental_id, i.name, r.delivery_fee, 
-                    CASE WHEN r.status = 'returned' THEN u2.building ELSE u1.building END as start_b,
-                    CASE WHEN r.status = 'returned' THEN u2.unit ELSE u1.unit END as start_u,
-                    CASE WHEN r.status = 'returned' THEN u1.building ELSE u2.building END as end_b,
-                    CASE WHEN r.status = 'returned' THEN u1.unit ELSE u2.unit END as end_u,
-                    r.status
-            FROM Rentals r 
-            JOIN Items i ON r.item_id = i.item_id 
-            JOIN View_Manager_Residents u1 ON i.owner_id = u1.resident_id 
-            JOIN View_Manager_Residents u2 ON r.borrower_id = u2.resident_id
-            WHERE r.delivery_partner_id = %s 
-              AND r.delivery_status = 'completed'
-            ORDER BY r.rental_id DESC
+        delivery_history, delivery_history_next = search_history(cur, 'delivery', session['resident_id'], include_archive)
+
+        # 총 완료 건수/누적 수익은 페이지와 상관없이 전체 기준
+        cur.execute(f"""
+            SELECT COUNT(*), COALESCE(SUM(delivery_fee), 0) FROM {rentals_hist}
+            WHERE delivery_partner_id = %s AND delivery_status = 'completed'
         """, (session['resident_id'],))
-        delivery_history = cur.fetchall()
+        delivery_totals = cur.fetchone()
 
     # ---------------------------------------
     # 5. [매니저] 승인 대기 & 분쟁 & [신규] 처리 이력 검색
     # ---------------------------------------
     pending_residents = []
     open_disputes = []
+    dispute_photos = {}
     history_residents = [] 
+    history_residents_next = None
+    turnaround_stats = []
+    escrow_balance = (0, 0)
+    catalog_cache_stats = None
+    tx_stats = None
     
     # 검색어(q)와 필터(f) 가져오기 (URL 파라미터)
     search_query = request.args.get('q', '')
     filter_status = request.args.get('f', 'all')
+    residents_before = request.args.get('before', type=int) # 주민 이력 다음 페이지 커서 (이전 페이지 마지막 resident_id)
 
     if session.get('is_manager'):
         # (A) 가입 대기 목록 (Pending)
@@ -367,11 +980,12 @@ def index():
         pending_residents = cur.fetchall()
 
         # (B) 분쟁 목록 (ID 위주 조회)
-        cur.execute("""
-            SELECT d.dispute_id, r.rental_id, d.reason, 
-                    u1.user_id, 
-                    u2.user_id, 
-                    i.name
+        open_disputes = repository.fetch_all(cur, repository.OpenDispute, """
+            SELECT d.dispute_id, r.rental_id, d.reason,
+                    u1.user_id AS owner_user_id,
+                    u2.user_id AS borrower_user_id,
+                    i.name AS item_name,
+                    i.item_id
             FROM Disputes d 
             JOIN Rentals r ON d.rental_id = r.rental_id 
             JOIN Items i ON r.item_id = i.item_id 
@@ -379,10 +993,20 @@ def index():
             JOIN View_Manager_Residents u2 ON r.borrower_id = u2.resident_id
             WHERE d.status = 'open'
         """)
-        open_disputes = cur.fetchall()
+
+        # 분쟁 판결 자료: 증거 사진 + 등록 당시 물품 사진 (분쟁 목록 전체를 한 번에 조회)
+        if open_disputes:
+            for dispute_id, item_id, sha256 in repository.iter_rows(cur, """
+                SELECT dispute_id, item_id, sha256 FROM Attachments
+                WHERE dispute_id = ANY(%s) OR item_id = ANY(%s)
+                ORDER BY attachment_id
+            """, ([d.dispute_id for d in open_disputes], [d.item_id for d in open_disputes])):
+                key = ('dispute', dispute_id) if dispute_id is not None else ('item', item_id)
+                dispute_photos.setdefault(key, []).append(sha256)
         
         # (C) [신규] 주민 관리 이력 (History) - 검색 및 필터링 적용
         # 기본 쿼리: 이미 처리된(승인/거절) 주민만 조회
+        # 이력 검색(search_history)과 같이 resident_id 내림차순 키셋으로 HISTORY_PAGE_SIZE명씩 (단지 전체를 한 번에 그리지 않음)
         query = """
             SELECT resident_id, user_id, name, phone_number, building, unit, status, is_delivery_banned
             FROM View_Manager_Residents 
@@ -401,10 +1025,59 @@ def index():
         elif filter_status == 'rejected':
             query += " AND status = 'rejected'"
         
-        query += " ORDER BY resident_id DESC" # 최신순 정렬
+        if residents_before:
+            query += " AND resident_id < %s"
+            params.append(residents_before)
+
+        query += " ORDER BY resident_id DESC LIMIT %s" # 최신순 정렬
+        params.append(HISTORY_PAGE_SIZE + 1) # 한 행 더 읽어서 다음 페이지 여부 판단
         
         cur.execute(query, tuple(params))
         history_residents = cur.fetchall()
+        if len(history_residents) > HISTORY_PAGE_SIZE:
+            history_residents = history_residents[:HISTORY_PAGE_SIZE]
+            history_residents_next = history_residents[-1][0]
+
+        # (D) 최근 30일 처리 시간 통계 (상태 전이 로그만 사용, 단위: 시간)
+        # 대여 건별로 각 단계에 처음 도달한 시각을 구한 뒤, 단계 사이 간격의 건수/평균/중앙값을 계산
+        cur.execute("""
+            WITH t AS (
+                SELECT rental_id,
+                       MIN(occurred_at) FILTER (WHERE status = 'requested') AS requested_at,
+                       MIN(occurred_at) FILTER (WHERE status = 'approved') AS approved_at,
+                       MIN(occurred_at) FILTER (WHERE status = 'rented') AS rented_at,
+                       MIN(occurred_at) FILTER (WHERE status IN ('rented', 'overdue') AND delivery_status <> 'completed') AS return_requested_at,
+                       MIN(occurred_at) FILTER (WHERE status = 'returned') AS returned_at
+                FROM Rental_Events
+                WHERE complex_id = %s AND occurred_at >= now() - interval '30 days'
+                GROUP BY rental_id
+            ), spans AS (
+                SELECT s.stage, s.ord, EXTRACT(EPOCH FROM s.span) / 3600 AS hours
+                FROM t CROSS JOIN LATERAL (VALUES
+                    ('승인 대기', 1, approved_at - requested_at),
+                    ('수령까지', 2, rented_at - approved_at),
+                    ('대여 기간', 3, return_requested_at - rented_at),
+                    ('반납 처리', 4, returned_at - return_requested_at)
+                ) AS s(stage, ord, span)
+                WHERE s.span IS NOT NULL
+            )
+            SELECT stage, COUNT(*), ROUND(AVG(hours), 1),
+                   ROUND(percentile_cont(0.5) WITHIN GROUP (ORDER BY hours)::numeric, 1)
+            FROM spans
+            GROUP BY stage, ord
+            ORDER BY ord
+        """, (session['complex_id'],))
+        turnaround_stats = cur.fetchall()
+
+        # (E) 배송비 금고 잔액 (대여 건별 보관액의 합, 아직 기사에게 지급되지 않은 배송비)
+        cur.execute("SELECT held, open_rentals FROM View_Escrow_Balance")
+        escrow_balance = cur.fetchone()
+
+        # (F) 카탈로그 캐시 적중률 (이 워커 기준, DB 조회 없음)
+        catalog_cache_stats = catalog_cache.stats()
+
+        # (G) 포인트 정산 트랜잭션 재시도/포기 횟수 (이 워커 기준, DB 조회 없음)
+        tx_stats = transaction_stats()
 
     cur.close()
     conn.close()
@@ -412,7 +1085,12 @@ def index():
     return render_template('dashboard.html', 
                             active_tab=active_tab, 
                             items=items,
+                            page=page,
+                            has_next_page=has_next_page,
+                            popular_items=popular_items,
+                            category_facets=category_facets,
                             my_items=my_items,
+                            price_suggestions=prices,
                             incoming_requests=incoming_requests,
                             arrived_returns=arrived_returns,
                             owner_history=owner_history, 
@@ -421,14 +1099,27 @@ def index():
                             active_rentals=active_rentals, 
                             borrower_history=borrower_history, 
                             borrower_disputes=borrower_disputes,
+                            my_waitlist=my_waitlist,
                             delivery_market=delivery_market,
+                            delivery_batches=delivery_batches,
                             my_deliveries=my_deliveries,
                             delivery_history=delivery_history, 
+                            delivery_totals=delivery_totals,
+                            history_next={'owner': owner_history_next, 'owner_disputes': dispute_history_next,
+                                          'borrower': borrower_history_next, 'borrower_disputes': borrower_disputes_next,
+                                          'delivery': delivery_history_next},
                             pending_residents=pending_residents,
                             open_disputes=open_disputes,
+                            dispute_photos=dispute_photos,
                             history_residents=history_residents,
+                            history_residents_next=history_residents_next,
+                            turnaround_stats=turnaround_stats,
+                            escrow_balance=escrow_balance,
+                            catalog_cache_stats=catalog_cache_stats,
+                            tx_stats=tx_stats,
                             search_query=search_query,
                             filter_status=filter_status,
+                            include_archive=include_archive,
                             session=session,
                             date_today=date.today())
 
@@ -444,8 +1135,13 @@ def signup():
         phone = request.form['phone']
         building = request.form['building']
         unit = request.form['unit']
+        complex_id = form_complex_id()
+        if complex_id is None:
+            flash("❌ 단지를 다시 선택해주세요.", "danger")
+            return render_template('signup.html', complexes=complex_choices())
 
-        conn = get_db_connection()
+        # 선택한 단지의 샤드에 가입 (complex_id 컬럼은 접속 단지로 자동 입력)
+        conn = get_db_connection(complex_id=complex_id)
         cur = conn.cursor()
         try:
             # status는 기본값 'pending' 자동 입력됨
@@ -471,7 +1167,7 @@ def signup():
         finally:
             cur.close()
             conn.close()
-    return render_template('signup.html')
+    return render_template('signup.html', complexes=complex_choices())
 
 # app.py
 
@@ -480,17 +1176,20 @@ def login():
     if request.method == 'POST':
         user_id = request.form['user_id']
         password = request.form['password']
+        complex_id = form_complex_id()
+        if complex_id is None:
+            flash("❌ 단지를 다시 선택해주세요.", "danger")
+            return render_template('login.html', complexes=complex_choices())
         
-        conn = get_db_connection()
+        # 아이디는 단지 안에서만 유일하므로 선택한 단지에서 조회
+        conn = get_db_connection(complex_id=complex_id)
         cur = conn.cursor()
-        cur.execute("SELECT * FROM Residents WHERE user_id = %s", (user_id,))
-        user = cur.fetchone()
+        user = repository.find_resident_login(cur, user_id)
         cur.close()
         conn.close()
         
-        if user and check_password_hash(user[2], password):
-            # user 테이블 인덱스: 0:id, 1:uid, 2:pw, ..., 8:status
-            status = user[8] 
+        if user and check_password_hash(user.password, password):
+            status = user.status
             
             # [핵심 추가] 상태가 'approved'가 아니면 로그인 차단
             if status == 'pending':
@@ -502,18 +1201,20 @@ def login():
                 return redirect(url_for('login'))
             
             # 승인된 경우에만 세션 생성
-            session['user_id'] = user[1]
-            session['resident_id'] = user[0]
-            session['name'] = user[3]
-            session['is_manager'] = user[9]
-            session['points'] = user[7]
-            session['status'] = user[8] # approved
+            session['user_id'] = user.user_id
+            session['resident_id'] = user.resident_id
+            session['name'] = user.name
+            session['is_manager'] = user.is_manager
+            session['points'] = user.points
+            session['status'] = user.status # approved
+            session['complex_id'] = complex_id
+            session['building'] = user.building # 카탈로그 캐시 키 (카테고리별 '우리 동' 개수)
             
             return redirect(url_for('index'))
         else:
             flash('아이디 또는 비밀번호가 올바르지 않습니다.', 'danger')
             
-    return render_template('login.html')
+    return render_template('login.html', complexes=complex_choices())
 @app.route('/logout')
 def logout():
     session.clear()
@@ -532,18 +1233,39 @@ def register_item():
     name = request.form['name']
     category = request.form['category']
     desc = request.form['description']
-    fee = request.form['rent_fee']
+    fee = request.form.get('rent_fee') or None # 비워두면 카테고리 추천가
+    # [신규] 1일 연체료 (비워두면 카테고리 정책 또는 1일 대여료 적용)
+    late_fee = request.form.get('late_fee_per_day') or None
     exp_date = request.form['expiration_date']
 
+    # [신규] 물품 상태 사진 (첫 장이 목록에 보이는 대표 사진)
+    try:
+        photos = media_store.save_uploads(request.files.getlist('photos'))
+    except media_store.MediaError as e:
+        flash(f"❌ {e}", "danger")
+        return redirect(url_for('index', tab='home'))
+
     conn = get_db_connection()
     cur = conn.cursor()
     try:
+        if fee is None:
+            suggestion = price_suggestions(cur).get(category)
+            if suggestion is None:
+                raise ValueError("이 카테고리는 아직 추천 대여료가 없습니다. 1일 대여료를 입력해주세요.")
+            fee = suggestion[0]
         cur.execute("""
-            INSERT INTO Items (owner_id, name, category, description, rent_fee, expiration_date)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """, (session['resident_id'], name, category, desc, fee, exp_date))
-        conn.commit()
-        flash("📦 물품이 등록되었습니다.", "success")
+            INSERT INTO Items (owner_id, name, category, description, rent_fee, late_fee_per_day, expiration_date, cover_photo)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            RETURNING item_id
+        """, (session['resident_id'], name, category, desc, fee, late_fee, exp_date, photos[0][0] if photos else None))
+        item_id = cur.fetchone()[0]
+        cur.executemany("""
+            INSERT INTO Attachments (sha256, content_type, byte_size, item_id, uploaded_by)
+            VALUES (%s, %s, %s, %s, %s)
+        """, [(sha256, content_type, size, item_id, session['resident_id']) for sha256, content_type, size in photos])
+        commit_write(conn)
+        catalog_cache.invalidate(session['complex_id'])
+        flash(f"📦 물품이 등록되었습니다. (1일 대여료 {fee}P)", "success")
     except Exception as e:
         conn.rollback()
         flash(f"등록 실패: {e}", "danger")
@@ -558,13 +1280,20 @@ def rent_item(item_id):
         flash("❌ 승인된 주민만 대여할 수 있습니다.", "warning")
         return redirect(url_for('index'))
 
-    conn = get_db_connection()
+    # 신청서 화면(GET)은 조회만 하므로 Replica, 신청(POST)은 Primary
+    conn = get_db_connection(readonly=request.method == 'GET')
     cur = conn.cursor()
 
-    cur.execute("SELECT * FROM Items WHERE item_id = %s", (item_id,))
-    item = cur.fetchone()
+    item = repository.get_item(cur, item_id)
+
+    # 없는 물품 (다른 단지의 물품도 RLS로 보이지 않음)
+    if item is None:
+        cur.close()
+        conn.close()
+        flash("❌ 존재하지 않는 물품입니다.", "danger")
+        return redirect(url_for('index'))
 
-    if item[1] == session['resident_id']:
+    if item.owner_id == session['resident_id']:
         flash("🚫 본인의 물건은 대여할 수 없습니다.", "danger")
         return redirect(url_for('index'))
     
@@ -588,14 +1317,42 @@ def rent_item(item_id):
 
         delivery_option = request.form['delivery_option']
         del_fee = 500 if delivery_option == 'delivery' else 0
-        total_cost = (days * item[5]) + del_fee
+        total_cost = (days * item.rent_fee) + del_fee
+
+        # 대여 중/분쟁 중인 물품은 신청 대신 대기열에 등록 (반납되면 차례대로 자동 신청)
+        if item.status != 'available':
+            try:
+                if item.status not in ('rented', 'disputed'):
+                    raise ValueError("지금은 대기할 수 없는 물품입니다.")
+                cur.execute("""
+                    INSERT INTO Waitlist (item_id, resident_id, days, delivery_option)
+                    VALUES (%s, %s, %s, %s)
+                """, (item_id, session['resident_id'], days, delivery_option))
+                cur.execute("""
+                    SELECT COUNT(*) FROM Waitlist WHERE item_id = %s AND status = 'waiting'
+                """, (item_id,))
+                position = cur.fetchone()[0]
+                commit_write(conn)
+                flash(f"⏳ 대기열에 등록되었습니다. (현재 {position}번째) 차례가 되면 자동으로 대여 신청됩니다.", "success")
+                return redirect(url_for('index', tab='borrower'))
+            except errors.UniqueViolation:
+                conn.rollback()
+                flash("이미 이 물품의 대기열에 등록되어 있습니다.", "warning")
+                return redirect(url_for('index', tab='borrower'))
+            except Exception as e:
+                conn.rollback()
+                flash(f"대기 등록 실패: {e}", "danger")
+                return redirect(url_for('index'))
+            finally:
+                cur.close()
+                conn.close()
 
         try:
             cur.execute("""
                 INSERT INTO Rentals (item_id, borrower_id, start_date, end_date, delivery_option, delivery_fee)
                 VALUES (%s, %s, %s, %s, %s, %s)
             """, (item_id, session['resident_id'], start_date_obj, end_date_str, delivery_option, del_fee))
-            conn.commit()
+            commit_write(conn)
             flash("✅ 대여 신청 완료! 승인을 기다리세요.", "success")
             return redirect(url_for('index', tab='borrower'))
         except Exception as e:
@@ -605,9 +1362,66 @@ def rent_item(item_id):
             cur.close()
             conn.close()
 
+    # [추천] 이 물품을 빌린 이웃들이 함께 빌린 물품 (미리 계산된 상위 K개를 인덱스로 조회)
+    cur.execute("""
+        SELECT i.item_id, i.name, i.category, i.rent_fee
+        FROM Item_Recommendations r
+        JOIN Items i ON r.recommended_item_id = i.item_id
+        WHERE r.item_id = %s
+          AND i.status = 'available' AND i.expiration_date >= CURRENT_DATE
+          AND i.owner_id != %s
+        ORDER BY r.rank
+        LIMIT 4
+    """, (item_id, session['resident_id']))
+    also_rented = cur.fetchall()
+
+    # 등록 시 첨부된 물품 상태 사진
+    cur.execute("SELECT sha256 FROM Attachments WHERE item_id = %s ORDER BY attachment_id", (item_id,))
+    photos = [row[0] for row in cur.fetchall()]
+
+    # 대여 중인 물품이면 대기 인원 / 내 순번 (대기열 등록 화면으로 표시)
+    waitlist = None
+    if item.status in ('rented', 'disputed'):
+        cur.execute("""
+            SELECT COUNT(*),
+                   COUNT(*) FILTER (WHERE entry_id <= (SELECT entry_id FROM Waitlist
+                                                       WHERE item_id = %s AND resident_id = %s AND status = 'waiting'))
+            FROM Waitlist WHERE item_id = %s AND status = 'waiting'
+        """, (item_id, session['resident_id'], item_id))
+        waitlist = cur.fetchone()
+
     cur.close()
     conn.close()
-    return render_template('rent_form.html', item=item, date_today=date.today(), my_points=my_points)
+    return render_template('rent_form.html', item=item, date_today=date.today(), my_points=my_points,
+                           also_rented=also_rented, photos=photos, waitlist=waitlist)
+
+# ==========================================
+# 대기열 취소
+# ==========================================
+@app.route('/leave_waitlist/<int:entry_id>')
+def leave_waitlist(entry_id):
+    if 'user_id' not in session: return redirect(url_for('login'))
+
+    ok = False
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            UPDATE Waitlist SET status = 'cancelled'
+            WHERE entry_id = %s AND resident_id = %s AND status = 'waiting'
+        """, (entry_id, session['resident_id']))
+        if cur.rowcount == 0:
+            raise ValueError("취소할 수 있는 대기가 없습니다.")
+        commit_write(conn)
+        flash("대기를 취소했습니다.", "info")
+        ok = True
+    except Exception as e:
+        conn.rollback()
+        flash(f"❌ 대기 취소 실패: {e}", "danger")
+    finally:
+        cur.close()
+        conn.close()
+    return action_response('borrower', ok=ok)
 
 # [핵심] 대여 승인 (트랜잭션)
 # app.py
@@ -617,90 +1431,28 @@ def rent_item(item_id):
 def approve_rental(rental_id):
     if session.get('status') != 'approved': return "권한 없음"
 
+    ok = False
     conn = get_db_connection()
-    cur = conn.cursor()
 
     try:
-        # 1. 정보 조회
-        cur.execute("""
-            SELECT r.borrower_id, i.owner_id, i.rent_fee, r.start_date, r.end_date, r.delivery_fee, r.item_id
-            FROM Rentals r JOIN Items i ON r.item_id = i.item_id 
-            WHERE r.rental_id = %s
-        """, (rental_id,))
-        data = cur.fetchone()
-        
-        if not data: return "데이터 없음"
-        
-        borrower, owner, fee_per_day, s_date, e_date, del_fee, item_id = data
-        
-        # 권한 체크 (본인 물건인지)
-        if owner != session['resident_id']:
-            return "권한 없음"
-
-        # [수정] 배송비를 보관할 시스템 매니저(금고) ID 조회
-        cur.execute("SELECT resident_id FROM Residents WHERE is_manager = TRUE ORDER BY resident_id ASC LIMIT 1")
-        manager_data = cur.fetchone()
-        
-        if not manager_data:
-            flash("시스템 관리자가 없어 결제를 진행할 수 없습니다.", "danger")
-            return redirect(url_for('index', tab='owner'))
-        
-        manager_id = manager_data[0]
-
-        # [수정] 비용 계산 분리
-        days = (e_date - s_date).days + 1
-        rent_total = days * fee_per_day  # 순수 대여료
-        delivery_total = del_fee         # 배송비
-        total_cost = rent_total + delivery_total # 대여자가 낼 총액
-
-        # 2. 포인트 정산 (트랜잭션 분리: 대여자 -> 소유자 & 매니저)
-        # (A) 대여자: 총액 차감
-        cur.execute("UPDATE Residents SET points = points - %s WHERE resident_id = %s", (total_cost, borrower))
-        
-        # (B) 소유자: 대여료만 입금
-        if rent_total > 0:
-            cur.execute("UPDATE Residents SET points = points + %s WHERE resident_id = %s", (rent_total, owner))
-            
-        # (C) 매니저(플랫폼): 배송비 입금 (에스크로)
-        if delivery_total > 0:
-            cur.execute("UPDATE Residents SET points = points + %s WHERE resident_id = %s", (delivery_total, manager_id))
-        
-        # 3. 해당 대여 건 승인 처리
-        cur.execute("UPDATE Rentals SET status = 'approved' WHERE rental_id = %s", (rental_id,))
-        
-        # 4. 물품 상태 변경 (대여중으로 변경하여 목록에서 숨김)
-        cur.execute("UPDATE Items SET status = 'rented' WHERE item_id = %s", (item_id,))
-        
-        # 5. 동시 요청 자동 거절 (Auto-Reject)
-        cur.execute("""
-            UPDATE Rentals 
-            SET status = 'rejected' 
-            WHERE item_id = %s AND status = 'requested' AND rental_id != %s
-        """, (item_id, rental_id))
-
-        # 6. 배송 상태 설정
-        if del_fee > 0:
-            cur.execute("UPDATE Rentals SET delivery_status = 'waiting_driver' WHERE rental_id = %s", (rental_id,))
-        else:
-            # 직거래: 대여자 본인을 배송 기사로 자동 지정
-            cur.execute("""
-                UPDATE Rentals 
-                SET delivery_partner_id = %s, delivery_status = 'accepted' 
-                WHERE rental_id = %s
-            """, (borrower, rental_id))
-        
-        conn.commit()
+        # 조회 -> 권한/상태 검증 -> 포인트 정산 -> 승인 -> 물품 잠금 -> 자동 거절 -> 배송 상태 설정
+        # 전체를 DB 함수 한 번의 호출로 처리 (행 잠금은 함수 안에서만 유지됨)
+        rent_total = run_transition(conn, "SELECT approve_rental(%s, %s)", (rental_id, session['resident_id']))[0]
+        catalog_cache.invalidate(session['complex_id']) # 물품이 대여 중으로 바뀌어 목록에서 빠짐
         refresh_user_session(session['resident_id']) # 세션 동기화
         
         flash(f"✅ 승인 완료! 대여료 {rent_total}P가 입금되었습니다. (배송비는 플랫폼 보관)", "success")
+        ok = True
 
+    except errors.RaiseException as e:
+        conn.rollback()
+        flash(f"❌ 승인 실패: {e.diag.message_primary}", "danger")
     except Exception as e:
         conn.rollback()
         flash(f"❌ 승인 실패: {e}", "danger")
     finally:
-        cur.close()
         conn.close()
-    return redirect(url_for('index', tab='owner'))
+    return action_response('owner', rental_id, ok=ok)
 # ==========================================
 # 대여 거절
 # ==========================================
@@ -709,11 +1461,11 @@ def reject_rental(rental_id):
     conn = get_db_connection()
     cur = conn.cursor()
     cur.execute("UPDATE Rentals SET status = 'rejected' WHERE rental_id = %s", (rental_id,))
-    conn.commit()
+    commit_write(conn)
     cur.close()
     conn.close()
     flash("요청을 거절했습니다.", "warning")
-    return redirect(url_for('index', tab='owner'))
+    return action_response('owner', rental_id, ok=True)
 # ==========================================
 # 물품등록 철회
 # ==========================================
@@ -721,6 +1473,7 @@ def reject_rental(rental_id):
 def withdraw_item(item_id):
     if 'user_id' not in session: return redirect(url_for('login'))
     
+    ok = False
     conn = get_db_connection()
     cur = conn.cursor()
     try:
@@ -733,13 +1486,15 @@ def withdraw_item(item_id):
         
         if owner_id != session['resident_id']:
             flash("권한이 없습니다.", "danger")
-            return redirect(url_for('index', tab='owner'))
+            return action_response('owner', ok=False)
             
         # 2. 철회 처리 (available 일 때만 가능)
         if status == 'available':
             cur.execute("UPDATE Items SET status = 'withdrawn' WHERE item_id = %s", (item_id,))
-            conn.commit()
+            commit_write(conn)
+            catalog_cache.invalidate(session['complex_id'])
             flash("✅ 물품 등록이 철회되었습니다. 더 이상 목록에 노출되지 않습니다.", "success")
+            ok = True
         else:
             flash(f"❌ 현재 '{status}' 상태이므로 철회할 수 없습니다.", "warning")
             
@@ -750,31 +1505,99 @@ def withdraw_item(item_id):
         cur.close()
         conn.close()
         
-    return redirect(url_for('index', tab='owner'))
+    return action_response('owner', ok=ok)
 
 # ========================================== 
 # 5. 배송 및 관리자 기능
 # ==========================================
 @app.route('/accept_delivery/<int:rental_id>')
 def accept_delivery(rental_id):
-    # [추가] 배송 정지 여부 확인
     conn = get_db_connection()
     cur = conn.cursor()
-    cur.execute("SELECT is_delivery_banned FROM Residents WHERE resident_id = %s", (session['resident_id'],))
-    is_banned = cur.fetchone()[0]
-    
-    if is_banned:
-        flash("🚫 관리자에 의해 배송 활동이 정지되었습니다.", "danger")
-        return redirect(url_for('index', tab='delivery'))
-    cur.execute("""
-        UPDATE Rentals 
-        SET delivery_partner_id = %s, delivery_status = 'accepted'
-        WHERE rental_id = %s
-    """, (session['resident_id'], rental_id))
-    conn.commit()
-    cur.close()
-    conn.close()
+    try:
+        # [추가] 배송 정지 여부 확인
+        cur.execute("SELECT is_delivery_banned FROM Residents WHERE resident_id = %s", (session['resident_id'],))
+        is_banned = cur.fetchone()[0]
+
+        if is_banned:
+            flash("🚫 관리자에 의해 배송 활동이 정지되었습니다.", "danger")
+            return action_response('delivery', rental_id, ok=False)
+        # 아직 시장에 남아있는 콜만 배정 (다른 기사가 먼저 수락했거나 오래된 화면에서 누른 경우는 0건)
+        cur.execute("""
+            UPDATE Rentals 
+            SET delivery_partner_id = %s, delivery_status = 'accepted'
+            WHERE rental_id = %s
+              AND delivery_status = 'waiting_driver' AND delivery_partner_id IS NULL
+              AND borrower_id != %s
+        """, (session['resident_id'], rental_id, session['resident_id']))
+        if cur.rowcount != 1:
+            conn.rollback()
+            flash("❌ 이미 다른 기사에게 배정되었거나 더 이상 배송을 기다리지 않는 콜입니다. 목록을 새로고침 해주세요.", "warning")
+            return action_response('delivery', rental_id, ok=False)
+        # [알림] 같은 트랜잭션에서 Outbox에 적재 (발송은 notification_worker.py)
+        cur.execute("SELECT notify_rental_event(%s, 'driver_assigned', 'both', %s)", (rental_id, session['resident_id']))
+        commit_write(conn)
+    finally:
+        # 정지/배정 실패로 일찍 반환할 때도 연결을 풀에 반납 (열린 트랜잭션은 반납 시 롤백)
+        cur.close()
+        conn.close()
     flash("🛵 배송을 수락했습니다! 안전하게 배달해주세요.", "success")
+    return action_response('delivery', rental_id, ok=True)
+
+# ==========================================
+# 묶음 배송 수락 (다중 경유)
+# ==========================================
+@app.route('/accept_delivery_batch', methods=['POST'])
+def accept_delivery_batch():
+    if session.get('status') != 'approved':
+        flash("❌ 승인된 주민만 배송을 수락할 수 있습니다.", "warning")
+        return redirect(url_for('index', tab='delivery'))
+
+    raw_ids = request.form.getlist('rental_ids')
+    if not all(r.isdigit() for r in raw_ids):
+        flash("❌ 선택한 배송 목록이 올바르지 않습니다. 목록을 새로고침 해주세요.", "danger")
+        return redirect(url_for('index', tab='delivery'))
+    rental_ids = [int(r) for r in raw_ids]
+    if not rental_ids:
+        return redirect(url_for('index', tab='delivery'))
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT is_delivery_banned FROM Residents WHERE resident_id = %s", (session['resident_id'],))
+        if cur.fetchone()[0]:
+            flash("🚫 관리자에 의해 배송 활동이 정지되었습니다.", "danger")
+            return redirect(url_for('index', tab='delivery'))
+
+        # 묶음 전체를 한 문장으로 배정 (아직 시장에 남아있는 콜만 대상)
+        cur.execute("""
+            UPDATE Rentals 
+            SET delivery_partner_id = %s, delivery_status = 'accepted'
+            WHERE rental_id = ANY(%s)
+              AND borrower_id != %s
+              AND (
+                    (status = 'approved' AND delivery_option = 'delivery' AND delivery_partner_id IS NULL)
+                    OR 
+                    (status IN ('rented', 'overdue') AND delivery_status = 'waiting_driver')
+              )
+        """, (session['resident_id'], rental_ids, session['resident_id']))
+
+        # 원자성: 한 건이라도 다른 기사가 먼저 가져갔으면 묶음 전체를 취소
+        if cur.rowcount != len(set(rental_ids)):
+            conn.rollback()
+            flash("❌ 묶음 중 일부 콜이 이미 다른 기사에게 배정되었습니다. 목록을 새로고침 해주세요.", "warning")
+        else:
+            cur.execute("SELECT notify_rental_event(id, 'driver_assigned', 'both', %s) FROM unnest(%s::int[]) AS id",
+                        (session['resident_id'], rental_ids))
+            commit_write(conn)
+            flash(f"🛵 묶음 배송 {len(rental_ids)}건을 수락했습니다! 안내된 경로 순서대로 배달해주세요.", "success")
+    except Exception as e:
+        conn.rollback()
+        flash(f"오류: {e}", "danger")
+    finally:
+        cur.close()
+        conn.close()
+
     return redirect(url_for('index', tab='delivery'))
 
 @app.route('/pickup_delivery/<int:rental_id>')
@@ -782,11 +1605,11 @@ def pickup_delivery(rental_id):
     conn = get_db_connection()
     cur = conn.cursor()
     cur.execute("UPDATE Rentals SET delivery_status = 'picked_up' WHERE rental_id = %s", (rental_id,))
-    conn.commit()
+    commit_write(conn)
     cur.close()
     conn.close()
     flash("📦 물품을 픽업했습니다.", "info")
-    return redirect(url_for('index', tab='delivery'))
+    return action_response('delivery', rental_id, ok=True)
 
 # 2. 배송 취소 라우트 추가 (app.py 맨 아래쪽이나 accept_delivery 근처)
 # ---------------------------------------------------------
@@ -794,81 +1617,31 @@ def pickup_delivery(rental_id):
 def cancel_delivery(rental_id):
     if 'user_id' not in session: return redirect(url_for('login'))
     
+    ok = False
     conn = get_db_connection()
-    cur = conn.cursor()
     
     try:
-        # 1. 현재 배송 정보와 관련자(Borrower, Owner) 정보 조회
-        cur.execute("""
-            SELECT r.delivery_fee, r.borrower_id, i.owner_id, r.delivery_partner_id, r.delivery_status
-            FROM Rentals r JOIN Items i ON r.item_id = i.item_id 
-            WHERE r.rental_id = %s
-        """, (rental_id,))
-        result = cur.fetchone()
-
-        if not result: return "잘못된 접근"
-        
-        fee, borrower_id, owner_id, partner_id, status = result
-        
-        # 권한 체크: 내 배송이 맞는지, 그리고 취소 가능한 상태(accepted)인지
-        if partner_id != session['resident_id'] or status != 'accepted':
-            flash("❌ 취소할 수 없는 상태입니다.", "danger")
-            return redirect(url_for('index', tab='delivery'))
+        # 직거래(0원) 건이면 500P 결제 후 배송 대행으로 전환, 대행 건이면 기사 대기 목록으로 복귀
+        outcome = run_transition(conn, "SELECT cancel_delivery(%s, %s)", (rental_id, session['resident_id']))[0]
+        # [수정] 500P를 썼거나, 변동이 있었으니 확실하게 동기화
+        refresh_user_session(session['resident_id'])
 
-        # ==========================================================
-        # [핵심 로직] 직거래(0원) 취소 시 -> 배송 대행(500원)으로 전환
-        # ==========================================================
-        if fee == 0:
-            # (1) 잔액 확인
-            cur.execute("SELECT points FROM Residents WHERE resident_id = %s", (session['resident_id'],))
-            my_points = cur.fetchone()[0]
-            
-            if my_points < 500:
-                flash("❌ 직거래를 취소하고 배송 대행을 맡기려면 500P가 필요합니다. (잔액 부족)", "danger")
-                return redirect(url_for('index', tab='delivery'))
-            
-            # (2) 포인트 결제 (나 -> 소유자 에스크로)
-            cur.execute("UPDATE Residents SET points = points - 500 WHERE resident_id = %s", (session['resident_id'],))
-            cur.execute("UPDATE Residents SET points = points + 500 WHERE resident_id = %s", (owner_id,))
-            
-            # (3) 렌탈 정보 업데이트 (배송비 0 -> 500, 옵션 변경)
-            # 직거래를 포기했으니 이제 이 건은 '배송 대행' 건이 됩니다.
-            cur.execute("""
-                UPDATE Rentals 
-                SET delivery_partner_id = NULL, 
-                    delivery_status = 'waiting_driver',
-                    delivery_fee = 500,
-                    delivery_option = 'delivery'
-                WHERE rental_id = %s
-            """, (rental_id,))
-            
+        if outcome == 'converted':
             flash("✅ 직거래를 취소했습니다. 500P가 결제되었으며 배송 기사를 기다립니다.", "info")
-
-        # ==========================================================
-        # [일반 로직] 원래 배송 대행(500원)이었던 건을 알바가 취소
-        # ==========================================================
         else:
-            # 돈은 이미 소유자에게 있으므로 상태만 리셋하면 됨
-            cur.execute("""
-                UPDATE Rentals 
-                SET delivery_partner_id = NULL, delivery_status = 'waiting_driver'
-                WHERE rental_id = %s
-            """, (rental_id,))
-            
             flash("bucket 배송 업무를 취소했습니다. 해당 건은 다시 대기 목록으로 이동합니다.", "warning")
-        
-        conn.commit()
-        # [수정] 500P를 썼거나, 변동이 있었으니 확실하게 동기화
-        refresh_user_session(session['resident_id'])
+        ok = True
+    except errors.RaiseException as e:
+        conn.rollback()
+        flash(f"❌ {e.diag.message_primary}", "danger")
     except Exception as e:
         conn.rollback()
         print(e)
         flash(f"오류: {e}", "danger")
     finally:
-        cur.close()
         conn.close()
         
-    return redirect(url_for('index', tab='delivery'))
+    return action_response('delivery', rental_id, ok=ok)
 # app.py
 # ==========================================
 # 배송기사 배송 완료
@@ -877,55 +1650,33 @@ def cancel_delivery(rental_id):
 
 @app.route('/complete_delivery/<int:rental_id>')
 def complete_delivery(rental_id):
+    if 'user_id' not in session: return redirect(url_for('login'))
+
+    ok = False
     conn = get_db_connection()
     cur = conn.cursor()
     try:
-        # 1. 현재 대여 상태 확인
-        cur.execute("SELECT status FROM Rentals WHERE rental_id = %s", (rental_id,))
-        result = cur.fetchone()
-        
-        if not result:
-            return "정보 없음"
-        
-        status = result[0]
-
-        # ---------------------------------------------------------
-        # Case A: 반납하러 가는 배송 (rented/overdue)
-        # -> 기사는 '도착'만 찍고, 소유자의 최종 확인을 기다려야 함.
-        # ---------------------------------------------------------
-        if status in ['rented', 'overdue']:
-            cur.execute("UPDATE Rentals SET delivery_status = 'arrived' WHERE rental_id = %s", (rental_id,))
-            flash("🚚 목적지에 도착했습니다! 소유자의 확인을 기다리세요.", "info")
-        
-        # ---------------------------------------------------------
-        # Case B: 빌리러 가는 배송 (approved)
-        # -> 기사가 '완료'를 찍으면 즉시 정산되고 대여가 시작됨.
-        # ---------------------------------------------------------
-        else:
-            # 배송비 조회
-            cur.execute("SELECT delivery_fee FROM Rentals WHERE rental_id = %s", (rental_id,))
-            fee = cur.fetchone()[0]
-            
-            # [수정] 배송비 지급 주체 변경: 소유자(Owner) -> 매니저(Manager)
-            manager_id = get_system_manager_id() # 매니저 ID 조회 함수 사용
-
-            if fee > 0:
-                if manager_id:
-                    # 매니저(플랫폼) 지갑에서 -> 배송기사(나)에게 지급
-                    cur.execute("UPDATE Residents SET points = points - %s WHERE resident_id = %s", (fee, manager_id))
-                    cur.execute("UPDATE Residents SET points = points + %s WHERE resident_id = %s", (fee, session['resident_id']))
-                    flash(f"✅ 배송 완료! 플랫폼(매니저)으로부터 수고비 {fee} 포인트를 받았습니다.", "success")
-                else:
-                    flash("시스템 관리자 계정 오류로 배송비 정산에 실패했습니다.", "danger")
-            
-            # 상태 변경: 배송 완료 처리 및 대여 시작(rented)
-            cur.execute("UPDATE Rentals SET delivery_status = 'completed', status = 'rented' WHERE rental_id = %s", (rental_id,))
-        
-        conn.commit()
+        # Case A: 반납하러 가는 배송 (rented/overdue) -> '도착'만 찍고 소유자의 최종 확인을 기다림
+        # Case B: 빌리러 가는 배송 (approved) -> 금고에 보관된 배송비를 즉시 지급하고 대여 시작
+        cur.execute("SELECT outcome, paid_fee FROM complete_delivery(%s, %s)", (rental_id, session['resident_id']))
+        outcome, paid_fee = cur.fetchone()
+
+        commit_write(conn)
 
         # [중요] 내(배송기사) 포인트가 변했을 수 있으므로 세션 동기화
         refresh_user_session(session['resident_id'])
+
+        if outcome == 'arrived':
+            flash("🚚 목적지에 도착했습니다! 소유자의 확인을 기다리세요.", "info")
+        elif paid_fee > 0:
+            flash(f"✅ 배송 완료! 배송비 금고에서 수고비 {paid_fee} 포인트를 받았습니다.", "success")
+        else:
+            flash("✅ 물품 전달이 완료되었습니다. 대여가 시작됩니다.", "success")
+        ok = True
         
+    except errors.RaiseException as e:
+        conn.rollback()
+        flash(f"❌ {e.diag.message_primary}", "danger")
     except Exception as e:
         conn.rollback()
         flash(f"오류: {e}", "danger")
@@ -933,7 +1684,7 @@ def complete_delivery(rental_id):
         cur.close()
         conn.close()
         
-    return redirect(url_for('index', tab='delivery'))
+    return action_response('delivery', rental_id, ok=ok)
 # app.py 에 추가
 # ==========================================
 # 반납 배송
@@ -944,75 +1695,27 @@ def complete_delivery(rental_id):
 def request_return(rental_id):
     if 'user_id' not in session: return redirect(url_for('login'))
     
-    option = request.form['delivery_option'] # 'pickup' or 'delivery'
-    fee = 500 if option == 'delivery' else 0
+    option = 'delivery' if request.form['delivery_option'] == 'delivery' else 'pickup'
     
     conn = get_db_connection()
-    cur = conn.cursor()
     
     try:
-        # 1. 현재 상태 및 잔액 확인
-        cur.execute("""
-            SELECT r.borrower_id, i.owner_id, r.status 
-            FROM Rentals r JOIN Items i ON r.item_id = i.item_id 
-            WHERE r.rental_id = %s
-        """, (rental_id,))
-        rental = cur.fetchone()
-        
-        borrower_id, owner_id, status = rental
-        
-        # 이미 반납된 상태면 중단
-        if status not in ['rented', 'overdue']:
-            flash("❌ 이미 반납되었거나 반납할 수 없는 상태입니다.", "warning")
-            return redirect(url_for('index', tab='borrower'))
-
-        # 2. 배송비 트랜잭션 (배송 반납인 경우)
-        if fee > 0:
-            cur.execute("SELECT points FROM Residents WHERE resident_id = %s", (borrower_id,))
-            current_points = cur.fetchone()[0]
-            
-            if current_points < fee:
-                flash("❌ 잔액이 부족하여 배송 반납을 신청할 수 없습니다.", "danger")
-                return redirect(url_for('index', tab='borrower'))
-            
-            # [수정 1] 시스템 매니저(금고) ID 조회
-            # (이 함수가 app.py 상단에 정의되어 있어야 합니다. 없다면 아래 주석 참고)
-            manager_id = get_system_manager_id() 
-            
-            if not manager_id:
-                flash("시스템 오류: 관리자 계정이 없어 배송비를 처리할 수 없습니다.", "danger")
-                return redirect(url_for('index', tab='borrower'))
-
-            # [수정 2] Borrower 차감 -> Manager(시스템)에게 임시 지급
-            # 기존 owner_id를 manager_id로 변경했습니다.
-            cur.execute("UPDATE Residents SET points = points - %s WHERE resident_id = %s", (fee, borrower_id))
-            cur.execute("UPDATE Residents SET points = points + %s WHERE resident_id = %s", (fee, manager_id))
-
-        # 3. [핵심] 기존 배송 정보 덮어쓰기 (Return 모드로 전환)
-        new_delivery_status = 'waiting_driver' if option == 'delivery' else 'accepted'
-        partner_id = None if option == 'delivery' else borrower_id # 직접 반납이면 본인이 파트너
-
-        cur.execute("""
-            UPDATE Rentals 
-            SET delivery_option = %s,
-                delivery_fee = %s,
-                delivery_partner_id = %s,
-                delivery_status = %s
-            WHERE rental_id = %s
-        """, (option, fee, partner_id, new_delivery_status, rental_id))
-        
-        conn.commit()
+        # 상태/잔액 확인 -> 배송비 결제(대여자 -> 금고) -> 배송 정보를 반납용으로 덮어쓰기를 한 번의 호출로
+        # (대여 행을 잠그고 확인하므로 반납 신청을 두 번 눌러도 배송비는 한 번만 결제됨)
+        run_transition(conn, "SELECT request_return(%s, %s, %s)", (rental_id, session['resident_id'], option))
         # [추가] 내 포인트가 변했을 수 있으므로 세션 동기화
         refresh_user_session(session['resident_id'])
         
         flash("↩️ 반납 신청이 접수되었습니다. 운송 절차를 진행해주세요.", "success")
         
+    except errors.RaiseException as e:
+        conn.rollback()
+        flash(f"❌ {e.diag.message_primary}", "danger")
     except Exception as e:
         conn.rollback()
         print(e)
         flash(f"오류 발생: {e}", "danger")
     finally:
-        cur.close()
         conn.close()
         
     return redirect(url_for('index', tab='borrower'))
@@ -1023,73 +1726,69 @@ def request_return(rental_id):
 def confirm_return(rental_id):
     if session.get('status') != 'approved': return "권한 없음"
     
+    ok = False
     conn = get_db_connection()
-    cur = conn.cursor()
 
     try:
-        # 1. 대여 정보 조회
-        cur.execute("""
-            SELECT r.item_id, r.borrower_id, i.owner_id, i.rent_fee, r.end_date, 
-                   r.delivery_partner_id, r.delivery_fee
-            FROM Rentals r JOIN Items i ON r.item_id = i.item_id 
-            WHERE r.rental_id = %s
-        """, (rental_id,))
-        data = cur.fetchone()
-        
-        if not data: return "데이터 없음"
-        
-        item_id, borrower_id, owner_id, rent_fee, original_end_date, partner_id, del_fee = data
-        
-        # 권한 체크 (소유자 본인 확인)
-        if owner_id != session['resident_id']:
-            return "권한 없음"
-
-        today = date.today()
-        refund_msg = ""
-        
-        # ---------------------------------------------------------
-        # (A) 조기 반납 환불 (대여료는 소유자가 돌려줌)
-        # ---------------------------------------------------------
-        remaining_days = (original_end_date - today).days
-        if remaining_days > 0:
-            refund_amount = remaining_days * rent_fee
-            if refund_amount > 0:
-                cur.execute("UPDATE Residents SET points = points - %s WHERE resident_id = %s", (refund_amount, owner_id))
-                cur.execute("UPDATE Residents SET points = points + %s WHERE resident_id = %s", (refund_amount, borrower_id))
-                refund_msg = f" (⚡ 조기 반납 환불 {refund_amount}P 포함)"
-            
-            # DB 종료일 업데이트
-            cur.execute("UPDATE Rentals SET end_date = %s WHERE rental_id = %s", (today, rental_id))
-
-        # ---------------------------------------------------------
-        # (B) [수정] 배송비 정산 (매니저 -> 기사)
-        # ---------------------------------------------------------
-        if partner_id and del_fee > 0:
-            manager_id = get_system_manager_id() # 매니저 ID 조회
-            if manager_id:
-                # 매니저(보관중) -> 배송 기사 지급
-                cur.execute("UPDATE Residents SET points = points - %s WHERE resident_id = %s", (del_fee, manager_id))
-                cur.execute("UPDATE Residents SET points = points + %s WHERE resident_id = %s", (del_fee, partner_id))
-
-        # ---------------------------------------------------------
-        # (C) 상태 업데이트 (정상 종료)
-        # ---------------------------------------------------------
-        cur.execute("UPDATE Rentals SET status = 'returned', delivery_status = 'completed' WHERE rental_id = %s", (rental_id,))
-        cur.execute("UPDATE Items SET status = 'available' WHERE item_id = %s", (item_id,))
-        
-        conn.commit()
+        # 조기 반납 환불 + 남은 연체료 정산 + 배송비 정산(금고 -> 기사) + 반납/재공개 처리를 한 번의 호출로
+        refund_amount, late_fee = run_transition(conn, "SELECT refund, late_fee FROM confirm_return(%s, %s)",
+                                                 (rental_id, session['resident_id']))
+        refund_msg = f" (⚡ 조기 반납 환불 {refund_amount}P 포함)" if refund_amount > 0 else ""
+        if late_fee > 0:
+            refund_msg += f" (⏰ 연체료 {late_fee}P 수령)"
+
+        catalog_cache.invalidate(session['complex_id']) # 물품이 다시 대여 가능으로 공개됨
         refresh_user_session(session['resident_id']) 
         
         flash(f"✅ 반납 확정 완료!{refund_msg}", "success")
+        ok = True
 
+    except errors.RaiseException as e:
+        conn.rollback()
+        flash(f"❌ 처리 실패: {e.diag.message_primary}", "danger")
     except Exception as e:
         conn.rollback()
         flash(f"❌ 처리 실패: {e}", "danger")
     finally:
-        cur.close()
         conn.close()
         
-    return redirect(url_for('index', tab='owner'))
+    return action_response('owner', rental_id, ok=ok)
+
+# ==========================================
+# 평가 (반납 확정 후 대여자, 배송 완료 후 기사)
+# ==========================================
+@app.route('/rate/<int:rental_id>', methods=['POST'])
+def rate(rental_id):
+    if session.get('status') != 'approved': return "권한 없음"
+
+    target = request.form.get('target')
+    tab = 'borrower' if request.form.get('tab') == 'borrower' else 'owner'
+    ok = False
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    try:
+        score = request.form.get('score', type=int)
+        if target not in ('borrower', 'partner') or score is None or not 1 <= score <= 5:
+            raise ValueError("평가 항목이 올바르지 않습니다.")
+
+        # 평가 자격 확인 + 등록 (주민별 평판 집계는 트리거가 갱신)
+        cur.execute("SELECT rate_resident(%s, %s, %s, %s)", (rental_id, session['resident_id'], target, score))
+        commit_write(conn)
+        flash(f"⭐ {score}점으로 평가했습니다.", "success")
+        ok = True
+
+    except errors.RaiseException as e:
+        conn.rollback()
+        flash(f"❌ 평가 실패: {e.diag.message_primary}", "danger")
+    except Exception as e:
+        conn.rollback()
+        flash(f"❌ 평가 실패: {e}", "danger")
+    finally:
+        cur.close()
+        conn.close()
+
+    return action_response(tab, ok=ok)
 
 # ==========================================
 # 분쟁신고
@@ -1098,47 +1797,40 @@ def confirm_return(rental_id):
 
 @app.route('/report_dispute/<int:rental_id>', methods=['POST'])
 def report_dispute(rental_id):
+    if session.get('status') != 'approved': return "권한 없음"
+
     reason = request.form['reason']
+    # [신규] 증거 사진
+    try:
+        evidence = media_store.save_uploads(request.files.getlist('evidence'))
+    except media_store.MediaError as e:
+        flash(f"❌ {e}", "danger")
+        return redirect(url_for('index', tab='owner'))
+
     conn = get_db_connection()
     cur = conn.cursor()
     
     try:
-        # 1. 대여 정보 조회
-        cur.execute("""
-            SELECT item_id, delivery_partner_id, delivery_fee, delivery_status 
-            FROM Rentals WHERE rental_id = %s
-        """, (rental_id,))
-        data = cur.fetchone()
-        
-        if not data: return "데이터 없음"
-        item_id, partner_id, del_fee, del_status = data
-        
-        # 2. 분쟁 등록 및 상태 잠금 (Locking)
-        cur.execute("""
-            INSERT INTO Disputes (rental_id, manager_id, reason, status)
-            VALUES (%s, NULL, %s, 'open')
-        """, (rental_id, reason))
-        
-        cur.execute("UPDATE Rentals SET status = 'disputed' WHERE rental_id = %s", (rental_id,))
-        cur.execute("UPDATE Items SET status = 'disputed' WHERE item_id = %s", (item_id,))
-
-        # ---------------------------------------------------------
-        # (A) [추가] 분쟁 시 배송비 정산 (매니저 -> 기사)
-        # 조건: 기사가 있고, 배송비가 있으며, 이미 도착(arrived)한 경우
-        # ---------------------------------------------------------
-        if partner_id and del_fee > 0 and del_status == 'arrived':
-            manager_id = get_system_manager_id()
-            if manager_id:
-                # 매니저(보관중) -> 배송 기사 지급
-                cur.execute("UPDATE Residents SET points = points - %s WHERE resident_id = %s", (del_fee, manager_id))
-                cur.execute("UPDATE Residents SET points = points + %s WHERE resident_id = %s", (del_fee, partner_id))
-                
-                # 배송 상태는 완료(completed)로 변경 (기사는 업무 끝)
-                cur.execute("UPDATE Rentals SET delivery_status = 'completed' WHERE rental_id = %s", (rental_id,))
-
-        conn.commit()
-        flash("🚨 분쟁 신고 접수! 물품과 대여 상태가 동결됩니다. (배송 기사는 정산 완료)", "warning")
+        # 분쟁 등록 + 대여/물품 동결 + (도착한 배송이면) 기사 배송비 정산
+        cur.execute("SELECT new_dispute_id, driver_paid FROM report_dispute(%s, %s, %s)",
+                    (rental_id, session['resident_id'], reason))
+        dispute_id, driver_paid = cur.fetchone()
+
+        if evidence:
+            cur.executemany("""
+                INSERT INTO Attachments (sha256, content_type, byte_size, dispute_id, uploaded_by)
+                VALUES (%s, %s, %s, %s, %s)
+            """, [(sha256, content_type, size, dispute_id, session['resident_id']) for sha256, content_type, size in evidence])
+
+        commit_write(conn)
+        if driver_paid:
+            flash("🚨 분쟁 신고 접수! 물품과 대여 상태가 동결됩니다. (배송 기사는 정산 완료)", "warning")
+        else:
+            flash("🚨 분쟁 신고 접수! 물품과 대여 상태가 동결됩니다.", "warning")
         
+    except errors.RaiseException as e:
+        conn.rollback()
+        flash(f"❌ {e.diag.message_primary}", "danger")
     except Exception as e:
         conn.rollback()
         flash(f"오류: {e}", "danger")
@@ -1156,6 +1848,7 @@ def report_dispute(rental_id):
 def close_dispute(dispute_id):
     if 'user_id' not in session: return redirect(url_for('login'))
     
+    ok = False
     conn = get_db_connection()
     cur = conn.cursor()
     try:
@@ -1177,7 +1870,7 @@ def close_dispute(dispute_id):
             
         if dispute_status != 'resolved':
             flash("❌ 아직 매니저의 판결이 완료되지 않았습니다.", "warning")
-            return redirect(url_for('index', tab='owner'))
+            return action_response('owner', ok=False)
 
         # 2. [수정됨] 상태 정상화 (Lock 해제 및 배송 완료 처리)
         # Rental status -> 'returned' (이력으로 이동)
@@ -1191,10 +1884,12 @@ def close_dispute(dispute_id):
         
         cur.execute("UPDATE Items SET status = 'available' WHERE item_id = %s", (item_id,))
         
-        conn.commit()
+        commit_write(conn)
+        catalog_cache.invalidate(session['complex_id'])
         refresh_user_session(session['resident_id']) # 세션 동기화 (혹시 모를 포인트 변동 대비)
         
         flash("✅ 분쟁 처리가 최종 완료되었습니다. 물품이 다시 대여 가능 상태가 되었습니다.", "success")
+        ok = True
         
     except Exception as e:
         conn.rollback()
@@ -1203,7 +1898,123 @@ def close_dispute(dispute_id):
         cur.close()
         conn.close()
         
-    return redirect(url_for('index', tab='owner'))
+    return action_response('owner', ok=ok)
+# ==========================================
+# 검색 자동완성 (워커 메모리의 접두어 색인, DB 조회 없음)
+# ==========================================
+@app.route('/autocomplete')
+def autocomplete():
+    if 'user_id' not in session: return jsonify(suggestions=[]), 401
+
+    # 색인은 워커 시작 시(warm_up)에만 적재 (요청 안에서 적재를 기다리지 않음, 적재 전이면 빈 목록)
+    return jsonify(suggestions=catalog_index.suggest(session['complex_id'], request.args.get('q', '')))
+
+# ==========================================
+# 사진 제공 (내용 해시 URL)
+# ==========================================
+@app.template_global()
+def media_url(kind, sha256):
+    """템플릿의 사진 URL (현재 단지로 서명, 같은 사진은 같은 URL이라 브라우저 캐시를 그대로 씀)"""
+    return url_for('media', kind=kind, sha256=sha256,
+                   s=media_store.sign(app.secret_key, session['complex_id'], sha256))
+
+@app.route('/media/<kind>/<sha256>')
+def media(kind, sha256):
+    if 'user_id' not in session or 'complex_id' not in session: return "권한 없음", 403
+    if not media_store.is_hash(sha256): return "파일 없음", 404
+
+    # 파일 저장소는 단지 구분 없이 해시로 공유하므로, 내 단지 화면이 만든 URL(media_url)인지 서명으로 확인
+    # (사진마다 DB를 조회하지 않음, 다른 단지의 사진 해시를 알아도 받을 수 없음)
+    if not media_store.verify(app.secret_key, session['complex_id'], sha256, request.args.get('s')):
+        return "파일 없음", 404
+
+    found = media_store.resolve(kind, sha256)
+    if found is None:
+        return "파일 없음", 404
+    path, content_type, immutable = found
+
+    # send_file은 WSGI file_wrapper로 응답하므로 gunicorn에서는 sendfile()로 커널이 바로 전송
+    # (썸네일 생성 전 임시로 제공하는 원본은 1분만 캐시)
+    response = send_file(path, mimetype=content_type, etag=sha256 if immutable else False, conditional=True,
+                         max_age=media_store.SETTINGS['cache_max_age'] if immutable else 60)
+    response.cache_control.immutable = immutable
+    response.cache_control.public = False
+    response.cache_control.private = True # 로그인한 주민에게만 제공
+    return response
+
+# ==========================================
+# 이력 검색 (대시보드 이력 표의 검색 / 더 보기)
+# ==========================================
+# /history/<종류>?q=검색어&status=상태&from=YYYY-MM-DD&to=YYYY-MM-DD&before=커서&archive=1
+# 조건에 맞는 한 페이지의 표 행(HTML)과 다음 페이지 커서를 JSON으로 응답 (행 모양은 대시보드와 같은 템플릿)
+@app.route('/history/<kind>')
+def history_search(kind):
+    if 'user_id' not in session or 'complex_id' not in session: return jsonify(html='', next=None), 401
+    if kind not in HISTORY_SEARCHES: return jsonify(html='', next=None), 404
+    if session.get('status') != 'approved': return jsonify(html='', next=None)
+
+    conn = get_db_connection(readonly=True)
+    cur = conn.cursor()
+    try:
+        rows, next_before = search_history(
+            cur, kind, session['resident_id'],
+            include_archive=request.args.get('archive') == '1',
+            keyword=request.args.get('q', '').strip(),
+            status=request.args.get('status', ''),
+            date_from=request.args.get('from', type=date.fromisoformat),
+            date_to=request.args.get('to', type=date.fromisoformat),
+            before=request.args.get('before', type=int))
+    finally:
+        cur.close()
+        conn.close()
+
+    return jsonify(html=render_template('history_rows.html', kind=kind, rows=rows), next=next_before)
+
+# ==========================================
+# 대여 타임라인 (상태 전이 로그)
+# ==========================================
+@app.route('/rental_timeline/<int:rental_id>')
+def rental_timeline(rental_id):
+    if 'user_id' not in session: return redirect(url_for('login'))
+
+    conn = get_db_connection(readonly=True)
+    cur = conn.cursor()
+    try:
+        # 당사자 확인용 대여 건 조회: 현재 테이블에서 먼저 찾고, 없을 때만 보관(archive)된 대여까지 포함한 이력 뷰에서 찾음
+        for source in ('Rentals', 'Rentals_History'):
+            cur.execute(f"""
+                SELECT r.rental_id, i.name, r.borrower_id, i.owner_id
+                FROM {source} r
+                JOIN Items i ON r.item_id = i.item_id
+                WHERE r.rental_id = %s
+            """, (rental_id,))
+            rental = cur.fetchone()
+            if rental is not None:
+                break
+
+        cur.execute("""
+            SELECT e.occurred_at, e.status, e.delivery_status, e.delivery_partner_id, u.name
+            FROM Rental_Events e
+            LEFT JOIN View_Manager_Residents u ON e.delivery_partner_id = u.resident_id
+            WHERE e.rental_id = %s
+            ORDER BY e.occurred_at, e.event_id
+        """, (rental_id,))
+        events = cur.fetchall()
+    finally:
+        cur.close()
+        conn.close()
+
+    if rental is None:
+        flash("❌ 존재하지 않는 대여 건입니다.", "danger")
+        return redirect(url_for('index'))
+
+    # 매니저, 대여자, 소유자, 배송을 맡았던 기사만 조회 가능
+    parties = {rental[2], rental[3]} | {e[3] for e in events if e[3] is not None}
+    if not session.get('is_manager') and session['resident_id'] not in parties:
+        return "권한 없음"
+
+    return render_template('timeline.html', rental=rental, events=events)
+
 # ==========================================
 # [매니저 액션] 승인 / 거절 / 복구(대기상태로)
 # ==========================================
@@ -1213,11 +2024,11 @@ def approve_resident(id):
     conn = get_db_connection()
     cur = conn.cursor()
     cur.execute("UPDATE Residents SET status = 'approved' WHERE resident_id = %s", (id,))
-    conn.commit()
+    commit_write(conn)
     cur.close()
     conn.close()
     flash("✅ 승인 처리되었습니다.", "success")
-    return redirect(url_for('index', tab='admin'))
+    return action_response('admin', ok=True)
 
 @app.route('/reject_resident/<int:id>')
 def reject_resident(id):
@@ -1225,11 +2036,11 @@ def reject_resident(id):
     conn = get_db_connection()
     cur = conn.cursor()
     cur.execute("UPDATE Residents SET status = 'rejected' WHERE resident_id = %s", (id,))
-    conn.commit()
+    commit_write(conn)
     cur.close()
     conn.close()
     flash("🚫 거절(정지) 처리되었습니다.", "warning")
-    return redirect(url_for('index', tab='admin'))
+    return action_response('admin', ok=True)
 
 @app.route('/restore_resident/<int:id>')
 def restore_resident(id):
@@ -1238,11 +2049,11 @@ def restore_resident(id):
     cur = conn.cursor()
     # 상태를 다시 'pending'으로 돌려서 승인 대기 목록으로 보냄
     cur.execute("UPDATE Residents SET status = 'pending' WHERE resident_id = %s", (id,))
-    conn.commit()
+    commit_write(conn)
     cur.close()
     conn.close()
     flash("♻️ 대기 상태로 되돌렸습니다.", "info")
-    return redirect(url_for('index', tab='admin'))
+    return action_response('admin', ok=True)
 @app.route('/toggle_delivery_ban/<int:resident_id>')
 
 # ==========================================
@@ -1256,10 +2067,10 @@ def toggle_delivery_ban(resident_id):
     
     # 현재 상태를 조회해서 반대로 뒤집음 (Toggle)
     cur.execute("UPDATE Residents SET is_delivery_banned = NOT is_delivery_banned WHERE resident_id = %s", (resident_id,))
-    conn.commit()
+    commit_write(conn)
     
     flash("✅ 배송 권한 상태가 변경되었습니다.", "success")
-    return redirect(url_for('index', tab='admin'))
+    return action_response('admin', ok=True)
 # ==========================================
 # [매니저 액션] 분쟁판결
 # ==========================================
@@ -1276,13 +2087,13 @@ def adjudicate_dispute(dispute_id):
     try:
         # 관련 당사자 정보 조회
         cur.execute("""
-            SELECT r.borrower_id, i.owner_id 
+            SELECT r.borrower_id, i.owner_id, r.rental_id 
             FROM Disputes d 
             JOIN Rentals r ON d.rental_id = r.rental_id 
             JOIN Items i ON r.item_id = i.item_id 
             WHERE d.dispute_id = %s
         """, (dispute_id,))
-        borrower_id, owner_id = cur.fetchone()
+        borrower_id, owner_id, rental_id = cur.fetchone()
         
         # 1. 배상금 트랜잭션 실행 (즉시 처리)
         if amount > 0:
@@ -1302,8 +2113,13 @@ def adjudicate_dispute(dispute_id):
                 manager_id = %s
             WHERE dispute_id = %s
         """, (resolution, amount, session['resident_id'], dispute_id))
+
+        # 3. [알림] 양 당사자에게 판결 결과 (Outbox 적재)
+        cur.execute("SELECT notify_rental_event(%s, 'dispute_adjudicated', 'both', %s, %s)",
+                    (rental_id, session['resident_id'],
+                     Json({'resolution': resolution, 'amount': amount, 'decision': decision})))
         
-        conn.commit()
+        commit_write(conn)
         flash("✅ 판결이 완료되었습니다. 배상금이 즉시 정산되었습니다.", "success")
         
     except Exception as e:
@@ -1315,4 +2131,7 @@ def adjudicate_dispute(dispute_id):
         
     return redirect(url_for('index', tab='admin'))
 if __name__ == '__main__':
+    # 디버그 리로더는 자식 프로세스에서 이 파일을 다시 실행하므로, 요청을 받는 자식에서만 워커 준비(색인 적재 포함)
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        warm_up()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,43 @@
+# ==========================================
+# Rentals / Disputes 파티션 관리 배치
+# ==========================================
+# cron 등으로 하루 한 번 실행합니다.
+#   1) 앞으로 사용할 월별 파티션을 미리 생성 (기본 3개월 치, 기본 파티션에 들어간 행이 있으면 그 월의 파티션을 만들어 옮김)
+#   2) 보관 기간이 지났고 모든 대여가 종료된 월 파티션을 분리(DETACH)하여 archive 스키마로 이동
+#      -> 대시보드의 진행 중 쿼리는 Hot 파티션만 읽고, 이력 조회는 필요할 때만 보관 파티션을 읽습니다.
+# 파티션은 단지 구분 없이 공유하므로 샤드(Postgres 인스턴스)마다 한 번씩 실행합니다.
+#
+# 사용법: python archive_job.py [보관 개월 수 (기본 12)]
+import sys
+from datetime import date
+
+import psycopg2
+
+from app import MANAGER_CONF, SHARDS, shard_conf
+
+def run(keep_months=12, months_ahead=3):
+    for shard_name, shard in SHARDS.items():
+        run_shard(shard_name, shard, keep_months, months_ahead)
+
+def run_shard(shard_name, shard, keep_months, months_ahead):
+    conn = psycopg2.connect(**shard_conf(MANAGER_CONF, shard))
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT ensure_rental_partitions(%s, %s)", (date.today(), months_ahead))
+        created = cur.fetchone()[0]
+
+        cur.execute("SELECT archive_cold_rental_partitions(%s)", (keep_months,))
+        archived = [row[0] for row in cur.fetchall()]
+
+        conn.commit()
+        print(f"[archive_job:{shard_name}] 신규 파티션 {created}개 생성, 보관 처리 {len(archived)}개: {', '.join(archived) or '-'}")
+    except Exception as e:
+        conn.rollback()
+        print(f"[archive_job:{shard_name}] 실패: {e}")
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 12)
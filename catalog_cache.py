@@ -0,0 +1,113 @@
+# ==========================================
+# 카탈로그 조회 결과 캐시 (LRU + TTL)
+# ==========================================
+# - 대시보드는 탭과 상관없이 매번 카탈로그(물품 목록 한 페이지 + 카테고리별 개수)를 조회하므로,
+#   워커마다 (단지, 우리 동, 검색어, 카테고리, 정렬, 페이지) 별로 결과를 잠시 들고 있다가 그대로 돌려줍니다.
+#   (검색어는 앞뒤 공백 제거 + 소문자, 정렬은 알 수 없는 값을 기본값으로 정규화, 카테고리 개수의 '우리 동' 값 때문에 동이 키에 들어감)
+# - 항목 수(max_entries)와 대략의 메모리(max_bytes)를 모두 넘지 않도록 가장 오래 안 쓴 항목부터 버리고,
+#   ttl_s가 지난 항목은 읽을 때 버립니다.
+# - 무효화는 단지 단위입니다. 물품 하나가 등록/상태 변경되어도 카테고리별 개수가 바뀌므로 그 단지의 모든 페이지가 대상입니다.
+#     1) 같은 워커의 쓰기 라우트(물품 등록/철회, 대여 승인, 반납 확정, 만료 처리)는 커밋 직후 직접 무효화 (바로 다음 화면에 반영)
+#     2) 다른 워커/배치의 변경은 catalog_index가 받는 Items 트리거 알림(item_changes)으로 무효화
+#   트리거는 목록에서 물품이 들고 나는 변경(등록/삭제, name/status/expiration_date 수정)에만 알림을 보냅니다.
+#   다른 워커/배치가 rent_fee, category, description, cover_photo만 고치거나 소유자 평판 점수(평판순 정렬, Resident_Reputation)가
+#   바뀐 경우는 알림이 없으므로 ttl_s가 지나야 반영됩니다. (같은 워커의 라우트가 직접 무효화한 경우는 제외)
+# - 캐시에 넣을 결과는 Primary에서 읽습니다. (app.index) 무효화 직후 아직 그 변경을 재생하지 못한 Replica에서 읽으면
+#   무효화 이전 목록이 ttl_s 동안 다시 캐시되기 때문입니다.
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+SETTINGS = {
+    'max_entries': 512,
+    'max_bytes': 16 * 1024 * 1024,  # 항목 크기 합계 상한 (sys.getsizeof 기준의 근사치)
+    'ttl_s': 60,
+}
+SORTS = ('latest', 'exp_date', 'reputation') # app.index()의 정렬 옵션 (그 외 값은 최신순과 같은 결과)
+
+_entries = OrderedDict()  # 키 -> (저장 시각, 크기, 값), 뒤쪽이 최근에 쓴 항목
+_bytes = 0
+_generation = {}          # 단지 ID -> 무효화 횟수 (조회 도중 무효화된 결과를 저장하지 않기 위함)
+_counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+_lock = threading.Lock()
+
+def make_key(complex_id, building, keyword, category, sort, page):
+    # 검색은 ILIKE(대소문자 무시)이므로 소문자로 바꿔도 결과가 같음
+    return (complex_id, building, keyword.strip().lower(), category,
+            sort if sort in SORTS else 'latest', page)
+
+def entry_size(value):
+    """값(중첩된 리스트/튜플)의 대략적인 바이트 수"""
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        size += sum(entry_size(v) for v in value)
+    return size
+
+def generation(complex_id):
+    """조회 전에 받아 두었다가 put()에 넘김"""
+    with _lock:
+        return _generation.get(complex_id, 0)
+
+def get(key):
+    """캐시된 값 또는 None"""
+    global _bytes
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            _counters['misses'] += 1
+            return None
+        stored_at, size, value = entry
+        if time.monotonic() - stored_at > SETTINGS['ttl_s']:
+            del _entries[key]
+            _bytes -= size
+            _counters['expirations'] += 1
+            _counters['misses'] += 1
+            return None
+        _entries.move_to_end(key)
+        _counters['hits'] += 1
+        return value
+
+def put(key, value, seen_generation):
+    """조회를 시작한 뒤 그 단지가 무효화되었다면 저장하지 않음 (무효화 이전 상태를 읽었을 수 있음)"""
+    global _bytes
+    size = entry_size(value)
+    if size > SETTINGS['max_bytes']:
+        return
+    with _lock:
+        if _generation.get(key[0], 0) != seen_generation:
+            return
+        old = _entries.pop(key, None)
+        if old is not None:
+            _bytes -= old[1]
+        _entries[key] = (time.monotonic(), size, value)
+        _bytes += size
+        while len(_entries) > SETTINGS['max_entries'] or _bytes > SETTINGS['max_bytes']:
+            _, (_, evicted, _) = _entries.popitem(last=False)
+            _bytes -= evicted
+            _counters['evictions'] += 1
+
+def invalidate(complex_id):
+    """단지 하나의 캐시 항목을 모두 버림"""
+    global _bytes
+    with _lock:
+        _generation[complex_id] = _generation.get(complex_id, 0) + 1
+        for key in [k for k in _entries if k[0] == complex_id]:
+            _bytes -= _entries.pop(key)[1]
+        _counters['invalidations'] += 1
+
+def on_item_change(change):
+    """catalog_index의 알림 구독 함수 (다른 워커/배치의 Items 변경)"""
+    invalidate(change['complex_id'])
+
+def clear():
+    global _bytes
+    with _lock:
+        _entries.clear()
+        _bytes = 0
+
+def stats():
+    with _lock:
+        lookups = _counters['hits'] + _counters['misses']
+        return dict(_counters, entries=len(_entries), bytes=_bytes,
+                    hit_rate=round(_counters['hits'] / lookups, 3) if lookups else None)
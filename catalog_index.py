@@ -0,0 +1,331 @@
+# ==========================================
+# 물품 검색 자동완성 (In-Memory Prefix Index)
+# ==========================================
+# - 워커마다 단지별로 "대여 가능한 물품 이름 + 카테고리"의 검색 키를 정렬 배열로 들고 있고, 입력한 접두어를 이진 탐색으로 찾습니다.
+#   (자동완성 요청은 DB에 접속하지 않음)
+# - 한글은 자모 단위로 풀어서 저장합니다. (캠핑 -> ㅋㅐㅁㅍㅣㅇ, 겹모음/겹받침도 입력 순서대로 ㅘ -> ㅗㅏ, ㄺ -> ㄹㄱ)
+#   그래서 입력 중인 글자(캐, 캠ㅍ, 닭 대신 달)도 접두어로 맞고, 자음만 입력하면(ㅋㅍ) 초성으로 찾습니다.
+#   띄어쓰기 뒤의 단어로 시작해도 찾습니다. (캠핑 의자 <- 의자)
+# - 후보 순위는 카테고리 먼저, 그다음 대여 가능 개수 순입니다. 한두 글자 입력은 색인의 큰 부분과 맞으므로
+#   짧은 접두어마다 상위 후보를 미리 계산해 두고(적재 시 한 번, 알림마다 바뀐 이름의 경로만), 요청은 그 목록만 읽습니다.
+# - 워커 시작 시(app.warm_up) 샤드마다 상주 스레드가 item_changes 채널을 LISTEN 한 뒤 단지별로 전체를 적재하고,
+#   이후에는 Items 트리거가 커밋 시 보내는 알림(NOTIFY)으로 바뀐 물품만 반영합니다.
+#   연결이 끊기면 다시 접속해 전체를 새로 적재합니다. (끊긴 동안 놓친 알림 대비)
+# - 같은 알림이 필요한 다른 워커 캐시(catalog_cache)는 subscribe()로 등록해 알림마다 함께 호출받습니다.
+import bisect
+import heapq
+import json
+import select
+import threading
+import unicodedata
+
+SETTINGS = {
+    'channel': 'item_changes',  # DB 트리거 notify_item_change()와 같은 채널
+    'limit': 8,                 # 자동완성 후보 수
+    'top_depth': 3,             # 이 길이(자모 수) 이하의 접두어는 상위 후보를 미리 계산
+    'ready_timeout_s': 10,      # 워커 시작 시 첫 적재를 기다리는 시간
+    'reconnect_delay_s': 5,
+}
+
+_CHOSEONG = 'ㄱㄲㄴㄷㄸㄹㅁㅂㅃㅅㅆㅇㅈㅉㅊㅋㅌㅍㅎ'
+_JUNGSEONG = 'ㅏㅐㅑㅒㅓㅔㅕㅖㅗㅘㅙㅚㅛㅜㅝㅞㅟㅠㅡㅢㅣ'
+_JONGSEONG = ['', 'ㄱ', 'ㄲ', 'ㄳ', 'ㄴ', 'ㄵ', 'ㄶ', 'ㄷ', 'ㄹ', 'ㄺ', 'ㄻ', 'ㄼ', 'ㄽ', 'ㄾ', 'ㄿ', 'ㅀ',
+              'ㅁ', 'ㅂ', 'ㅄ', 'ㅅ', 'ㅆ', 'ㅇ', 'ㅈ', 'ㅊ', 'ㅋ', 'ㅌ', 'ㅍ', 'ㅎ']
+# 두 번에 나눠 입력하는 겹모음/겹받침
+_COMPOUND = {
+    'ㅘ': 'ㅗㅏ', 'ㅙ': 'ㅗㅐ', 'ㅚ': 'ㅗㅣ', 'ㅝ': 'ㅜㅓ', 'ㅞ': 'ㅜㅔ', 'ㅟ': 'ㅜㅣ', 'ㅢ': 'ㅡㅣ',
+    'ㄳ': 'ㄱㅅ', 'ㄵ': 'ㄴㅈ', 'ㄶ': 'ㄴㅎ', 'ㄺ': 'ㄹㄱ', 'ㄻ': 'ㄹㅁ', 'ㄼ': 'ㄹㅂ', 'ㄽ': 'ㄹㅅ',
+    'ㄾ': 'ㄹㅌ', 'ㄿ': 'ㄹㅍ', 'ㅀ': 'ㄹㅎ', 'ㅄ': 'ㅂㅅ',
+}
+
+_MAX_CHAR = '\U0010ffff' # 어떤 키 글자보다 뒤에 정렬되는 글자 (접두어 범위의 끝)
+
+def jamo(text):
+    """검색 키: 한글 음절을 자모로 풀고, 나머지 글자는 소문자로 (공백 제거)"""
+    out = []
+    for ch in unicodedata.normalize('NFC', text).lower():
+        code = ord(ch) - 0xAC00
+        if 0 <= code < 11172:
+            cho, rest = divmod(code, 588)
+            jung, jong = divmod(rest, 28)
+            out.append(_CHOSEONG[cho])
+            out.append(_COMPOUND.get(_JUNGSEONG[jung], _JUNGSEONG[jung]))
+            out.append(_COMPOUND.get(_JONGSEONG[jong], _JONGSEONG[jong]))
+        elif not ch.isspace():
+            out.append(_COMPOUND.get(ch, ch))
+    return ''.join(out)
+
+def choseong(text):
+    """초성 키: 한글 음절은 초성만, 나머지 글자는 그대로 (공백 제거)"""
+    out = []
+    for ch in unicodedata.normalize('NFC', text).lower():
+        code = ord(ch) - 0xAC00
+        if 0 <= code < 11172:
+            out.append(_CHOSEONG[code // 588])
+        elif not ch.isspace():
+            out.append(ch)
+    return ''.join(out)
+
+def search_keys(label):
+    """이름 전체와 띄어쓰기 뒤 단어마다 자모 키 + 초성 키"""
+    words = label.split()
+    keys = set()
+    for i in range(len(words)):
+        tail = ' '.join(words[i:])
+        keys.add(jamo(tail))
+        keys.add(choseong(tail))
+    keys.discard('')
+    return keys
+
+class PrefixIndex:
+    """
+    단지 하나의 자동완성 색인 (같은 이름의 물품은 후보 하나로 묶고 개수만 셈)
+    짧은 접두어(top_depth 자모 이하)는 후보가 색인의 큰 부분이므로, 접두어마다 순위순 상위 limit개를 미리 계산해 두고
+    자동완성 요청은 그 목록만 읽습니다. 더 긴 접두어는 범위가 좁으므로 정렬 배열에서 맞는 키를 모아 순위를 매깁니다.
+    """
+
+    def __init__(self):
+        self._keys = []    # 정렬된 (검색 키, 종류, 표시 이름)
+        self._labels = {}  # (종류, 표시 이름) -> 물품 ID 집합 (카테고리는 빈 집합)
+        self._items = {}   # 물품 ID -> 표시 이름
+        self._top = {}     # top_depth 이하 길이의 접두어 -> 순위순 상위 top_k개 [(종류, 표시 이름)]
+        self._top_k = SETTINGS['limit']
+        self._loading = False
+
+    @classmethod
+    def build(cls, categories, items):
+        """
+        전체 적재: 검색 키를 모아 두었다가 마지막에 한 번만 정렬하고, 짧은 접두어의 상위 후보도 한 번에 계산
+        (키마다 insort 하면 매번 배열 뒤쪽을 밀어서 O(N²), 워커 시작과 재접속마다 단지 전체를 다시 적재하므로)
+        """
+        index = cls()
+        index._loading = True
+        for name in categories:
+            index.add_category(name)
+        for item_id, name in items:
+            index.put_item(item_id, name)
+        index._keys.sort()
+        index._loading = False
+        for child in index._children(''):
+            index._build_top(child)
+        return index
+
+    def _rank(self, entry):
+        # 카테고리를 먼저, 같은 종류 안에서는 대여 가능 개수가 많은 순 (같으면 이름순)
+        kind, label = entry
+        return (kind != 'category', -len(self._labels[entry]), label)
+
+    def _best(self, entries):
+        return heapq.nsmallest(self._top_k, set(entries), key=self._rank)
+
+    def _range(self, prefix):
+        """prefix로 시작하는 키의 (시작, 끝) 위치"""
+        return (bisect.bisect_left(self._keys, (prefix,)),
+                bisect.bisect_left(self._keys, (prefix + _MAX_CHAR,)))
+
+    def _children(self, prefix):
+        """prefix 바로 다음 글자가 다른 접두어들 (범위를 글자 단위로 건너뛰며 찾음)"""
+        i, end = self._range(prefix)
+        while i < end:
+            key = self._keys[i][0]
+            if len(key) == len(prefix): # 키 자체가 prefix (정렬상 범위 맨 앞)
+                i += 1
+                continue
+            child = key[:len(prefix) + 1]
+            yield child
+            i = self._range(child)[1]
+
+    def _compute_top(self, prefix):
+        """자식 접두어의 상위 목록이 이미 최신이라고 보고 prefix 하나의 상위 목록을 다시 계산"""
+        if len(prefix) == SETTINGS['top_depth']:
+            i, end = self._range(prefix)
+            entries = [(kind, label) for _, kind, label in self._keys[i:end]]
+        else:
+            # 키가 정확히 prefix인 이름 + 자식 접두어의 상위 후보 (자식 밖의 이름은 자식 상위 목록에 들 수 없음)
+            i, end = self._range(prefix)
+            entries = []
+            while i < end and self._keys[i][0] == prefix:
+                entries.append(self._keys[i][1:])
+                i += 1
+            for child in self._children(prefix):
+                entries.extend(self._top.get(child, ()))
+        if entries:
+            self._top[prefix] = self._best(entries)
+        else:
+            self._top.pop(prefix, None)
+
+    def _build_top(self, prefix):
+        if len(prefix) < SETTINGS['top_depth']:
+            for child in self._children(prefix):
+                self._build_top(child)
+        self._compute_top(prefix)
+
+    def _refresh_top(self, kind, label, improved):
+        """
+        이름 하나의 개수/유무가 바뀌면 그 이름의 키가 지나는 짧은 접두어만 긴 것부터 고침
+        순위가 오른 경우(추가/개수 증가)는 기존 목록에 끼워 넣기만 하고, 내려간 이름이 목록에 있었을 때만 다시 계산
+        """
+        if self._loading:
+            return
+        entry = (kind, label)
+        prefixes = {key[:n] for key in search_keys(label) for n in range(1, min(len(key), SETTINGS['top_depth']) + 1)}
+        for prefix in sorted(prefixes, key=len, reverse=True):
+            top = self._top.get(prefix, [])
+            if improved:
+                self._top[prefix] = self._best(top + [entry])
+            elif entry in top:
+                self._compute_top(prefix)
+
+    def _add_label(self, kind, label):
+        if (kind, label) in self._labels:
+            return
+        self._labels[(kind, label)] = set()
+        if self._loading:
+            self._keys.extend((key, kind, label) for key in search_keys(label))
+            return
+        # 알림 하나로 바뀐 물품은 정렬 위치에 바로 끼워 넣음
+        for key in search_keys(label):
+            bisect.insort(self._keys, (key, kind, label))
+
+    def _remove_label(self, kind, label):
+        del self._labels[(kind, label)]
+        for key in search_keys(label):
+            entry = (key, kind, label)
+            i = bisect.bisect_left(self._keys, entry)
+            if i < len(self._keys) and self._keys[i] == entry:
+                del self._keys[i]
+
+    def add_category(self, name):
+        self._add_label('category', name)
+        self._refresh_top('category', name, improved=True)
+
+    def put_item(self, item_id, name):
+        self.remove_item(item_id)
+        self._add_label('item', name)
+        self._labels[('item', name)].add(item_id)
+        self._items[item_id] = name
+        self._refresh_top('item', name, improved=True)
+
+    def remove_item(self, item_id):
+        name = self._items.pop(item_id, None)
+        if name is None:
+            return
+        ids = self._labels[('item', name)]
+        ids.discard(item_id)
+        if not ids:
+            self._remove_label('item', name)
+        self._refresh_top('item', name, improved=False)
+
+    def suggest(self, text, limit):
+        prefix = jamo(text)
+        if not prefix:
+            return []
+        if len(prefix) <= SETTINGS['top_depth'] and limit <= self._top_k:
+            ranked = self._top.get(prefix, [])[:limit]
+        else:
+            # 긴 접두어: 맞는 이름을 모두 모은 뒤 순위를 매김 (키 순서로 limit개에서 멈추면 개수가 많은 물품이 빠질 수 있음)
+            i, end = self._range(prefix)
+            ranked = heapq.nsmallest(limit, {entry[1:] for entry in self._keys[i:end]}, key=self._rank)
+        return [{'kind': kind, 'label': label, 'count': len(self._labels[(kind, label)]) if kind == 'item' else None}
+                for kind, label in ranked]
+
+_indexes = {}  # 단지 ID -> PrefixIndex
+_lock = threading.Lock()
+_stop = threading.Event()
+_threads = []
+_subscribers = [] # 알림(변경 후 상태 dict)을 받을 함수
+
+def load_complex(conn, complex_id):
+    """단지 하나를 DB에서 새로 적재 (conn은 해당 단지로 접속한 연결, RLS로 그 단지의 행만 보임)"""
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT name FROM Categories ORDER BY sort_order")
+        categories = [name for (name,) in cur.fetchall()]
+        cur.execute("SELECT item_id, name FROM Items WHERE status = 'available' AND expiration_date >= CURRENT_DATE")
+        index = PrefixIndex.build(categories, cur.fetchall())
+    finally:
+        cur.close()
+    with _lock:
+        _indexes[complex_id] = index
+    # 알림을 놓쳤을 수 있는 재접속 후에도 구독 쪽이 단지 전체를 새로 읽도록
+    _notify({'complex_id': complex_id, 'item_id': None, 'name': None, 'available': False})
+    return len(index._items)
+
+def apply(change):
+    """트리거 알림 하나를 반영 (알림에는 변경 후 상태가 들어 있으므로 같은 알림을 다시 적용해도 결과가 같음)"""
+    with _lock:
+        index = _indexes.get(change['complex_id'])
+        if index is None:
+            return
+        if change['available']:
+            index.put_item(change['item_id'], change['name'])
+        else:
+            index.remove_item(change['item_id'])
+
+def subscribe(callback):
+    """알림마다 callback(change)를 호출 (다시 적재할 때는 단지마다 complex_id만 담긴 change로 호출)"""
+    if callback not in _subscribers:
+        _subscribers.append(callback)
+
+def _notify(change):
+    for callback in _subscribers:
+        try:
+            callback(change)
+        except Exception as e:
+            print(f"[catalog_index] 구독 함수 오류: {e}")
+
+def suggest(complex_id, text, limit=None):
+    with _lock:
+        index = _indexes.get(complex_id)
+        if index is None:
+            return []
+        return index.suggest(text, limit or SETTINGS['limit'])
+
+def start(shards, listen_connect, reload):
+    """
+    샤드마다 LISTEN 스레드를 띄우고 첫 적재가 끝날 때까지 기다림
+    listen_connect(shard_name): 알림을 받을 연결, reload(shard_name): 그 샤드의 단지를 모두 다시 적재
+    """
+    _stop.clear()
+    ready = []
+    for shard_name in shards:
+        event = threading.Event()
+        thread = threading.Thread(target=_listen, args=(shard_name, listen_connect, reload, event),
+                                  name=f"catalog_index:{shard_name}", daemon=True)
+        thread.start()
+        _threads.append(thread)
+        ready.append(event)
+    for event in ready:
+        event.wait(SETTINGS['ready_timeout_s'])
+
+def stop():
+    _stop.set()
+    for thread in _threads:
+        thread.join(timeout=2)
+    _threads.clear()
+
+def _listen(shard_name, listen_connect, reload, ready):
+    while not _stop.is_set():
+        conn = None
+        try:
+            conn = listen_connect(shard_name)
+            conn.autocommit = True
+            cur = conn.cursor()
+            cur.execute(f"LISTEN {SETTINGS['channel']}")
+            # LISTEN 한 뒤에 적재해야 적재 도중의 변경을 놓치지 않음 (먼저 온 알림은 적재 후 다시 적용해도 무방)
+            reload(shard_name)
+            ready.set()
+            while not _stop.is_set():
+                if select.select([conn], [], [], 1.0)[0]:
+                    conn.poll()
+                    while conn.notifies:
+                        change = json.loads(conn.notifies.pop(0).payload)
+                        apply(change)
+                        _notify(change)
+        except Exception as e:
+            print(f"[catalog_index:{shard_name}] 알림 연결 오류, {SETTINGS['reconnect_delay_s']}초 뒤 다시 적재합니다: {e}")
+            ready.set()
+            _stop.wait(SETTINGS['reconnect_delay_s'])
+        finally:
+            if conn is not None:
+                conn.close()
@@ -0,0 +1,40 @@
+# ==========================================
+# 운영 서버 설정 (gunicorn, pre-fork 멀티 워커)
+# ==========================================
+# 개발용 `python app.py`(단일 프로세스 + 디버거) 대신 운영 환경에서는 이 설정으로 실행합니다.
+#   - 마스터 프로세스가 워커를 fork 하고, 각 워커는 앱을 직접 읽은 뒤(preload 안 함) 자기 접속 풀을 만듭니다.
+#     (fork 전에 만든 DB 연결을 여러 프로세스가 함께 쓰는 일이 없음)
+#   - 워커는 app.warm_up()으로 템플릿 컴파일, 참조 데이터 캐시, DB 연결 예열을 마친 뒤에야 요청을 받습니다.
+#   - kill -HUP <마스터 PID>: 새 코드/설정으로 워커를 새로 띄우고, 기존 워커는 처리 중인 요청을 마친 뒤 종료 (무중단 재시작)
+#   - kill -TERM <마스터 PID>: 새 요청을 받지 않고 graceful_timeout 안에 처리 중인 요청을 마친 뒤 종료 (drain)
+#
+# 사용법: SECRET_KEY=... DB_MANAGER_PASSWORD=... DB_RESIDENT_PASSWORD=... gunicorn -c gunicorn.conf.py app:app
+# 설정은 모두 환경변수로 받습니다. (DB 접속 정보는 app.py 의 MANAGER_CONF / RESIDENT_CONF / POOL_SETTINGS 참고)
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'sync' # psycopg2 호출이 블로킹이므로 프로세스 단위로 동시 처리
+timeout = int(os.environ.get('WORKER_TIMEOUT', '30'))
+graceful_timeout = int(os.environ.get('GRACEFUL_TIMEOUT', '30'))
+keepalive = 5
+# 메모리 누수 대비로 일정 요청마다 워커 교체 (지터로 모든 워커가 동시에 재시작하지 않게 함)
+max_requests = int(os.environ.get('MAX_REQUESTS', '2000'))
+max_requests_jitter = max_requests // 10
+accesslog = '-'
+errorlog = '-'
+
+def on_starting(server):
+    if not os.environ.get('SECRET_KEY'):
+        raise SystemExit("[gunicorn] SECRET_KEY 환경변수를 지정해야 합니다. (세션 쿠키 서명용)")
+
+def post_worker_init(worker):
+    # 앱을 읽은 직후, 요청을 받기 시작하기 전에 워커마다 실행
+    from app import warm_up
+    warm_up()
+
+def worker_exit(server, worker):
+    from app import catalog_index, close_pool
+    catalog_index.stop()
+    close_pool()
@@ -0,0 +1,47 @@
+# ==========================================
+# 연체료 정산 배치 (Late Fee Accrual)
+# ==========================================
+# cron 등으로 하루 한 번 실행합니다.
+#   - 반납일이 지난 모든 대여의 연체료를 DB 함수 accrue_late_fees() 한 번의 호출(집합 연산)로 계산하고
+#     대여자 -> 소유자로 포인트를 이체합니다.
+#   - 대여별 워터마크(late_fee_through) 이후의 일수만 부과하므로, 같은 날 여러 번 실행하거나
+#     며칠 밀렸다가 실행해도 중복 부과되지 않습니다.
+#   - 1일 연체료: 물품별 late_fee_per_day -> 카테고리 정책(Late_Fee_Policies) -> 1일 대여료 순으로 적용
+#   - 한 번의 호출이 샤드 안의 모든 단지를 처리하므로 샤드(Postgres 인스턴스)마다 한 번씩 실행합니다.
+#
+# 사용법: python late_fee_job.py [기준일 YYYY-MM-DD (기본: 오늘)]
+import sys
+from datetime import date
+
+import psycopg2
+
+from app import MANAGER_CONF, SHARDS, shard_conf
+
+def run(as_of=None):
+    totals = [0, 0]
+    for shard_name, shard in SHARDS.items():
+        charged_rentals, charged_total = run_shard(shard_name, shard, as_of or date.today())
+        totals[0] += charged_rentals
+        totals[1] += charged_total
+    return tuple(totals)
+
+def run_shard(shard_name, shard, as_of):
+    conn = psycopg2.connect(**shard_conf(MANAGER_CONF, shard))
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT charged_rentals, charged_total FROM accrue_late_fees(%s)", (as_of,))
+        charged_rentals, charged_total = cur.fetchone()
+
+        conn.commit()
+        print(f"[late_fee_job:{shard_name}] 연체 {charged_rentals}건, 총 {charged_total}P 부과")
+        return charged_rentals, charged_total
+    except Exception as e:
+        conn.rollback()
+        print(f"[late_fee_job:{shard_name}] 실패: {e}")
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+if __name__ == '__main__':
+    run(date.fromisoformat(sys.argv[1]) if len(sys.argv) > 1 else None)
@@ -0,0 +1,145 @@
+# ==========================================
+# 사진 첨부 저장소 (Content-Addressed Media Store)
+# ==========================================
+# - 업로드 본문은 폼 파서가 받는 즉시 media/tmp 의 임시 파일에 쓰면서 SHA-256을 함께 계산합니다.
+#   (파일 전체를 메모리에 올리지 않고, 저장 시 다시 읽지도 않음)
+# - 저장 경로는 내용의 해시(media/originals/ab/abcd...)이므로 같은 사진은 한 번만 저장됩니다. (중복 제거)
+# - 썸네일(media/thumbs/ab/abcd....jpg)은 thumbnail_worker.py가 별도 프로세스로 만듭니다.
+# - 해시 URL의 내용은 절대 바뀌지 않으므로 1년 캐시 + immutable 헤더로 제공하고, 본문은 send_file(운영 서버에서는 sendfile)로 보냅니다.
+# - 파일은 단지 구분 없이 해시로 공유하므로, 화면이 URL을 만들 때 (단지, 해시)의 서명(sign)을 붙이고 /media는 서명만 확인합니다.
+#   (사진마다 DB를 조회하지 않고도, 다른 단지의 주민은 해시를 알아도 받을 수 없음)
+import hashlib
+import hmac
+import os
+import tempfile
+
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+SETTINGS = {
+    'root': os.environ.get('MEDIA_ROOT', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'media')),
+    'max_bytes': 10 * 1024 * 1024, # 사진 한 장 최대 크기
+    'max_files': 5,                # 요청 하나에 첨부할 수 있는 사진 수
+    'thumb_size': (320, 320),
+    'cache_max_age': 365 * 24 * 3600,
+}
+
+# 파일 앞부분(매직 넘버)으로 형식을 판별 (파일 이름/Content-Type 헤더는 믿지 않음)
+_SIGNATURES = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+]
+
+class MediaError(Exception):
+    """첨부를 거부한 사유 (화면에 그대로 표시)"""
+
+def sniff(head):
+    for signature, content_type in _SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+def _dir(*parts):
+    path = os.path.join(SETTINGS['root'], *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def is_hash(value):
+    return len(value) == 64 and all(c in '0123456789abcdef' for c in value)
+
+def sign(secret, complex_id, sha256):
+    """(단지, 해시)에 대한 URL 서명 (secret은 세션 쿠키와 같은 SECRET_KEY)"""
+    key = secret.encode() if isinstance(secret, str) else secret
+    return hmac.new(key, f"{complex_id}:{sha256}".encode(), hashlib.sha256).hexdigest()[:32]
+
+def verify(secret, complex_id, sha256, signature):
+    return hmac.compare_digest(sign(secret, complex_id, sha256), signature or '')
+
+def original_path(sha256):
+    return os.path.join(SETTINGS['root'], 'originals', sha256[:2], sha256)
+
+def thumb_path(sha256):
+    return os.path.join(SETTINGS['root'], 'thumbs', sha256[:2], sha256 + '.jpg')
+
+class HashingSpool:
+    """폼 파서가 파일 본문을 쓰는 스트림: media/tmp 의 임시 파일에 쓰면서 해시/크기/앞부분을 계산"""
+
+    def __init__(self):
+        self.file = tempfile.NamedTemporaryFile(dir=_dir('tmp'), prefix='upload-') # 닫히면(요청 종료) 자동 삭제
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.head = b''
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > SETTINGS['max_bytes']:
+            raise RequestEntityTooLarge(f"사진은 한 장당 {SETTINGS['max_bytes'] // (1024 * 1024)}MB까지 첨부할 수 있습니다.")
+        if len(self.head) < 16:
+            self.head += data[:16 - len(self.head)]
+        self.digest.update(data)
+        return self.file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+class MediaRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return HashingSpool()
+
+def save_upload(storage):
+    """
+    업로드된 파일(FileStorage)을 해시 경로에 확정하고 (sha256, content_type, 바이트 수)를 반환
+    임시 파일을 하드 링크로 옮기므로 복사가 없고, 이미 같은 해시가 있으면 새로 만들지 않습니다.
+    """
+    spool = storage.stream
+    if not isinstance(spool, HashingSpool):
+        raise MediaError("지원하지 않는 업로드 방식입니다.")
+    content_type = sniff(spool.head)
+    if content_type is None:
+        raise MediaError(f"'{storage.filename}'은(는) 이미지 파일(JPEG/PNG/GIF/WEBP)이 아닙니다.")
+
+    sha256 = spool.digest.hexdigest()
+    dest = original_path(sha256)
+    if not os.path.exists(dest):
+        spool.file.flush()
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        try:
+            os.link(spool.file.name, dest)
+        except FileExistsError:
+            pass # 동시에 같은 사진이 올라온 경우
+    return sha256, content_type, spool.size
+
+def save_uploads(files):
+    """폼의 파일 목록 중 실제로 선택된 파일만 저장하고 [(sha256, content_type, 바이트 수)]를 반환"""
+    files = [f for f in files if f.filename]
+    if len(files) > SETTINGS['max_files']:
+        raise MediaError(f"사진은 {SETTINGS['max_files']}장까지 첨부할 수 있습니다.")
+    return [save_upload(f) for f in files]
+
+def resolve(kind, sha256):
+    """
+    /media/<kind>/<sha256> 요청을 실제 파일로 변환 (단지 확인은 app.media()가 URL 서명으로 먼저 함)
+    반환값: (경로, content_type, 캐시 가능 여부) 또는 None
+    썸네일이 아직 만들어지지 않았으면 원본을 짧게만 캐시하도록 돌려줍니다.
+    """
+    if not is_hash(sha256) or kind not in ('original', 'thumb'):
+        return None
+    if kind == 'thumb' and os.path.exists(thumb_path(sha256)):
+        return thumb_path(sha256), 'image/jpeg', True
+    path = original_path(sha256)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        content_type = sniff(f.read(16))
+    return path, content_type, kind == 'original'
+
+def init_app(app):
+    """업로드 스트림을 해시 저장소로 바로 쓰도록 요청 클래스를 바꾸고 요청 크기를 제한"""
+    app.request_class = MediaRequest
+    app.config['MAX_CONTENT_LENGTH'] = SETTINGS['max_files'] * SETTINGS['max_bytes'] + 1024 * 1024
+    # 앞단에 nginx 등을 두면 파일 전송을 웹 서버에 맡김 (X-Sendfile)
+    app.config['USE_X_SENDFILE'] = os.environ.get('MEDIA_X_SENDFILE') == '1'
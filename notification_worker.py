@@ -0,0 +1,164 @@
+# ==========================================
+# 알림 발송 워커 (Notification Outbox Worker)
+# ==========================================
+# 웹 요청은 상태 전이와 같은 트랜잭션에서 Notification_Outbox에 한 행을 적재만 하고,
+# 이 워커가 별도 프로세스로 대기 중인 알림을 배치로 가져가 채널(파일/SMTP 등)로 발송합니다.
+#   - 여러 워커를 동시에 띄워도 FOR UPDATE SKIP LOCKED로 같은 알림을 나눠 가지지 않습니다.
+#   - 발송 실패 시 지수 백오프(backoff_base_s * 2^시도횟수, 최대 backoff_max_s)로 재시도하고,
+#     max_attempts회 실패하면 'failed'로 남깁니다. (at-least-once: 일부 채널만 성공한 경우 재시도 시 중복될 수 있음)
+#   - 단지마다 접속을 따로 두고 번갈아 배치를 처리합니다. (한 단지에 알림이 몰려도 다른 단지가 밀리지 않음)
+#     새 단지를 추가하면 워커를 다시 시작해야 합니다.
+#
+# 사용법: python notification_worker.py [--once]
+import json
+import os
+import random
+import smtplib
+import sys
+import time
+from email.message import EmailMessage
+
+from app import MANAGER_CONF, connect_complex, list_complexes
+
+SETTINGS = {
+    'batch_size': 50,
+    'poll_interval_s': 2,
+    'max_attempts': 5,
+    'backoff_base_s': 10,
+    'backoff_max_s': 3600,
+}
+
+# 이벤트별 알림 문구 (payload의 키로 채움)
+MESSAGES = {
+    'rental_approved': "✅ '{item_name}' 대여 요청이 승인되었습니다.",
+    'driver_assigned': "🛵 '{item_name}' 배송 기사가 배정되었습니다.",
+    'item_arrived': "📦 '{item_name}' 물품이 도착했습니다.",
+    'return_confirmed': "↩️ '{item_name}' 반납이 확정되었습니다. (환불 {refund}P, 연체료 {late_fee}P)",
+    'waitlist_promoted': "⏳ '{item_name}' 대기 차례가 되어 대여 신청이 접수되었습니다.",
+    'dispute_adjudicated': "⚖️ '{item_name}' 분쟁 판결: {resolution} (배상금 {amount}P)",
+}
+
+def render_message(event_type, payload):
+    template = MESSAGES.get(event_type)
+    if template is None:
+        return f"[{event_type}] {json.dumps(payload, ensure_ascii=False)}"
+    return template.format(**payload)
+
+# ==========================================
+# 발송 채널 (send()가 예외를 던지면 실패로 보고 재시도)
+# ==========================================
+class FileChannel:
+    """로컬 파일에 JSON 한 줄씩 기록 (개발/테스트용)"""
+
+    def __init__(self, path=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs', 'notifications.log')):
+        self.path = path
+
+    def send(self, recipient, event_type, message, payload):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({
+                'ts': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'to': recipient['user_id'],
+                'event': event_type,
+                'message': message,
+                'payload': payload,
+            }, ensure_ascii=False) + '\n')
+
+class SmtpChannel:
+    """SMTP 발송 (주민 테이블에 이메일이 없으므로 '{user_id}@{domain}' 주소로 보냄)
+    로컬 테스트: python -m aiosmtpd -n -l localhost:1025"""
+
+    def __init__(self, host='localhost', port=1025, sender='noreply@apartment.local', domain='apartment.local'):
+        self.host, self.port, self.sender, self.domain = host, port, sender, domain
+
+    def send(self, recipient, event_type, message, payload):
+        msg = EmailMessage()
+        msg['From'] = self.sender
+        msg['To'] = f"{recipient['user_id']}@{self.domain}"
+        msg['Subject'] = message
+        msg.set_content(f"{recipient['name']}님, {message}")
+        with smtplib.SMTP(self.host, self.port, timeout=10) as smtp:
+            smtp.send_message(msg)
+
+# 사용할 채널 목록 (SmtpChannel() 등을 추가하여 확장)
+CHANNELS = [FileChannel()]
+
+def backoff_seconds(attempts):
+    delay = min(SETTINGS['backoff_base_s'] * (2 ** attempts), SETTINGS['backoff_max_s'])
+    return delay * random.uniform(0.8, 1.2) # 동시에 실패한 알림들이 한꺼번에 재시도하지 않도록 지터
+
+def drain_once(conn, channels=None):
+    """대기 중인 알림을 한 배치 발송하고 (발송 성공 수, 실패 수)를 반환"""
+    channels = CHANNELS if channels is None else channels
+    cur = conn.cursor()
+    try:
+        # 수신자 정보는 개인정보 보호 뷰에서 조회 (매니저 계정은 Residents 직접 조회 불가)
+        cur.execute("""
+            SELECT o.outbox_id, o.event_type, o.payload, o.attempts, u.user_id, u.name
+            FROM Notification_Outbox o
+            JOIN View_Manager_Residents u ON o.recipient_id = u.resident_id
+            WHERE o.status = 'pending' AND o.next_attempt_at <= now()
+            ORDER BY o.outbox_id
+            LIMIT %s
+            FOR UPDATE OF o SKIP LOCKED
+        """, (SETTINGS['batch_size'],))
+        rows = cur.fetchall()
+
+        sent_ids = []
+        failures = []
+        for outbox_id, event_type, payload, attempts, user_id, name in rows:
+            recipient = {'user_id': user_id, 'name': name}
+            try:
+                message = render_message(event_type, payload)
+                for channel in channels:
+                    channel.send(recipient, event_type, message, payload)
+                sent_ids.append(outbox_id)
+            except Exception as e:
+                failures.append((outbox_id, attempts, str(e)))
+
+        if sent_ids:
+            cur.execute("""
+                UPDATE Notification_Outbox
+                SET status = 'sent', sent_at = now(), attempts = attempts + 1, last_error = NULL
+                WHERE outbox_id = ANY(%s)
+            """, (sent_ids,))
+        for outbox_id, attempts, error in failures:
+            cur.execute("""
+                UPDATE Notification_Outbox
+                SET attempts = attempts + 1,
+                    last_error = %s,
+                    next_attempt_at = now() + make_interval(secs => %s),
+                    status = CASE WHEN attempts + 1 >= %s THEN 'failed' ELSE 'pending' END
+                WHERE outbox_id = %s
+            """, (error, backoff_seconds(attempts), SETTINGS['max_attempts'], outbox_id))
+
+        conn.commit()
+        return len(sent_ids), len(failures)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+def run(once=False):
+    conns = {complex_id: connect_complex(MANAGER_CONF, complex_id) for complex_id, _ in list_complexes()}
+    try:
+        while True:
+            busy = False
+            for complex_id, conn in conns.items():
+                sent, failed = drain_once(conn)
+                if sent or failed:
+                    print(f"[notification_worker:{complex_id}] 발송 {sent}건, 실패 {failed}건")
+                # 배치가 가득 찼으면 해당 단지에 더 쌓여 있을 수 있음
+                busy = busy or sent + failed >= SETTINGS['batch_size']
+            if busy:
+                continue
+            if once:
+                break
+            time.sleep(SETTINGS['poll_interval_s'])
+    finally:
+        for conn in conns.values():
+            conn.close()
+
+if __name__ == '__main__':
+    run(once='--once' in sys.argv)
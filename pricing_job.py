@@ -0,0 +1,141 @@
+# ==========================================
+# 카테고리별 수요 예측 & 추천 대여료 배치 (Demand Forecast / Suggested Pricing)
+# ==========================================
+# cron 등으로 하루 한 번 실행합니다. 최근 HISTORY_WEEKS주 대여 이력을 COPY로 한 번에 읽어 NumPy로 계산하고,
+# 카테고리마다 한 행씩 Category_Price_Suggestions 테이블에 저장합니다.
+#   1) 주간 수요: (카테고리, 주) 칸마다 그 주에 시작한 대여의 대여일 합계 (bincount 한 번, 행 단위 반복 없음)
+#   2) 예측: 카테고리별 시계열에 Holt 선형 지수 평활(수준 + 추세)을 적용해 다음 주 대여일을 예측
+#      (주 단위 반복은 HISTORY_WEEKS번뿐이고, 카테고리 전체를 벡터로 한 번에 갱신)
+#   3) 예상 이용률 = 예측 대여일 / (현재 등록된 물품 수 x 7일)
+#   4) 추천가 = 최근 실제 대여된 1일 대여료의 중앙값(대여 이력이 없으면 등록 물품의 중앙값)을
+#      이용률이 목표(TARGET_UTILIZATION)보다 높으면 올리고 낮으면 내림 (최대 ±MAX_ADJUST, FEE_STEP 단위 반올림)
+# 웹 요청(물품 등록 화면, 소유자 탭)은 계산하지 않고 저장된 결과를 워커 캐시(app.price_suggestions)로 읽기만 합니다.
+# 단지마다 따로 계산합니다. (접속 단지의 행만 보이므로 다른 단지의 이력이 섞이지 않음)
+#
+# 사용법: python pricing_job.py
+import time
+
+# app은 import 시점에 DB 접속 정보를 읽으므로 run()/run_complex() 안에서 import (계산부는 DB 없이 import해서 테스트)
+from recommendation_job import _copy_ints, _copy_rows
+
+try:
+    import numpy as np
+except ImportError: # 배치에서만 쓰는 선택 의존성 (웹 서버에는 필요 없음)
+    raise SystemExit("[pricing_job] numpy가 필요합니다: pip install numpy")
+
+HISTORY_WEEKS = 52        # 수요 시계열 길이 (이번 주는 아직 끝나지 않았으므로 제외)
+LEVEL_SMOOTHING = 0.3     # Holt 평활 계수 (수준)
+TREND_SMOOTHING = 0.1     # Holt 평활 계수 (추세)
+TARGET_UTILIZATION = 0.5  # 이 이용률일 때 중앙값 그대로 추천
+ELASTICITY = 0.8          # 이용률이 목표에서 1.0 벗어날 때 가격 조정 비율
+MAX_ADJUST = 0.4          # 중앙값 대비 최대 조정 폭 (±40%)
+FEE_STEP = 10             # 추천가 반올림 단위 (P)
+
+# 카테고리 번호는 분류표 순서 (SQL과 Python이 같은 순서를 쓰도록 한 곳에서 정의)
+CATEGORY_INDEX = "SELECT name, (row_number() OVER (ORDER BY sort_order, name) - 1)::INT AS idx FROM Categories"
+
+def weekly_demand(cat_idx, weeks_ago, days, n_categories, n_weeks):
+    """(카테고리, 주) 대여일 합계 행렬, 열은 오래된 주 -> 지난주 순서"""
+    keep = (weeks_ago >= 1) & (weeks_ago <= n_weeks)
+    cell = cat_idx[keep] * n_weeks + (n_weeks - weeks_ago[keep])
+    return np.bincount(cell, weights=days[keep], minlength=n_categories * n_weeks).reshape(n_categories, n_weeks)
+
+def holt_forecast(series, alpha=LEVEL_SMOOTHING, beta=TREND_SMOOTHING):
+    """행(카테고리)마다 Holt 선형 지수 평활로 다음 한 주를 예측 (음수는 0)"""
+    level = series[:, 0].astype(np.float64)
+    trend = np.zeros(len(series))
+    for t in range(1, series.shape[1]):
+        prev = level
+        level = alpha * series[:, t] + (1 - alpha) * (level + trend)
+        trend = beta * (level - prev) + (1 - beta) * trend
+    return np.maximum(level + trend, 0.0)
+
+def group_median(group, values, n_groups):
+    """그룹별 중앙값 (정렬 한 번, 값이 없는 그룹은 NaN)"""
+    order = np.lexsort((values, group))
+    group, values = group[order], values[order]
+    counts = np.bincount(group, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    medians = np.full(n_groups, np.nan)
+    has = counts > 0
+    lo = starts[has] + (counts[has] - 1) // 2
+    hi = starts[has] + counts[has] // 2
+    medians[has] = (values[lo] + values[hi]) / 2.0
+    return medians
+
+def suggest_prices(rentals, listings, n_categories, n_weeks=HISTORY_WEEKS):
+    """
+    rentals: (카테고리 번호, 몇 주 전, 대여일, 1일 대여료), listings: (카테고리 번호, 1일 대여료)
+    반환: 카테고리 번호, 추천가, 예상 이용률, 예측 대여일, 대여 건수 (기준 가격이 있는 카테고리만)
+    """
+    cat_idx, weeks_ago, days, fees = (rentals[:, i] for i in range(4))
+    demand = weekly_demand(cat_idx, weeks_ago, days, n_categories, n_weeks)
+    forecast = holt_forecast(demand)
+
+    supply = np.bincount(listings[:, 0], minlength=n_categories)
+    utilization = np.clip(forecast / (np.maximum(supply, 1) * 7.0), 0.0, 1.0)
+
+    base = group_median(cat_idx, fees, n_categories)
+    listed = group_median(listings[:, 0], listings[:, 1], n_categories)
+    base = np.where(np.isnan(base), listed, base)
+
+    factor = np.clip(1 + ELASTICITY * (utilization - TARGET_UTILIZATION), 1 - MAX_ADJUST, 1 + MAX_ADJUST)
+    known = ~np.isnan(base)
+    suggested = np.rint(base[known] * factor[known] / FEE_STEP) * FEE_STEP
+    samples = np.bincount(cat_idx, minlength=n_categories)
+    return (np.flatnonzero(known), suggested.astype(np.int64), utilization[known].astype(np.float32),
+            forecast[known].astype(np.float32), samples[known])
+
+def run():
+    from app import list_complexes
+    for complex_id, name in list_complexes():
+        run_complex(complex_id)
+
+def run_complex(complex_id):
+    from app import MANAGER_CONF, connect_complex
+    started = time.perf_counter()
+    conn = connect_complex(MANAGER_CONF, complex_id)
+    cur = conn.cursor()
+    try:
+        cur.execute(f"SELECT name FROM ({CATEGORY_INDEX}) c ORDER BY idx")
+        categories = np.array([row[0] for row in cur.fetchall()], dtype=object)
+
+        # 실제로 대여가 성사된 건만 (신청/거절 제외), 보관된 과거 파티션 포함
+        rentals = _copy_ints(cur, f"""
+            SELECT c.idx, (CURRENT_DATE - r.start_date) / 7, r.end_date - r.start_date + 1, i.rent_fee
+            FROM Rentals_History r
+            JOIN Items i ON r.item_id = i.item_id
+            JOIN ({CATEGORY_INDEX}) c ON c.name = i.category
+            WHERE r.status NOT IN ('requested', 'rejected')
+              AND r.start_date >= CURRENT_DATE - {7 * (HISTORY_WEEKS + 1)}
+        """, 4)
+        # 현재 등록되어 있는 물품 (대여 중/분쟁 중 포함, 철회/만료 제외) = 공급
+        listings = _copy_ints(cur, f"""
+            SELECT c.idx, i.rent_fee
+            FROM Items i JOIN ({CATEGORY_INDEX}) c ON c.name = i.category
+            WHERE i.status IN ('available', 'rented', 'disputed') AND i.expiration_date >= CURRENT_DATE
+        """, 2)
+        loaded = time.perf_counter()
+
+        cat, suggested, utilization, forecast, samples = suggest_prices(rentals, listings, len(categories))
+        computed = time.perf_counter()
+
+        # 한 트랜잭션 안에서 교체하므로 조회하는 쪽은 이전 결과 또는 새 결과 중 하나만 봄
+        cur.execute("DELETE FROM Category_Price_Suggestions")
+        _copy_rows(cur, 'Category_Price_Suggestions',
+                   ('category', 'suggested_fee', 'expected_utilization', 'forecast_rental_days', 'sample_rentals'),
+                   (categories[cat], suggested, utilization, forecast, samples))
+        conn.commit()
+
+        print(f"[pricing_job:{complex_id}] 대여 {len(rentals)}건, 등록 물품 {len(listings)}개 -> 카테고리 {len(cat)}개 추천가 "
+              f"(로딩 {loaded - started:.1f}s, 계산 {computed - loaded:.1f}s, 저장 {time.perf_counter() - computed:.1f}s)")
+    except Exception as e:
+        conn.rollback()
+        print(f"[pricing_job:{complex_id}] 실패: {e}")
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,204 @@
+# ==========================================
+# 느린 쿼리 로그 & 라우트별 시간 예산 (Slow Query Log)
+# ==========================================
+# - 모든 SQL 문장의 실행 시간을 측정하여, 임계값(slow_query_ms)을 넘으면 로그에 기록합니다.
+#   (파라미터 값은 개인정보 보호를 위해 타입 + 해시(fingerprint)로만 남깁니다.)
+# - 느린 문장 중 일부(plan_sample_rate)는 실행 계획을 따로 수집합니다. 요청은 문장과 파라미터를 대기열에 넣기만 하고,
+#   백그라운드 스레드가 별도의 읽기 전용 연결에서 EXPLAIN을 실행해 'statement_plan' 줄로 남깁니다.
+#   (요청의 트랜잭션/잠금 안에서 같은 문장을 다시 실행하지 않음. 조회 문장은 ANALYZE, 쓰기 문장은 계획만)
+# - 요청 하나의 전체 처리 시간이 라우트 예산을 넘으면, 그 요청에서 실행된 문장별 시간을 함께 기록합니다.
+# 로그는 logs/slow_query.log 에 JSON 한 줄씩 쌓이며 크기 기준으로 순환(rotate)됩니다.
+import hashlib
+import json
+import logging
+import os
+import random
+import queue
+import re
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+
+import psycopg2
+import psycopg2.extensions
+from flask import g, has_request_context, request
+from psycopg2 import errors
+
+SETTINGS = {
+    'slow_query_ms': 200,            # 문장 단위 임계값
+    'plan_sample_rate': 0.2,         # 느린 문장 중 실행 계획까지 수집할 비율 (0 ~ 1)
+    'plan_queue_size': 100,          # 실행 계획 대기열 상한 (가득 차면 그 문장은 계획 없이 기록)
+    'default_route_budget_ms': 300,  # 라우트 예산 기본값
+    'route_budget_ms': {             # 라우트(endpoint)별 예산
+        'index': 800,
+    },
+    'log_path': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs', 'slow_query.log'),
+    'max_bytes': 5 * 1024 * 1024,
+    'backup_count': 5,
+}
+
+logger = logging.getLogger('slow_query')
+logger.setLevel(logging.INFO)
+logger.propagate = False
+
+_EXPLAINABLE = ('select', 'update', 'insert', 'delete', 'with')
+_ANALYZABLE = ('select', 'with')
+
+_plan_queue = queue.Queue(maxsize=SETTINGS['plan_queue_size'])
+_plan_thread = None
+_plan_lock = threading.Lock()
+_connect_args = None # 연결 -> (args, kwargs): 같은 계정/단지로 새로 접속하기 위한 인자 (init_app에서 지정)
+
+def _ensure_handler():
+    if logger.handlers:
+        return
+    os.makedirs(os.path.dirname(SETTINGS['log_path']), exist_ok=True)
+    handler = RotatingFileHandler(SETTINGS['log_path'], maxBytes=SETTINGS['max_bytes'],
+                                  backupCount=SETTINGS['backup_count'], encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+
+def _write(event):
+    _ensure_handler()
+    event['ts'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+    logger.info(json.dumps(event, ensure_ascii=False, default=str))
+
+def normalize_query(query):
+    """SQL 주석을 빼고 공백/줄바꿈을 하나로 합친 쿼리 문자열 (같은 문장을 하나로 묶기 위함)"""
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    query = re.sub(r'--[^\n]*', '', str(query))
+    return re.sub(r'\s+', ' ', query).strip()
+
+def query_fingerprint(query):
+    return hashlib.sha1(normalize_query(query).encode('utf-8')).hexdigest()[:12]
+
+def fingerprint_params(params):
+    """파라미터 값을 '타입#해시' 형태로 바꿔, 값 자체는 남기지 않고 같은 값끼리만 구분되게 함"""
+    if params is None:
+        return None
+    values = params.values() if isinstance(params, dict) else params
+    return [f"{type(v).__name__}#{hashlib.sha1(repr(v).encode('utf-8')).hexdigest()[:8]}" for v in values]
+
+def _route():
+    return request.endpoint if has_request_context() else None
+
+class TimedCursor(psycopg2.extensions.cursor):
+    """실행 시간을 측정하여 느린 문장을 기록하는 커서 (get_db_connection 에서 cursor_factory로 사용)"""
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            result = super().execute(query, vars)
+        except Exception as e:
+            _record(self, query, vars, (time.perf_counter() - start) * 1000, error=e)
+            raise
+        _record(self, query, vars, (time.perf_counter() - start) * 1000)
+        return result
+
+def _record(cur, query, params, elapsed_ms, error=None):
+    if has_request_context():
+        g.setdefault('qm_statements', []).append((query_fingerprint(query), round(elapsed_ms, 2)))
+
+    if elapsed_ms < SETTINGS['slow_query_ms'] and error is None:
+        return
+
+    event = {
+        'type': 'slow_statement' if error is None else 'failed_statement',
+        'route': _route(),
+        'ms': round(elapsed_ms, 2),
+        'fingerprint': query_fingerprint(query),
+        'query': normalize_query(query),
+        'params': fingerprint_params(params),
+    }
+    if error is not None:
+        # statement_timeout 으로 취소된 문장 등
+        event['error'] = str(error).strip()
+    elif random.random() < SETTINGS['plan_sample_rate']:
+        event['plan_queued'] = _queue_plan(cur, query, params, event)
+    _write(event)
+
+def _queue_plan(cur, query, params, event):
+    """실행 계획 수집을 대기열에 넣음 (요청 스레드에서는 DB에 아무것도 보내지 않음)"""
+    global _plan_thread
+    if _connect_args is None or not normalize_query(query).lower().startswith(_EXPLAINABLE):
+        return False
+    connect_args = _connect_args(cur.connection)
+    if connect_args is None:
+        return False
+    try:
+        _plan_queue.put_nowait((connect_args, query, params, event['route'], event['fingerprint'], event['params']))
+    except queue.Full:
+        return False
+    with _plan_lock:
+        if _plan_thread is None or not _plan_thread.is_alive():
+            _plan_thread = threading.Thread(target=_plan_worker, name='query-plan', daemon=True)
+            _plan_thread.start()
+    return True
+
+def _plan_worker():
+    while True:
+        connect_args, query, params, route, fingerprint, param_prints = _plan_queue.get()
+        try:
+            _write({'type': 'statement_plan', 'route': route, 'fingerprint': fingerprint, 'params': param_prints,
+                    'plan': _explain(connect_args, query, params)})
+        finally:
+            _plan_queue.task_done()
+
+def _explain(connect_args, query, params):
+    """별도 연결의 읽기 전용 트랜잭션에서 EXPLAIN (조회 문장만 ANALYZE, 끝나면 되돌림)"""
+    args, kwargs = connect_args
+    try:
+        conn = psycopg2.connect(*args, **dict(kwargs, cursor_factory=psycopg2.extensions.cursor))
+    except Exception as e:
+        return [f"plan capture failed: {str(e).strip()}"]
+    try:
+        conn.set_session(readonly=True)
+        cur = conn.cursor()
+        analyze = normalize_query(query).lower().startswith(_ANALYZABLE)
+        try:
+            cur.execute(("EXPLAIN (ANALYZE, BUFFERS) " if analyze else "EXPLAIN ") + query, params)
+        except errors.ReadOnlySqlTransaction:
+            # 데이터를 바꾸는 함수를 부르는 SELECT (예: SELECT approve_rental(...))는 계획만
+            conn.rollback()
+            cur.execute("EXPLAIN " + query, params)
+        return [row[0] for row in cur.fetchall()]
+    except Exception as e:
+        return [f"plan capture failed: {str(e).strip()}"]
+    finally:
+        conn.rollback()
+        conn.close()
+
+def init_app(app, connect_args=None):
+    """
+    라우트 단위 시간 예산 측정 훅 등록
+    connect_args(conn)는 실행 계획 수집용으로 같은 계정/단지에 새로 접속할 (args, kwargs)를 돌려줌 (없으면 계획 수집 안 함)
+    """
+    global _connect_args
+    _connect_args = connect_args
+
+    @app.before_request
+    def _qm_start():
+        g.qm_start = time.perf_counter()
+        g.qm_statements = []
+
+    @app.after_request
+    def _qm_check_budget(response):
+        start = g.get('qm_start')
+        if start is None:
+            return response
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        budget = SETTINGS['route_budget_ms'].get(request.endpoint, SETTINGS['default_route_budget_ms'])
+        if elapsed_ms > budget:
+            statements = g.get('qm_statements', [])
+            _write({
+                'type': 'route_over_budget',
+                'route': request.endpoint,
+                'ms': round(elapsed_ms, 2),
+                'budget_ms': budget,
+                'statement_count': len(statements),
+                'sql_ms': round(sum(ms for _, ms in statements), 2),
+                # 가장 오래 걸린 문장부터 (범인 찾기)
+                'top_statements': sorted(statements, key=lambda s: -s[1])[:5],
+            })
+        return response
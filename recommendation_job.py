@@ -0,0 +1,177 @@
+# ==========================================
+# 추천 결과 계산 배치 (Offline Recommendations)
+# ==========================================
+# cron 등으로 하루 한 번 실행합니다. 대여 이력 전체를 한 번에 읽어 NumPy/SciPy 희소 행렬로 계산하고,
+# 상위 K개만 Item_Recommendations / Building_Popular_Items 테이블에 저장합니다.
+#   1) 함께 빌린 물품: 주민 x 물품 이진 행렬 X로 공동 대여 행렬 C = X^T X 를 물품 묶음 단위로 계산하고,
+#      인기 물품 쏠림을 줄이기 위해 코사인 정규화(C_ij / sqrt(n_i * n_j))한 점수 기준 상위 K개
+#   2) 우리 동 인기 물품: 동(building) x 물품 행렬에 최근 대여일수록 큰 가중치(반감기 HALF_LIFE_DAYS)를 더한 점수 기준 상위 K개
+# 웹 요청(index, rent_item)은 계산하지 않고 저장된 결과를 PK 인덱스로 조회만 합니다.
+# 단지마다 따로 계산합니다. (접속 단지의 행만 보이므로 다른 단지의 이력이 섞이지 않음)
+#
+# 사용법: python recommendation_job.py [K (기본 10)]
+import io
+import sys
+import time
+
+# app은 import 시점에 DB 접속 정보를 읽으므로 run()/run_complex() 안에서 import (계산부는 DB 없이 import해서 테스트)
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError: # 추천 배치에서만 쓰는 선택 의존성 (웹 서버에는 필요 없음)
+    raise SystemExit("[recommendation_job] numpy, scipy가 필요합니다: pip install numpy scipy")
+
+TOP_K = 10
+HALF_LIFE_DAYS = 90
+BLOCK_CELLS = 32 * 1024 * 1024 # 공동 대여 행렬을 한 번에 dense로 펼칠 최대 칸 수
+MAX_ITEMS_PER_USER = 100       # 공동 대여 계산에 쓰는 주민별 최근 물품 수
+
+def _copy_ints(cur, sql, ncols):
+    """COPY ... TO STDOUT 결과(정수 컬럼)를 (행 수, ncols) 배열로 읽음 (2백만 행 기준 fetchall보다 수 배 빠름)"""
+    buf = io.BytesIO()
+    cur.copy_expert(f"COPY ({sql}) TO STDOUT", buf)
+    raw = buf.getvalue()
+    if not raw:
+        return np.empty((0, ncols), dtype=np.int64)
+    return np.fromstring(raw.replace(b'\t', b' ').decode('ascii'), dtype=np.int64, sep=' ').reshape(-1, ncols)
+
+def top_k_per_row(mat, k):
+    """희소 행렬의 행마다 값이 큰 상위 k개를 (행, 순위, 열, 값) 배열로 반환 (행 단위 반복 없이 정렬 한 번)"""
+    coo = mat.tocoo()
+    order = np.lexsort((coo.col, -coo.data, coo.row)) # 행 -> 점수 내림차순 -> 열(동점 정리)
+    rows, cols, vals = coo.row[order], coo.col[order], coo.data[order]
+    rank = np.arange(len(rows)) - np.searchsorted(rows, rows, side='left') # 행 안에서의 0부터 시작하는 순위
+    keep = rank < k
+    return rows[keep], rank[keep] + 1, cols[keep], vals[keep]
+
+def recent_distinct_pairs(u_idx, i_idx, age_days, n_items, limit):
+    """(주민, 물품) 중복을 없애고 주민마다 최근 limit개 물품만 남긴 인덱스
+    (대여가 아주 많은 소수 주민이 공동 대여 계산량을 제곱으로 늘리는 것을 막음)"""
+    if len(u_idx) == 0:
+        return np.empty(0, dtype=np.int64)
+    key = u_idx.astype(np.int64) * n_items + i_idx
+    order = np.lexsort((age_days, key))
+    first = np.r_[True, key[order][1:] != key[order][:-1]] # 같은 (주민, 물품) 중 가장 최근 1건
+    pairs = order[first]
+
+    by_user = pairs[np.lexsort((age_days[pairs], u_idx[pairs]))]
+    users_sorted = u_idx[by_user]
+    rank = np.arange(len(by_user)) - np.searchsorted(users_sorted, users_sorted, side='left')
+    return by_user[rank < limit]
+
+def item_cooccurrence(borrower_ids, item_ids, age_days, k):
+    users, u_idx = np.unique(borrower_ids, return_inverse=True)
+    items, i_idx = np.unique(item_ids, return_inverse=True)
+    n_items = len(items)
+
+    keep = recent_distinct_pairs(u_idx, i_idx, age_days, n_items, MAX_ITEMS_PER_USER)
+    x = sparse.csr_matrix((np.ones(len(keep), dtype=np.float32), (u_idx[keep], i_idx[keep])),
+                          shape=(len(users), n_items)) # 주민 x 물품 이진 행렬
+    xt = x.T.tocsr()
+    # 주민별 상한(MAX_ITEMS_PER_USER)에 밀려 남은 대여가 없는 물품은 0 (점수 0 -> 추천에서 제외)
+    counts = np.asarray(x.sum(axis=0), dtype=np.float32).ravel()
+    inv_norm = np.divide(1.0, np.sqrt(counts), out=np.zeros_like(counts), where=counts > 0)
+
+    # C = X^T X 전체는 물품 수의 제곱 크기가 될 수 있으므로 물품 행 묶음(block) 단위로 계산하고,
+    # 각 묶음은 dense 배열로 바꿔 argpartition으로 상위 K개만 남김 (메모리: 묶음당 BLOCK_CELLS * 4바이트)
+    block = max(1, BLOCK_CELLS // max(n_items, 1))
+    kk = min(k, n_items - 1)
+    out = ([], [], [], [])
+    for start in range(0, n_items if kk > 0 else 0, block):
+        end = min(start + block, n_items)
+        scores = (xt[start:end] @ x).toarray()
+        scores[np.arange(end - start), np.arange(start, end)] = 0 # 자기 자신 제외
+        scores *= inv_norm[start:end, None]
+        scores *= inv_norm[None, :] # 코사인 정규화
+
+        top = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.lexsort((top, -top_scores), axis=1) # 점수 내림차순, 동점은 물품 번호순
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        rows = np.repeat(np.arange(start, end), kk)
+        ranks = np.tile(np.arange(1, kk + 1), end - start)
+        keep = top_scores.ravel() > 0 # 함께 빌린 적이 없는 물품은 제외
+        out[0].append(items[rows[keep]])
+        out[1].append(ranks[keep])
+        out[2].append(items[top.ravel()[keep]])
+        out[3].append(top_scores.ravel()[keep])
+    if not out[0]:
+        return tuple(np.empty(0) for _ in out)
+    return tuple(np.concatenate(part) for part in out)
+
+def building_popularity(borrower_ids, item_ids, age_days, resident_ids, buildings, k):
+    names, b_code = np.unique(np.asarray(buildings, dtype=object).astype(str), return_inverse=True)
+    building_of = np.full(max(int(resident_ids.max(initial=0)), int(borrower_ids.max(initial=0))) + 1, -1)
+    building_of[resident_ids] = b_code
+
+    b_idx = building_of[borrower_ids]
+    known = b_idx >= 0
+    items, i_idx = np.unique(item_ids[known], return_inverse=True)
+    weight = np.power(0.5, age_days[known] / HALF_LIFE_DAYS).astype(np.float32)
+
+    pop = sparse.csr_matrix((weight, (b_idx[known], i_idx)), shape=(len(names), len(items)))
+    rows, ranks, cols, vals = top_k_per_row(pop, k)
+    return names[rows], ranks, items[cols], vals
+
+def _copy_rows(cur, table, columns, rows):
+    """COPY로 임시 테이블에 적재한 뒤 INSERT ... SELECT (RLS가 걸린 테이블에는 COPY FROM을 직접 쓸 수 없음)"""
+    lines = zip(*(np.asarray(col).tolist() for col in rows)) # numpy 스칼라 대신 파이썬 값으로 변환해 문자열화
+    buf = io.StringIO(''.join('\t'.join(map(str, row)) + '\n' for row in lines))
+    cols = ', '.join(columns)
+    cur.execute(f"CREATE TEMP TABLE staging (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP")
+    cur.copy_expert(f"COPY staging ({cols}) FROM STDIN", buf)
+    cur.execute(f"INSERT INTO {table} ({cols}) SELECT {cols} FROM staging")
+    cur.execute("DROP TABLE staging")
+
+def run(k=TOP_K):
+    from app import list_complexes
+    for complex_id, name in list_complexes():
+        run_complex(complex_id, k)
+
+def run_complex(complex_id, k):
+    from app import MANAGER_CONF, connect_complex
+    started = time.perf_counter()
+    conn = connect_complex(MANAGER_CONF, complex_id)
+    cur = conn.cursor()
+    try:
+        # 매니저 계정은 Residents를 직접 읽을 수 없으므로 개인정보 보호 뷰에서 동 정보만 사용
+        cur.execute("SELECT resident_id, building FROM View_Manager_Residents")
+        residents = cur.fetchall()
+        resident_ids = np.array([r[0] for r in residents], dtype=np.int64)
+        buildings = [r[1] for r in residents]
+
+        # 실제로 대여가 성사된 건만 (신청/거절 제외), 보관된 과거 파티션 포함
+        rentals = _copy_ints(cur, """
+            SELECT borrower_id, item_id, GREATEST(CURRENT_DATE - start_date, 0)
+            FROM Rentals_History
+            WHERE status NOT IN ('requested', 'rejected')
+        """, 3)
+        borrower_ids, item_ids, age_days = rentals[:, 0], rentals[:, 1], rentals[:, 2]
+        loaded = time.perf_counter()
+
+        item_recs = item_cooccurrence(borrower_ids, item_ids, age_days, k)
+        building_recs = building_popularity(borrower_ids, item_ids, age_days, resident_ids, buildings, k)
+        computed = time.perf_counter()
+
+        # 한 트랜잭션 안에서 교체하므로 조회하는 쪽은 이전 결과 또는 새 결과 중 하나만 봄
+        cur.execute("DELETE FROM Item_Recommendations")
+        cur.execute("DELETE FROM Building_Popular_Items")
+        _copy_rows(cur, 'Item_Recommendations', ('item_id', 'rank', 'recommended_item_id', 'score'), item_recs)
+        _copy_rows(cur, 'Building_Popular_Items', ('building', 'rank', 'item_id', 'score'), building_recs)
+        conn.commit()
+
+        print(f"[recommendation_job:{complex_id}] 대여 {len(rentals)}건 -> 물품 추천 {len(item_recs[0])}행, 동별 인기 {len(building_recs[0])}행 "
+              f"(로딩 {loaded - started:.1f}s, 계산 {computed - loaded:.1f}s, 저장 {time.perf_counter() - computed:.1f}s)")
+    except Exception as e:
+        conn.rollback()
+        print(f"[recommendation_job:{complex_id}] 실패: {e}")
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else TOP_K)
@@ -0,0 +1,74 @@
+# ==========================================
+# 포인트 대사 배치 (Points Reconciliation)
+# ==========================================
+# cron 등으로 하루 한 번(연체료 정산 뒤) 실행합니다.
+#   - Residents.points와 금고 보관액(Escrow_Holdings.amount)이 바뀔 때마다 트리거가 Points_Ledger에 증감을 남기고,
+#     이 배치가 DB 함수 reconcile_points()로 검증합니다.
+#       1) 주민별: 직전 잔액 스냅샷 + 그 이후 원장 증감 = 현재 잔액
+#       2) 트랜잭션별: 초기 지급을 제외한 증감 합계 = 0 (포인트는 주민과 금고 사이에서 옮겨지기만 함)
+#       3) 금고 대여 건별: 원장 누계 = 현재 보관액 (이번에 움직였거나 아직 보관 중인 건만)
+#   - 직전 스냅샷 이후 커밋된 원장 항목만 읽으므로 전체 대여 이력을 다시 합산하지 않습니다. (증분 대사)
+#   - REPEATABLE READ 트랜잭션 하나에서 잔액 스냅샷과 원장을 같은 시점으로 읽으므로, 서비스 중에 실행해도 됩니다.
+#   - 불일치는 Points_Discrepancies에 남기고 단지별로 출력합니다. (트랜잭션 불일치는 관련 대여 번호 포함)
+#   - 한 번의 호출이 샤드 안의 모든 단지를 처리하므로 샤드(Postgres 인스턴스)마다 한 번씩 실행합니다.
+#
+# 사용법: python reconcile_job.py
+import psycopg2
+
+import repository
+from app import COMPLEX_SHARDS, MANAGER_CONF, SHARDS, connect_complex, list_complexes, shard_conf
+
+def run():
+    issues = 0
+    for shard_name, shard in SHARDS.items():
+        snapshot, shard_issues = run_shard(shard_name, shard)
+        if shard_issues:
+            for complex_id, _ in list_complexes():
+                if COMPLEX_SHARDS.get(complex_id, 'default') == shard_name:
+                    print_discrepancies(complex_id, snapshot)
+        issues += shard_issues
+    return issues
+
+def run_shard(shard_name, shard):
+    conn = psycopg2.connect(**shard_conf(MANAGER_CONF, shard))
+    conn.set_session(isolation_level='REPEATABLE READ')
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT snapshot, entries_checked, resident_issues, transaction_issues, escrow_issues FROM reconcile_points()")
+        snapshot, entries_checked, resident_issues, transaction_issues, escrow_issues = cur.fetchone()
+
+        conn.commit()
+        print(f"[reconcile_job:{shard_name}] 스냅샷 #{snapshot}: 원장 {entries_checked}건 확인, "
+              f"잔액 불일치 {resident_issues}명, 트랜잭션 불일치 {transaction_issues}건, 금고 불일치 {escrow_issues}건")
+        return snapshot, resident_issues + transaction_issues + escrow_issues
+    except Exception as e:
+        conn.rollback()
+        print(f"[reconcile_job:{shard_name}] 실패: {e}")
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+def print_discrepancies(complex_id, snapshot):
+    # 불일치 행은 단지별로 격리되어 있으므로 단지에 접속해 조회
+    conn = connect_complex(MANAGER_CONF, complex_id)
+    cur = conn.cursor()
+    try:
+        for kind, resident_id, xid, rental_ids, expected, actual in repository.iter_rows(cur, """
+            SELECT kind, resident_id, xid, rental_ids, expected, actual
+            FROM Points_Discrepancies
+            WHERE snapshot_id = %s
+            ORDER BY discrepancy_id
+        """, (snapshot,)):
+            if kind == 'resident':
+                print(f"[reconcile_job:{complex_id}] 주민 #{resident_id}: 예상 {expected}P, 실제 {actual}P")
+            elif kind == 'escrow':
+                print(f"[reconcile_job:{complex_id}] 금고 대여 #{rental_ids[0]}: 원장 누계 {expected}P, 보관액 {actual}P")
+            else:
+                print(f"[reconcile_job:{complex_id}] 트랜잭션 {xid}: 증감 합계 {actual}P (대여 {rental_ids or '-'})")
+    finally:
+        cur.close()
+        conn.close()
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,240 @@
+# ==========================================
+# 데이터 접근 계층 (Repository)
+# ==========================================
+# - 행 모델은 튜플 기반 레코드(NamedTuple)입니다. 인스턴스에 __dict__가 없어(__slots__ = ()) 행 하나의 메모리는 일반 튜플과 같고,
+#   이름(item.rent_fee)과 기존 위치 인덱스(item[5]) 둘 다로 읽을 수 있어 화면을 조금씩 옮길 수 있습니다.
+# - SELECT * 대신 모델의 필드 목록으로 컬럼을 명시합니다. 테이블에 컬럼이 추가되어도 위치가 밀리지 않고,
+#   필요한 컬럼만 읽으려면 필드를 줄인 모델(예: ResidentLogin, OwnedItem)을 만들면 됩니다.
+# - 큰 결과는 fetchall()로 파이썬 튜플 목록을 한 번에 만들지 않고, iter_rows()로 ITER_BATCH 행씩 받아서 넘깁니다.
+#   일반 커서는 libpq가 결과 전체를 먼저 받아 두므로, iter_rows()는 이름 있는 커서(서버 측 DECLARE/FETCH)를 씁니다.
+#   (트랜잭션 안에서만 열 수 있고 커서를 닫기 전에 다 읽어야 하므로, 템플릿으로 넘길 목록이나 한 페이지짜리 결과는 fetch_all()을 사용)
+# - 여러 테이블을 조인한 화면 목록(대여/분쟁)도 행 모델로 받습니다. SELECT의 각 컬럼에 모델 필드 이름으로 별칭(AS)을 붙이고,
+#   fetch_one()/fetch_all()은 결과 컬럼 이름이 모델 필드와 순서까지 같은지 확인하므로 쿼리와 모델이 어긋나면 바로 오류가 납니다.
+import itertools
+from datetime import date
+from typing import NamedTuple, Optional
+
+ITER_BATCH = 500
+_cursor_ids = itertools.count(1)
+
+class ResidentLogin(NamedTuple):
+    """로그인에 필요한 컬럼만 (연락처/호수는 읽지 않음, 동은 카탈로그 캐시 키용)"""
+    resident_id: int
+    user_id: str
+    password: str
+    name: str
+    points: int
+    status: str
+    is_manager: bool
+    building: str
+
+class Item(NamedTuple):
+    item_id: int
+    owner_id: int
+    name: str
+    category: Optional[str]
+    description: Optional[str]
+    rent_fee: int
+    expiration_date: date
+    status: str
+    late_fee_per_day: Optional[int]
+    complex_id: int
+    cover_photo: Optional[str]
+
+class OwnedItem(NamedTuple):
+    """소유자 화면의 '내가 등록한 물건' 목록 (카테고리는 추천 대여료 표시용)"""
+    item_id: int
+    name: str
+    rent_fee: int
+    status: str
+    category: Optional[str]
+
+def columns(model, alias=None):
+    """모델 필드 순서대로 SELECT 컬럼 목록을 만듦 (alias가 있으면 'i.item_id, i.owner_id, ...')"""
+    prefix = f"{alias}." if alias else ""
+    return ", ".join(prefix + field for field in model._fields)
+
+def _check_columns(cur, model):
+    """결과 컬럼 이름이 모델 필드와 (순서까지) 같은지 확인"""
+    names = tuple(column.name for column in cur.description)
+    if names != model._fields:
+        raise ValueError(f"{model.__name__} 필드 {model._fields}와 조회 컬럼 {names}가 다릅니다.")
+
+def fetch_one(cur, model, query, params=None):
+    cur.execute(query, params)
+    _check_columns(cur, model)
+    row = cur.fetchone()
+    return model._make(row) if row is not None else None
+
+def fetch_all(cur, model, query, params=None):
+    cur.execute(query, params)
+    _check_columns(cur, model)
+    return [model._make(row) for row in cur.fetchall()]
+
+def iter_rows(cur, query, params=None, size=ITER_BATCH):
+    """cur와 같은 연결에 이름 있는 커서를 열어 결과를 서버에서 size 행씩 받아 튜플로 하나씩 넘김"""
+    with cur.connection.cursor(f"iter_rows_{next(_cursor_ids)}", cursor_factory=type(cur)) as named:
+        named.execute(query, params)
+        while True:
+            rows = named.fetchmany(size)
+            yield from rows
+            if len(rows) < size: # 덜 찼으면 마지막 묶음 (빈 FETCH를 한 번 더 보내지 않음)
+                return
+
+# ==========================================
+# 대여 목록 (대시보드/이력 화면용 조인 결과)
+# ==========================================
+class RentalRequest(NamedTuple):
+    """소유자에게 들어온 대여 신청 (신청자 평판 포함)"""
+    rental_id: int
+    item_name: str
+    borrower_name: str
+    start_date: date
+    end_date: date
+    status: str
+    item_id: int
+    borrower_score: float
+    borrower_rating_count: int
+    borrower_dispute_count: int
+    borrower_rental_count: int
+
+class ArrivedReturn(NamedTuple):
+    """소유자의 반납 확인 대기 (배송 기사 연락처 포함, 직접 반납이면 None)"""
+    rental_id: int
+    item_name: str
+    borrower_name: str
+    partner_name: Optional[str]
+    partner_phone: Optional[str]
+
+class ActiveRental(NamedTuple):
+    """대여자의 진행 중인 대여"""
+    rental_id: int
+    item_name: str
+    owner_name: str
+    start_date: date
+    end_date: date
+    status: str
+    delivery_status: Optional[str]
+    partner_name: Optional[str]
+    partner_phone: Optional[str]
+    late_fee_accrued: Optional[int]
+    partner_score: float
+    can_rate_partner: bool
+
+class DeliveryCall(NamedTuple):
+    """배송 콜 대기 목록 (출발/도착은 배송 방향 기준, 대여자 평판 포함)"""
+    rental_id: int
+    item_name: str
+    delivery_fee: int
+    start_building: str
+    start_unit: str
+    end_building: str
+    end_unit: str
+    status: str
+    borrower_score: float
+    borrower_rating_count: int
+
+class MyDelivery(NamedTuple):
+    """기사가 맡은 진행 중인 배송 (출발지/도착지 연락처 포함)"""
+    rental_id: int
+    item_name: str
+    delivery_fee: int
+    start_building: str
+    start_unit: str
+    end_building: str
+    end_unit: str
+    delivery_status: str
+    status: str
+    start_phone: str
+    end_phone: str
+
+class OwnerRentalLog(NamedTuple):
+    """소유자의 지난 대여 이력 (아직 안 한 평가 여부 포함)"""
+    rental_id: int
+    item_name: str
+    borrower_name: str
+    start_date: date
+    end_date: date
+    status: str
+    total_income: int
+    can_rate_borrower: bool
+    can_rate_partner: bool
+
+class BorrowerRentalLog(NamedTuple):
+    rental_id: int
+    item_name: str
+    owner_name: str
+    start_date: date
+    end_date: date
+    status: str
+    delivery_status: Optional[str]
+    late_fee_accrued: int
+
+class DeliveryLog(NamedTuple):
+    """기사의 완료한 배송 이력"""
+    rental_id: int
+    item_name: str
+    delivery_fee: int
+    start_building: str
+    start_unit: str
+    end_building: str
+    end_unit: str
+    status: str
+
+# ==========================================
+# 분쟁 목록
+# ==========================================
+class OwnerDispute(NamedTuple):
+    """소유자의 진행 중인 분쟁 (대여 ID 기준)"""
+    rental_id: int
+    item_name: str
+    borrower_name: str
+    status: str
+    resolution: Optional[str]
+    dispute_id: int
+
+class OpenDispute(NamedTuple):
+    """관리자의 판결 대기 분쟁 (당사자는 로그인 ID)"""
+    dispute_id: int
+    rental_id: int
+    reason: str
+    owner_user_id: str
+    borrower_user_id: str
+    item_name: str
+    item_id: int
+
+class OwnerDisputeLog(NamedTuple):
+    dispute_id: int
+    item_name: str
+    borrower_name: str
+    reason: str
+    resolution: Optional[str]
+    status: str
+    compensation_amount: Optional[int]
+    rental_id: int
+
+class BorrowerDisputeLog(NamedTuple):
+    dispute_id: int
+    item_name: str
+    owner_name: str
+    reason: str
+    resolution: Optional[str]
+    status: str
+    compensation_amount: Optional[int]
+
+# ==========================================
+# 테이블별 조회
+# ==========================================
+def find_resident_login(cur, user_id):
+    return fetch_one(cur, ResidentLogin, f"SELECT {columns(ResidentLogin)} FROM Residents WHERE user_id = %s", (user_id,))
+
+def get_item(cur, item_id):
+    return fetch_one(cur, Item, f"SELECT {columns(Item)} FROM Items WHERE item_id = %s", (item_id,))
+
+def owned_items(cur, owner_id):
+    """철회한 물건은 제외하고 최신 등록순"""
+    return fetch_all(cur, OwnedItem, f"""
+        SELECT {columns(OwnedItem)} FROM Items
+        WHERE owner_id = %s AND status != 'withdrawn'
+        ORDER BY item_id DESC
+    """, (owner_id,))
@@ -0,0 +1,280 @@
+# ==========================================
+# 쿼리 수 / 실행 계획 회귀 테스트 공용 설정
+# ==========================================
+# 테스트 세션마다 임시 Postgres 클러스터(initdb)를 띄우고 DB_Term_Project.sql + 시드 데이터를 적재한 뒤,
+# Flask 테스트 클라이언트로 라우트를 호출하면서 실행된 SQL 문장과 DB 왕복 횟수를 기록합니다.
+#   - Postgres 실행 파일은 PG_BIN 환경변수 -> pg_config --bindir -> PATH 순으로 찾고, 없으면 전체를 건너뜀
+#   - 클러스터는 유닉스 소켓으로만 열어 개발용 DB(5432)와 충돌하지 않고, 세션이 끝나면 지움
+#   - Postgres는 root로 실행할 수 없으므로 일반 계정으로 실행해야 함
+#
+# 사용법: python -m pytest -q tests
+import os
+import shutil
+import subprocess
+import sys
+from collections import namedtuple
+from datetime import date, timedelta
+
+import psycopg2
+import psycopg2.extensions
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEMA_SQL = os.path.join(ROOT, 'DB_Term_Project.sql')
+CONNECT_MARKER = "여기서부터는 'DB_Term_Project' 접속 후 실행"
+PASSWORD = 'pw'
+sys.path.insert(0, ROOT) # app.py, query_monitor.py
+
+def _pg_bin():
+    if os.environ.get('PG_BIN'):
+        return os.environ['PG_BIN']
+    try:
+        bindir = subprocess.run(['pg_config', '--bindir'], capture_output=True, text=True, check=True).stdout.strip()
+        if os.path.exists(os.path.join(bindir, 'initdb')):
+            return bindir
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    initdb = shutil.which('initdb')
+    return os.path.dirname(initdb) if initdb else None
+
+def _load_schema(psql, socket_dir):
+    """스크립트 앞부분(DB/역할 생성)은 postgres DB에서, 나머지는 새 DB에 접속해서 실행 (psql 한 번)"""
+    with open(SCHEMA_SQL, encoding='utf-8') as f:
+        lines = f.read().split('\n')
+    split = next(i for i, line in enumerate(lines) if CONNECT_MARKER in line)
+    script = '\n'.join(lines[:split + 1] + ['\\connect DB_Term_Project'] + lines[split + 1:])
+    subprocess.run([psql, '-q', '-X', '-h', socket_dir, '-U', 'postgres', '-d', 'postgres',
+                    '-v', 'ON_ERROR_STOP=1', '-f', '-'],
+                   input=script, text=True, check=True, capture_output=True)
+
+@pytest.fixture(scope='session')
+def pg_cluster(tmp_path_factory):
+    bindir = _pg_bin()
+    if bindir is None:
+        pytest.skip("Postgres 실행 파일(initdb, pg_ctl)을 찾을 수 없습니다. PG_BIN 환경변수를 지정하세요.")
+    if hasattr(os, 'geteuid') and os.geteuid() == 0:
+        pytest.skip("Postgres는 root로 실행할 수 없습니다. 일반 계정으로 테스트를 실행하세요.")
+
+    base = tmp_path_factory.mktemp('pg')
+    data_dir, socket_dir = str(base / 'data'), str(base)
+    subprocess.run([os.path.join(bindir, 'initdb'), '-D', data_dir, '-U', 'postgres', '-A', 'trust',
+                    '-E', 'UTF8', '--no-locale', '--no-sync'], check=True, capture_output=True)
+    subprocess.run([os.path.join(bindir, 'pg_ctl'), '-D', data_dir, '-w', '-l', str(base / 'server.log'),
+                    '-o', f"-k {socket_dir} -c listen_addresses='' -c fsync=off", 'start'],
+                   check=True, capture_output=True)
+    try:
+        _load_schema(os.path.join(bindir, 'psql'), socket_dir)
+        yield {'host': socket_dir, 'port': '5432'}
+    finally:
+        subprocess.run([os.path.join(bindir, 'pg_ctl'), '-D', data_dir, '-m', 'immediate', 'stop'],
+                       capture_output=True)
+
+def superuser_connect(pg_cluster, complex_id=None):
+    options = f"-c app.complex_id={complex_id}" if complex_id else ''
+    return psycopg2.connect(host=pg_cluster['host'], port=pg_cluster['port'], dbname='DB_Term_Project',
+                            user='postgres', options=options)
+
+# ==========================================
+# 시드 데이터
+# ==========================================
+# 목록 화면의 행 수를 넉넉히 만들어, 행마다 쿼리를 날리는(N+1) 변경이 예산을 바로 넘도록 합니다.
+SEED_ITEMS_PER_OWNER = 15
+SEED_RENTALS_PER_STATE = 4
+# 실행 계획이 운영 환경과 같아지도록 깔아 두는 배경 데이터 규모
+SEED_BULK_RESIDENTS = 300
+SEED_BULK_ITEMS = 3000
+SEED_BULK_RENTALS = 30000
+
+Seed = namedtuple('Seed', 'complex_id residents items requested approved_delivery rented returned dispute')
+
+def _seed(cur):
+    from werkzeug.security import generate_password_hash
+    pw_hash = generate_password_hash(PASSWORD, method='pbkdf2:sha256:1000') # 로그인 테스트가 느려지지 않도록 반복 횟수를 줄임
+
+    residents = {}
+    for user_id, name, building, is_manager in [('admin', '관리자', '101', True), ('alice', '앨리스', '101', False),
+                                                ('bob', '밥', '102', False), ('carol', '캐롤', '103', False)]:
+        cur.execute("""
+            INSERT INTO Residents (user_id, password, name, phone_number, building, unit, status, is_manager)
+            VALUES (%s, %s, %s, %s, %s, %s, 'approved', %s) RETURNING resident_id
+        """, (user_id, pw_hash, name, f'010-{len(residents):04d}-0000', building, '101', is_manager))
+        residents[user_id] = cur.fetchone()[0]
+    cur.execute("""
+        INSERT INTO Residents (user_id, password, name, phone_number, building, unit, status)
+        SELECT 'pending' || g, %s, '대기' || g, '010-9999-' || lpad(g::text, 4, '0'), '104', g::text, 'pending'
+        FROM generate_series(1, 5) g
+    """, (pw_hash,))
+
+    items = []
+    for owner in ('alice', 'bob'):
+        cur.execute("""
+            INSERT INTO Items (owner_id, name, category, description, rent_fee)
+            SELECT %s, %s || ' 물품 ' || g, '공구/수리', '시드 데이터', 100 + g
+            FROM generate_series(1, %s) g
+            RETURNING item_id
+        """, (residents[owner], owner, SEED_ITEMS_PER_OWNER))
+        items.extend(r[0] for r in cur.fetchall())
+    alice_items = items[:SEED_ITEMS_PER_OWNER]
+
+    # 앨리스의 물품을 밥이 빌린 대여 건들 (상태별로 SEED_RENTALS_PER_STATE건씩)
+    today = date.today()
+    def rentals(status, delivery_status, offset, start=today, end=today + timedelta(days=3)):
+        ids = []
+        for item_id in alice_items[offset:offset + SEED_RENTALS_PER_STATE]:
+            cur.execute("""
+                INSERT INTO Rentals (item_id, borrower_id, start_date, end_date, status, delivery_option, delivery_status)
+                VALUES (%s, %s, %s, %s, %s, 'delivery', %s) RETURNING rental_id
+            """, (item_id, residents['bob'], start, end, status, delivery_status))
+            ids.append(cur.fetchone()[0])
+        return ids
+
+    requested = rentals('requested', 'pending', 0)
+    approved_delivery = rentals('approved', 'waiting_driver', 4)
+    rented = rentals('rented', 'completed', 8)
+    returned = rentals('returned', 'completed', 0, today - timedelta(days=10), today - timedelta(days=7))
+
+    cur.execute("""
+        INSERT INTO Disputes (rental_id, rental_start_date, reason)
+        VALUES (%s, %s, '파손') RETURNING dispute_id
+    """, (returned[0], today - timedelta(days=10)))
+    dispute = cur.fetchone()[0]
+    cur.execute("UPDATE Rentals SET status = 'disputed' WHERE rental_id = %s", (returned[0],))
+
+    _seed_bulk(cur, pw_hash)
+    return Seed(1, residents, items, requested, approved_delivery, rented, returned[1:], dispute)
+
+def _seed_bulk(cur, pw_hash):
+    """실행 계획 테스트용 배경 데이터: 운영 단지와 비슷하게 대부분 종료된 대여 + 소수의 진행 중 대여"""
+    cur.execute("""
+        INSERT INTO Residents (user_id, password, name, phone_number, building, unit, status)
+        SELECT 'user' || g, %s, '주민' || g, '010-5' || lpad(g::text, 3, '0') || '-0000',
+               (101 + g %% 10)::text, g::text, 'approved'
+        FROM generate_series(1, %s) g
+    """, (pw_hash, SEED_BULK_RESIDENTS))
+    cur.execute("""
+        INSERT INTO Items (owner_id, name, category, description, rent_fee, status)
+        SELECT r.resident_id, '물품 ' || g, '주방/생활', '배경 데이터', 100,
+               CASE WHEN g %% 10 = 0 THEN 'withdrawn' ELSE 'available' END
+        FROM generate_series(1, %s) g
+        JOIN Residents r ON r.user_id = 'user' || (1 + g %% %s)
+    """, (SEED_BULK_ITEMS, SEED_BULK_RESIDENTS))
+    cur.execute("""
+        INSERT INTO Rentals (item_id, borrower_id, start_date, end_date, status, delivery_option, delivery_status)
+        SELECT i.item_id, b.resident_id, CURRENT_DATE - (g %% 300), CURRENT_DATE - (g %% 300) + 3,
+               CASE WHEN g %% 50 = 0 THEN 'rented' WHEN g %% 10 = 0 THEN 'rejected' ELSE 'returned' END,
+               'pickup', 'completed'
+        FROM generate_series(1, %s) g
+        JOIN Items i ON i.name = '물품 ' || (1 + g %% %s)
+        JOIN Residents b ON b.user_id = 'user' || (1 + (g * 7) %% %s)
+    """, (SEED_BULK_RENTALS, SEED_BULK_ITEMS, SEED_BULK_RESIDENTS))
+    cur.execute("""
+        INSERT INTO Disputes (rental_id, rental_start_date, reason, status)
+        SELECT rental_id, start_date, '배경 분쟁', 'resolved'
+        FROM Rentals WHERE status = 'returned' AND rental_id % 20 = 0
+    """)
+
+@pytest.fixture(scope='session')
+def seed(pg_cluster):
+    conn = superuser_connect(pg_cluster, complex_id=1)
+    try:
+        with conn.cursor() as cur:
+            data = _seed(cur)
+            cur.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+    return data
+
+# ==========================================
+# 앱 & 쿼리 기록
+# ==========================================
+@pytest.fixture(scope='session')
+def flask_app(pg_cluster, seed, tmp_path_factory):
+    # app.py는 import 시점에 환경변수로 접속 정보를 읽으므로 import 전에 임시 클러스터를 지정
+    os.environ.update(DB_HOST=pg_cluster['host'], DB_PORT=pg_cluster['port'],
+                      MEDIA_ROOT=str(tmp_path_factory.mktemp('media')))
+    os.environ.pop('DB_REPLICA_DSN', None)
+    import app as app_module
+    import query_monitor
+
+    query_monitor.SETTINGS['log_path'] = str(tmp_path_factory.mktemp('logs') / 'slow_query.log')
+    query_monitor.SETTINGS['plan_sample_rate'] = 0 # 실행 계획 수집용 추가 문장이 개수에 섞이지 않도록
+    app_module.app.config['TESTING'] = True
+    # 운영 서버와 같은 상태(템플릿 컴파일, 참조 데이터 캐시, 연결 예열)에서 측정
+    app_module.warm_up()
+    yield app_module
+    app_module.catalog_index.stop()
+    app_module.close_pool()
+
+Statement = namedtuple('Statement', 'query sql dsn')
+
+class QueryLog:
+    """요청 하나에서 실행된 SQL 문장과 DB 왕복(문장 + 커밋/롤백 + 새 접속) 기록"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.statements = []
+        self.transactions = 0
+        self.connects = 0
+
+    @property
+    def round_trips(self):
+        return len(self.statements) + self.transactions + self.connects
+
+    def find(self, fragment):
+        """쿼리 본문에 fragment가 들어 있는 문장 (정확히 한 개여야 함)"""
+        matches = [s for s in self.statements if fragment in s.query]
+        assert len(matches) == 1, f"'{fragment}'와 일치하는 문장이 {len(matches)}개: {[s.query[:80] for s in matches]}"
+        return matches[0]
+
+    def summary(self):
+        return '\n'.join(f"  {s.query[:120]}" for s in self.statements)
+
+@pytest.fixture
+def query_log(flask_app, monkeypatch):
+    import query_monitor
+    log = QueryLog()
+
+    execute = query_monitor.TimedCursor.execute
+    def logged_execute(cur, query, vars=None):
+        log.statements.append(Statement(query_monitor.normalize_query(query), cur.mogrify(query, vars).decode('utf-8'),
+                                        cur.connection.get_dsn_parameters()))
+        return execute(cur, query, vars)
+    monkeypatch.setattr(query_monitor.TimedCursor, 'execute', logged_execute)
+
+    # 열린 트랜잭션이 있을 때만 COMMIT/ROLLBACK이 실제로 전송됨
+    for name in ('commit', 'rollback'):
+        original = getattr(flask_app.PooledConnection, name)
+        def counted(conn, _original=original):
+            if conn.status != psycopg2.extensions.STATUS_READY:
+                log.transactions += 1
+            return _original(conn)
+        monkeypatch.setattr(flask_app.PooledConnection, name, counted)
+
+    connect = psycopg2.connect
+    def counted_connect(*args, **kwargs):
+        log.connects += 1
+        return connect(*args, **kwargs)
+    monkeypatch.setattr(psycopg2, 'connect', counted_connect)
+    return log
+
+@pytest.fixture
+def login(flask_app):
+    def _login(user_id, complex_id=1):
+        client = flask_app.app.test_client()
+        response = client.post('/login', data={'user_id': user_id, 'password': PASSWORD, 'complex_id': complex_id})
+        assert response.status_code == 302, response.data
+        return client
+    return _login
+
+@pytest.fixture
+def measure(query_log):
+    """클라이언트로 요청을 보내고 그 요청에서 실행된 쿼리만 담긴 QueryLog를 반환"""
+    def _measure(client, method, url, **kwargs):
+        query_log.reset()
+        response = getattr(client, method)(url, **kwargs)
+        assert response.status_code < 500, response.data[-2000:]
+        return response, query_log
+    return _measure
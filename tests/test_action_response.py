@@ -0,0 +1,80 @@
+# ==========================================
+# 대시보드 부분 갱신(fetch) 응답의 ok 값
+# ==========================================
+# 대시보드는 ok일 때만 행을 지우므로, 'warning'으로 안내하는 실패도 ok=false여야 하고 경고색 성공(거절)은 ok=true여야 합니다.
+from conftest import superuser_connect
+
+JSON = {'Accept': 'application/json'}
+
+def alice_item(pg_cluster, seed, status, borrower=None):
+    """앨리스의 새 물품 ID (borrower를 주면 그 주민의 대여 신청을 하나 만들고 신청 ID를 돌려줌)"""
+    conn = superuser_connect(pg_cluster, complex_id=seed.complex_id)
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO Items (owner_id, name, category, description, rent_fee, status)
+            VALUES (%s, '응답 확인 물품', '공구/수리', '-', 100, %s) RETURNING item_id
+        """, (seed.residents['alice'], status))
+        new_id = cur.fetchone()[0]
+        if borrower:
+            cur.execute("""
+                INSERT INTO Rentals (item_id, borrower_id, start_date, end_date, status, delivery_option, delivery_status)
+                VALUES (%s, %s, CURRENT_DATE, CURRENT_DATE + 2, 'requested', 'pickup', 'pending') RETURNING rental_id
+            """, (new_id, seed.residents[borrower]))
+            new_id = cur.fetchone()[0]
+        conn.commit()
+        return new_id
+    finally:
+        conn.close()
+
+def test_withdrawing_rented_item_is_not_ok(login, pg_cluster, seed):
+    item_id = alice_item(pg_cluster, seed, 'rented')
+    response = login('alice').get(f'/withdraw_item/{item_id}', headers=JSON)
+    assert response.json['ok'] is False
+    assert [m['category'] for m in response.json['messages']] == ['warning']
+
+def test_closing_unresolved_dispute_is_not_ok(login, seed):
+    response = login('alice').get(f'/close_dispute/{seed.dispute}', headers=JSON)
+    assert response.json['ok'] is False
+
+def test_rejecting_request_is_ok(login, pg_cluster, seed):
+    rental_id = alice_item(pg_cluster, seed, 'available', borrower='bob')
+    response = login('alice').get(f'/reject_rental/{rental_id}', headers=JSON)
+    assert response.json['ok'] is True
+    assert response.json['rental']['status'] == 'rejected'
+
+def test_banned_driver_returns_connection_to_pool(flask_app, login, pg_cluster, seed):
+    conn = superuser_connect(pg_cluster, complex_id=seed.complex_id)
+    try:
+        cur = conn.cursor()
+        cur.execute("UPDATE Residents SET is_delivery_banned = TRUE WHERE user_id = 'user40'")
+        conn.commit()
+    finally:
+        conn.close()
+
+    client = login('user40')
+    idle = lambda: sum(len(conns) for conns in flask_app._pool.values())
+    before = idle()
+    response = client.get(f'/accept_delivery/{seed.approved_delivery[2]}', headers=JSON)
+    assert response.json['ok'] is False
+    assert idle() == before # 정지 안내 후에도 꺼낸 연결이 풀로 돌아옴
+
+def test_second_driver_cannot_take_accepted_delivery(login, pg_cluster, seed):
+    rental_id = seed.approved_delivery[3]
+    assert login('carol').get(f'/accept_delivery/{rental_id}', headers=JSON).json['ok'] is True
+    response = login('user41').get(f'/accept_delivery/{rental_id}', headers=JSON)
+    assert response.json['ok'] is False
+
+    conn = superuser_connect(pg_cluster, complex_id=seed.complex_id)
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT delivery_partner_id FROM Rentals WHERE rental_id = %s", (rental_id,))
+        assert cur.fetchone()[0] == seed.residents['carol']
+        # 배정 알림은 첫 수락에서만 (소유자/대여자에게 한 번씩)
+        cur.execute("""
+            SELECT count(*) FROM Notification_Outbox
+            WHERE event_type = 'driver_assigned' AND (payload->>'rental_id')::int = %s
+        """, (rental_id,))
+        assert cur.fetchone()[0] == 2
+    finally:
+        conn.close()
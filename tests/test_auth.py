@@ -0,0 +1,15 @@
+# ==========================================
+# 로그인 / 가입 (단지 선택 값 검증)
+# ==========================================
+# 비로그인 진입점이므로 단지 값이 비었거나 조작되어도 500이 아니라 폼을 다시 보여줘야 합니다.
+import pytest
+
+@pytest.mark.parametrize('complex_id', ['', 'abc', '-1', '99999'])
+def test_invalid_complex_rerenders_form(flask_app, complex_id):
+    client = flask_app.app.test_client()
+    response = client.post('/login', data={'user_id': 'alice', 'password': 'pw', 'complex_id': complex_id})
+    assert response.status_code == 200 and '단지를 다시 선택' in response.get_data(as_text=True)
+
+    response = client.post('/signup', data={'user_id': 'newbie', 'password': 'pw', 'name': '새 주민', 'phone': '010-0000-9999',
+                                            'building': '101', 'unit': '101', 'complex_id': complex_id})
+    assert response.status_code == 200 and '단지를 다시 선택' in response.get_data(as_text=True)
@@ -0,0 +1,92 @@
+# ==========================================
+# 검색 자동완성 (워커 메모리의 접두어 색인)
+# ==========================================
+# 자동완성 요청은 DB에 접속하지 않아야 하고, 물품이 바뀌면 트리거 알림(NOTIFY)으로 색인이 따라와야 합니다.
+import heapq
+import random
+import time
+
+import catalog_index
+from conftest import superuser_connect
+
+def suggestions(client, q):
+    response = client.get('/autocomplete', query_string={'q': q})
+    assert response.status_code == 200
+    return [(s['kind'], s['label']) for s in response.json['suggestions']]
+
+def wait_for(predicate, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+def test_autocomplete_runs_no_queries(login, measure, seed):
+    client = login('carol')
+    response, log = measure(client, 'get', '/autocomplete?q=공')
+
+    assert ('category', '공구/수리') in [(s['kind'], s['label']) for s in response.json['suggestions']]
+    assert len(log.statements) == 0 and log.connects == 0, log.summary()
+
+def test_autocomplete_follows_item_changes(login, seed, pg_cluster):
+    client = login('carol')
+    conn = superuser_connect(pg_cluster, complex_id=seed.complex_id)
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO Items (owner_id, name, category, description, rent_fee)
+            VALUES (%s, '캠핑 텐트 대형', '캠핑/레저', '자동완성 테스트', 100)
+            RETURNING item_id
+        """, (seed.residents['alice'],))
+        item_id = cur.fetchone()[0]
+        conn.commit()
+
+        # 음절 중간(캠ㅍ), 초성(ㅋㅍ), 띄어쓰기 뒤 단어(텐) 모두 같은 물품을 찾음
+        for q in ('캠ㅍ', 'ㅋㅍ', '텐'):
+            assert wait_for(lambda: ('item', '캠핑 텐트 대형') in suggestions(client, q)), q
+
+        cur.execute("UPDATE Items SET status = 'withdrawn' WHERE item_id = %s", (item_id,))
+        conn.commit()
+        assert wait_for(lambda: ('item', '캠핑 텐트 대형') not in suggestions(client, '텐'))
+
+        cur.execute("DELETE FROM Items WHERE item_id = %s", (item_id,))
+        conn.commit()
+    finally:
+        conn.close()
+
+def test_suggest_ranks_all_prefix_matches():
+    index = catalog_index.PrefixIndex()
+    # 키 순서로 앞서는 물품(가, 나)이 limit을 채워도, 뒤에 있는 개수 많은 물품(하)이 순위에 들어야 함
+    for i, name in enumerate(['공구 가', '공구 나']):
+        index.put_item(i, name)
+    for i in range(10, 15):
+        index.put_item(i, '공구 하')
+    assert [s['label'] for s in index.suggest('공구', 2)] == ['공구 하', '공구 가']
+
+def test_short_prefixes_answer_from_precomputed_top_on_large_catalog():
+    # 운영 단지 규모(물품 2만 개)에서 자모 하나짜리 입력도 미리 계산한 상위 후보만 읽어 1ms 안에 답하고,
+    # 알림으로 물품이 바뀐 뒤에도 전체를 훑어 순위를 매긴 결과와 같아야 함
+    rng = random.Random(7)
+    words = ['공구', '드릴', '캠핑', '의자', '텐트', '가방', '노트북', '거치대', '유모차', '카메라', '삼각대', '전동', '미니',
+             '접이식', '대형', '소형', '고급', 'led', '무선', '충전기']
+    name = lambda: ' '.join(rng.sample(words, rng.randint(1, 3)))
+    index = catalog_index.PrefixIndex.build(['공구/수리', '캠핑/레저', '가전/디지털'], [(i, name()) for i in range(20000)])
+    for i in range(500): # 알림으로 들어오는 등록/대여(목록에서 빠짐)
+        if rng.random() < 0.5:
+            index.put_item(rng.randrange(21000), name())
+        else:
+            index.remove_item(rng.randrange(21000))
+
+    def full_scan(q):
+        prefix = catalog_index.jamo(q)
+        found = {entry[1:] for entry in index._keys if entry[0].startswith(prefix)}
+        return heapq.nsmallest(8, found, key=index._rank)
+
+    for q in ('ㄱ', 'ㄷ', '카', 'ㅋㅁ', '캠', 'l', '접이식 '):
+        assert [(s['kind'], s['label']) for s in index.suggest(q, 8)] == full_scan(q), q
+
+    started = time.perf_counter()
+    for _ in range(100):
+        index.suggest('ㄱ', 8)
+    assert (time.perf_counter() - started) / 100 < 0.001
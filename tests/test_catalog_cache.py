@@ -0,0 +1,65 @@
+# ==========================================
+# 카탈로그 조회 결과 캐시 (워커 메모리의 LRU)
+# ==========================================
+# 같은 조건으로 다시 열면 카탈로그 문장을 실행하지 않아야 하고, 물품 등록/철회 직후에는 바로 새 결과가 보여야 합니다.
+import catalog_cache
+from conftest import superuser_connect
+
+CATALOG_FRAGMENT = "counts AS ("
+
+def catalog_statements(log):
+    return [s for s in log.statements if CATALOG_FRAGMENT in s.query]
+
+def test_repeat_view_is_served_from_cache(flask_app, login, measure, seed):
+    client = login('carol')
+    flask_app.catalog_cache.clear()
+    _, log = measure(client, 'get', '/?tab=home&keyword=드릴')
+    assert len(catalog_statements(log)) == 1, log.summary()
+
+    before = flask_app.catalog_cache.stats()['hits']
+    _, log = measure(client, 'get', '/?tab=borrower&keyword=  드릴 ') # 탭/공백이 달라도 같은 결과
+    assert catalog_statements(log) == [], log.summary()
+    assert flask_app.catalog_cache.stats()['hits'] == before + 1
+
+def test_register_and_withdraw_invalidate(flask_app, login, measure, seed, pg_cluster):
+    client = login('alice')
+    url = '/?tab=home&keyword=캐시 테스트 물품'
+    flask_app.catalog_cache.clear()
+    measure(client, 'get', url)
+
+    client.post('/register_item', data={'name': '캐시 테스트 물품', 'category': '공구/수리', 'description': '-',
+                                        'rent_fee': '100', 'expiration_date': '2999-12-31'})
+    conn = superuser_connect(pg_cluster, complex_id=seed.complex_id)
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT item_id FROM Items WHERE name = '캐시 테스트 물품'")
+        item_id = cur.fetchone()[0]
+    finally:
+        conn.close()
+
+    response, log = measure(client, 'get', url)
+    assert len(catalog_statements(log)) == 1 and f'/rent/{item_id}'.encode() in response.data, log.summary()
+
+    client.get(f'/withdraw_item/{item_id}')
+    response, log = measure(client, 'get', url)
+    assert len(catalog_statements(log)) == 1 and f'/rent/{item_id}'.encode() not in response.data, log.summary()
+
+def test_lru_bounds():
+    cache = catalog_cache
+    cache.clear()
+    saved = dict(cache.SETTINGS)
+    try:
+        cache.SETTINGS['max_entries'] = 2
+        for page in (1, 2, 3):
+            key = cache.make_key(99, '101', '', '', 'latest', page)
+            cache.put(key, ([], [], False), cache.generation(99))
+        assert cache.get(cache.make_key(99, '101', '', '', 'latest', 1)) is None # 가장 오래된 항목부터 밀려남
+        assert cache.get(cache.make_key(99, '101', '', '', 'latest', 3)) is not None
+
+        generation = cache.generation(99)
+        cache.invalidate(99)
+        cache.put(cache.make_key(99, '101', '', '', 'latest', 1), ([], [], False), generation) # 무효화 전에 읽은 결과
+        assert cache.stats()['entries'] == 0
+    finally:
+        cache.SETTINGS.update(saved)
+        cache.clear()
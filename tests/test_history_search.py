@@ -0,0 +1,56 @@
+# ==========================================
+# 이력 검색 (/history/<종류>, 서버에서 한 페이지씩)
+# ==========================================
+# 배경 데이터의 주민(user1)은 물품마다 수십 건의 지난 대여가 있으므로, 검색/페이지 넘김이 서버에서 제한된 행만 보내는지 확인합니다.
+import re
+
+def history(client, kind, **params):
+    response = client.get(f'/history/{kind}', query_string=params)
+    assert response.status_code == 200, response.data[:200]
+    return response.json['html'], response.json['next']
+
+def row_count(html):
+    return html.count('<tr')
+
+def test_pages_are_bounded_and_keyset_ordered(flask_app, login, measure):
+    client = login('user1')
+    html, first = history(client, 'owner')
+    assert row_count(html) == flask_app.HISTORY_PAGE_SIZE and first is not None
+
+    response, log = measure(client, 'get', f'/history/owner?before={first}')
+    assert 0 < row_count(response.json['html']) <= flask_app.HISTORY_PAGE_SIZE
+    assert len(log.statements) == 1, log.summary()
+
+def test_filters_status_and_date_range(login):
+    html, _ = history(login('alice'), 'owner', status='disputed')
+    assert row_count(html) == 1 and 'bg-danger">분쟁' in html
+
+    client = login('user1')
+    html, _ = history(client, 'owner')
+    day = re.search(r'(\d{4}-\d{2}-\d{2})<br>', html).group(1) # 대여 시작일
+    html, _ = history(client, 'owner', **{'from': day, 'to': day})
+    starts = re.findall(r'(\d{4}-\d{2}-\d{2})<br>', html)
+    assert starts and set(starts) == {day}
+
+def test_keyword_matches_item_or_counterparty(login):
+    client = login('bob')
+    html, _ = history(client, 'borrower', q='앨리스') # 소유자 이름
+    assert row_count(html) > 0 and 'alice 물품' in html
+    html, _ = history(client, 'borrower', q='없는 물품 이름')
+    assert '지난 기록이 없습니다' in html
+
+def test_unknown_kind(login):
+    assert login('bob').get('/history/everything').status_code == 404
+
+def test_admin_resident_history_is_paged(flask_app, login):
+    # 관리자 탭의 주민 처리 이력도 단지 전체가 아니라 resident_id 키셋으로 한 페이지씩
+    client = login('admin')
+    html = client.get('/?tab=admin').get_data(as_text=True)
+    ids = [int(i) for i in re.findall(r'/toggle_delivery_ban/(\d+)', html)]
+    assert len(ids) == flask_app.HISTORY_PAGE_SIZE and ids == sorted(ids, reverse=True)
+    before = int(re.search(r'before=(\d+)', html).group(1))
+    assert before == ids[-1]
+
+    html = client.get('/', query_string={'tab': 'admin', 'before': before}).get_data(as_text=True)
+    next_ids = [int(i) for i in re.findall(r'/toggle_delivery_ban/(\d+)', html)]
+    assert next_ids and max(next_ids) < before
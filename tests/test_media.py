@@ -0,0 +1,85 @@
+# ==========================================
+# 사진 첨부 (분쟁 증거 연결, 단지별 제공)
+# ==========================================
+# 증거 사진은 새로 등록된 분쟁에 연결되어야 하고, 사진 URL은 같은 단지의 첨부일 때만 열려야 합니다.
+import hashlib
+import io
+import re
+from datetime import date, timedelta
+
+from conftest import superuser_connect
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 64
+
+def photo(data=PNG):
+    return (io.BytesIO(data), 'evidence.png')
+
+def test_dispute_evidence_is_attached_to_the_new_dispute(flask_app, login, pg_cluster, seed):
+    conn = superuser_connect(pg_cluster, complex_id=seed.complex_id)
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT resident_id FROM Residents WHERE user_id IN ('user21', 'user22') ORDER BY user_id")
+        owner, borrower = (r[0] for r in cur.fetchall())
+        cur.execute("""
+            INSERT INTO Items (owner_id, name, category, description, rent_fee, status)
+            VALUES (%s, '증거 사진 물품', '공구/수리', '-', 100, 'rented') RETURNING item_id
+        """, (owner,))
+        cur.execute("""
+            INSERT INTO Rentals (item_id, borrower_id, start_date, end_date, status, delivery_option, delivery_status)
+            VALUES (%s, %s, %s, %s, 'rented', 'pickup', 'completed') RETURNING rental_id
+        """, (cur.fetchone()[0], borrower, date.today(), date.today() + timedelta(days=3)))
+        rental_id = cur.fetchone()[0]
+        conn.commit()
+
+        response = login('user21').post(f'/report_dispute/{rental_id}', data={'reason': '파손', 'evidence': photo()},
+                                        content_type='multipart/form-data')
+        assert response.status_code == 302
+
+        cur.execute("""
+            SELECT a.sha256 FROM Disputes d JOIN Attachments a ON a.dispute_id = d.dispute_id
+            WHERE d.rental_id = %s
+        """, (rental_id,))
+        assert cur.fetchall() == [(hashlib.sha256(PNG).hexdigest(),)]
+    finally:
+        conn.close()
+
+def test_media_is_served_only_within_the_complex(flask_app, login, measure, pg_cluster, seed):
+    image = PNG + b'cross-complex'
+    sha256 = hashlib.sha256(image).hexdigest()
+    alice = login('alice')
+    alice.post('/register_item', data={'name': '사진 물품', 'category': '공구/수리', 'description': '-', 'rent_fee': '100',
+                                       'expiration_date': '2999-12-31', 'photos': photo(image)},
+               content_type='multipart/form-data')
+    conn = superuser_connect(pg_cluster, complex_id=seed.complex_id)
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT item_id FROM Attachments WHERE sha256 = %s", (sha256,))
+        item_id = cur.fetchone()[0]
+    finally:
+        conn.close()
+
+    # 같은 단지 주민은 화면이 만든(서명된) URL로 받고, 사진 요청은 DB에 문장을 보내지 않음
+    carol = login('carol')
+    page = carol.get(f'/rent/{item_id}').get_data(as_text=True)
+    url = re.search(rf'/media/original/{sha256}\?s=\w+', page).group(0)
+    response, log = measure(carol, 'get', url)
+    assert response.status_code == 200
+    assert len(log.statements) == 0 and log.connects == 0, log.summary()
+    assert carol.get(f'/media/original/{sha256}').status_code == 404 # 서명 없는 URL
+
+    # 다른 단지의 주민은 해시와 URL을 알아도 받을 수 없음
+    conn = superuser_connect(pg_cluster, complex_id=2)
+    try:
+        cur = conn.cursor()
+        cur.execute("INSERT INTO Complexes (complex_id, name) VALUES (2, '다른 단지') ON CONFLICT DO NOTHING")
+        cur.execute("""
+            INSERT INTO Residents (user_id, password, name, phone_number, building, unit, status, complex_id)
+            SELECT 'mallory', password, '말로리', '010-2222-0000', '201', '101', 'approved', 2
+            FROM Residents WHERE user_id = 'alice' AND complex_id = 1
+            ON CONFLICT DO NOTHING
+        """)
+        conn.commit()
+    finally:
+        conn.close()
+    flask_app._reference_cache.pop('complexes', None) # 새 단지는 단지 목록을 다시 읽어야 로그인 화면에서 고를 수 있음
+    assert login('mallory', complex_id=2).get(url).status_code == 404
@@ -0,0 +1,31 @@
+# ==========================================
+# 월별 파티션 관리 (ensure_rental_partitions)
+# ==========================================
+# 시드의 배경 대여는 300일 전까지 퍼져 있어 올해 이전 월의 행이 기본 파티션에 들어갑니다.
+# 파티션 생성이 그 행들을 월 파티션으로 옮기는지 확인하고, 다른 테스트의 실행 계획이 바뀌지 않도록 되돌립니다.
+from conftest import superuser_connect
+
+def counts(cur):
+    cur.execute("""
+        SELECT (SELECT count(*) FROM Rentals), (SELECT count(*) FROM Disputes),
+               (SELECT count(*) FROM rentals_default), (SELECT count(*) FROM disputes_default)
+    """)
+    return cur.fetchone()
+
+def test_default_partition_rows_are_moved_into_month_partitions(pg_cluster, seed):
+    conn = superuser_connect(pg_cluster)
+    try:
+        cur = conn.cursor()
+        rentals, disputes, default_rentals, default_disputes = counts(cur)
+        assert default_rentals > 0 and default_disputes > 0 # 전제: 기본 파티션에 행이 있음
+
+        cur.execute("SELECT ensure_rental_partitions(CURRENT_DATE, 3)")
+        assert cur.fetchone()[0] > 0
+        assert counts(cur) == (rentals, disputes, 0, 0)
+
+        # 옮긴 월은 이미 있으므로 다시 실행해도 만들 것이 없음 (archive_job이 매일 실행해도 멈추지 않음)
+        cur.execute("SELECT ensure_rental_partitions(CURRENT_DATE, 3)")
+        assert cur.fetchone()[0] == 0
+    finally:
+        conn.rollback()
+        conn.close()
@@ -0,0 +1,29 @@
+# ==========================================
+# 수요 예측 & 추천 대여료 (pricing_job 계산부)
+# ==========================================
+# DB 없이 합성 대여 이력으로 계산부만 확인합니다: 수요가 몰리는 카테고리는 중앙값보다 비싸게, 한산한 카테고리는 싸게 추천.
+import numpy as np
+
+import pricing_job
+
+def synthetic_rentals(weekly_days, fee, category, weeks):
+    """주마다 weekly_days일짜리 대여 1건씩 (카테고리 번호, 몇 주 전, 대여일, 1일 대여료)"""
+    return np.array([(category, w, weekly_days, fee) for w in range(1, weeks + 1)], dtype=np.int64)
+
+def test_busy_category_is_priced_up_and_idle_category_down():
+    weeks = pricing_job.HISTORY_WEEKS
+    rentals = np.concatenate([synthetic_rentals(7, 100, 0, weeks),   # 물품 1개가 매주 꽉 참
+                              synthetic_rentals(1, 100, 1, weeks)])  # 물품 1개가 매주 하루만 대여
+    listings = np.array([(0, 100), (1, 100)], dtype=np.int64)
+
+    cat, suggested, utilization, forecast, samples = pricing_job.suggest_prices(rentals, listings, 3)
+
+    assert list(cat) == [0, 1] # 대여도 등록 물품도 없는 카테고리(2)는 추천하지 않음
+    assert np.allclose(forecast, [7, 1]) and np.allclose(utilization, [1.0, 1 / 7], atol=1e-6)
+    assert suggested[0] > 100 > suggested[1]
+    assert all(fee % pricing_job.FEE_STEP == 0 for fee in suggested)
+    assert list(samples) == [weeks] * 2
+
+def test_forecast_follows_trend():
+    rising = np.arange(1, 21, dtype=np.float64)[None, :]
+    assert pricing_job.holt_forecast(rising)[0] > 20
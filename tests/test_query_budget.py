@@ -0,0 +1,60 @@
+# ==========================================
+# 라우트별 SQL 문장 수 / DB 왕복 수 예산
+# ==========================================
+# 예산을 넘으면 실패합니다. 시드 데이터의 목록은 행이 여러 개이므로, 행마다 쿼리를 추가하는(N+1) 변경은 바로 걸립니다.
+# 쿼리를 의도적으로 줄이거나 늘렸다면 아래 표의 숫자를 함께 고칩니다. (실패 메시지에 실행된 문장 목록이 나옴)
+#   - 문장: 앱이 커서로 실행한 SQL 수
+#   - 왕복: 문장 + 실제로 전송된 COMMIT/ROLLBACK + 풀에 없어서 새로 맺은 접속
+#   - 대시보드 탭은 워커 캐시(추천 대여료)가 비어 있을 때의 조회 1건을 포함
+import pytest
+
+# (사용자, 메서드, URL, 최대 문장 수, 최대 왕복 수) - URL의 {…}는 시드 데이터의 ID로 채움
+ROUTE_BUDGETS = [
+    ('alice', 'get', '/?tab=home', 19, 21),
+    ('alice', 'get', '/?tab=owner', 19, 21),
+    ('bob', 'get', '/?tab=borrower', 19, 21),
+    ('carol', 'get', '/?tab=delivery', 19, 21),
+    ('admin', 'get', '/?tab=admin', 25, 27),
+    ('carol', 'get', '/rent/{items[0]}', 4, 5),
+    ('bob', 'get', '/rental_timeline/{rented[0]}', 2, 3),
+    ('alice', 'get', '/approve_rental/{requested[0]}', 2, 4),
+    ('alice', 'get', '/reject_rental/{requested[1]}', 1, 2),
+    ('carol', 'get', '/accept_delivery/{approved_delivery[0]}', 3, 4),
+]
+
+@pytest.mark.parametrize('user_id, method, url, max_statements, max_round_trips', ROUTE_BUDGETS,
+                         ids=[f"{b[0]}:{b[2]}" for b in ROUTE_BUDGETS])
+def test_route_query_budget(login, measure, seed, user_id, method, url, max_statements, max_round_trips):
+    client = login(user_id)
+    response, log = measure(client, method, url.format(**seed._asdict()))
+
+    assert len(log.statements) <= max_statements, \
+        f"{url}: 문장 {len(log.statements)}개 (예산 {max_statements})\n{log.summary()}"
+    assert log.round_trips <= max_round_trips, \
+        f"{url}: 왕복 {log.round_trips}회 (예산 {max_round_trips}, 커밋/롤백 {log.transactions}, 새 접속 {log.connects})\n{log.summary()}"
+
+# 대시보드 스크립트의 부분 갱신(fetch) 요청: 리다이렉트 후 대시보드 전체를 다시 읽지 않고 변경분 조회 한 번만 추가됨
+PARTIAL_BUDGETS = [
+    ('alice', '/approve_rental/{requested[2]}', 3, 6),
+    ('alice', '/reject_rental/{requested[3]}', 2, 4),
+    ('carol', '/accept_delivery/{approved_delivery[1]}', 4, 6),
+]
+
+@pytest.mark.parametrize('user_id, url, max_statements, max_round_trips', PARTIAL_BUDGETS,
+                         ids=[f"{b[0]}:{b[1]}" for b in PARTIAL_BUDGETS])
+def test_partial_action_budget(login, measure, seed, user_id, url, max_statements, max_round_trips):
+    client = login(user_id)
+    response, log = measure(client, 'get', url.format(**seed._asdict()), headers={'Accept': 'application/json'})
+
+    assert response.is_json and {'ok', 'messages', 'points', 'rental'} <= response.json.keys(), response.data[:200]
+    assert response.json['rental']['rental_id'] == int(url.rsplit('/', 1)[1].format(**seed._asdict()))
+    assert len(log.statements) <= max_statements, log.summary()
+    assert log.round_trips <= max_round_trips, log.summary()
+
+def test_login_query_budget(flask_app, measure):
+    client = flask_app.app.test_client()
+    response, log = measure(client, 'post', '/login', data={'user_id': 'alice', 'password': 'pw', 'complex_id': 1})
+
+    assert response.status_code == 302
+    assert len(log.statements) <= 1, log.summary()
+    assert log.round_trips <= 2, log.summary()
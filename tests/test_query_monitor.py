@@ -0,0 +1,21 @@
+# ==========================================
+# 느린 쿼리 로그의 실행 계획 수집 (백그라운드)
+# ==========================================
+# 실행 계획은 요청이 끝난 뒤 별도 연결에서 수집되어야 합니다. (요청의 트랜잭션 안에서 문장을 다시 실행하지 않음)
+import json
+
+def test_plans_are_captured_out_of_band(flask_app, login, measure, seed, monkeypatch, caplog):
+    import query_monitor
+    monkeypatch.setitem(query_monitor.SETTINGS, 'slow_query_ms', 0) # 모든 문장을 느린 문장으로
+    monkeypatch.setitem(query_monitor.SETTINGS, 'plan_sample_rate', 1)
+    client = login('bob')
+
+    response, log = measure(client, 'get', f'/rental_timeline/{seed.rented[0]}')
+    assert response.status_code == 200
+    assert not any('EXPLAIN' in s.query or 'SAVEPOINT' in s.query for s in log.statements), log.summary()
+
+    query_monitor._plan_queue.join()
+    events = [json.loads(r.getMessage()) for r in caplog.records if r.name == 'slow_query']
+    plans = [e for e in events if e['type'] == 'statement_plan' and e['route'] == 'rental_timeline']
+    assert plans and all(not e['plan'][0].startswith('plan capture failed') for e in plans), plans
+    assert any('actual time' in line for e in plans for line in e['plan']) # 조회 문장은 ANALYZE
@@ -0,0 +1,54 @@
+# ==========================================
+# 주요 문장의 실행 계획 (인덱스 사용 여부)
+# ==========================================
+# 라우트를 실제로 호출해 실행된 문장(파라미터 포함)을 그대로 가져와, 같은 계정/단지로 EXPLAIN 합니다.
+# 시드에는 운영 단지 규모의 배경 데이터(대부분 종료된 대여)가 깔려 있고 ANALYZE 되어 있으므로,
+# 플래너가 실제로 고르는 계획에 기대한 인덱스가 있는지 확인합니다. (인덱스 삭제, 인덱스를 못 타는 조건으로 바뀐 경우 실패)
+import psycopg2
+import pytest
+
+# (사용자, URL, 문장을 찾을 쿼리 일부, 기대 인덱스)
+KEY_STATEMENTS = [
+    ('alice', '/?tab=home', "SET status = 'overdue'", 'idx_rentals_open'),
+    ('alice', '/?tab=home&category=공구/수리', "AND category = %s", 'idx_items_available_category'),
+    ('alice', '/?tab=owner', "WHERE i.owner_id = %s AND r.status = 'requested'", 'idx_rentals_open'),
+    ('bob', '/?tab=borrower', "WHERE r.borrower_id = %s AND r.status IN ('requested'", 'idx_rentals_borrower'),
+    ('carol', '/?tab=delivery', "r.delivery_option = 'delivery' AND r.delivery_partner_id IS NULL", 'idx_rentals_open'),
+    ('bob', '/rental_timeline/{rented[0]}', "FROM Rental_Events e", 'idx_rental_events_rental'),
+    ('alice', '/history/owner?q=드릴', "WHERE i.owner_id = %s AND r.status IN ('returned', 'disputed')", 'idx_items_owner'),
+    ('carol', '/history/delivery?archive=1', "WHERE r.delivery_partner_id = %s AND r.delivery_status = 'completed'", 'idx_rentals_partner'),
+]
+
+def plan_indexes(statement):
+    """문장을 실행한 연결과 같은 계정/단지 옵션으로 EXPLAIN 하고, 계획에 쓰인 인덱스 이름(파티션 인덱스는 상위 인덱스)을 반환"""
+    conn = psycopg2.connect(**statement.dsn)
+    try:
+        cur = conn.cursor()
+        cur.execute("EXPLAIN (FORMAT JSON) " + statement.sql)
+        plan = cur.fetchone()[0][0]['Plan']
+
+        names, stack = set(), [plan]
+        while stack:
+            node = stack.pop()
+            if 'Index Name' in node:
+                names.add(node['Index Name'])
+            stack.extend(node.get('Plans', []))
+        if not names:
+            return names
+        cur.execute("SELECT COALESCE(pg_partition_root(c.oid), c.oid)::regclass::text FROM pg_class c WHERE c.relname = ANY(%s)",
+                    (list(names),))
+        return names | {r[0] for r in cur.fetchall()}
+    finally:
+        conn.rollback()
+        conn.close()
+
+@pytest.mark.parametrize('user_id, url, fragment, index', KEY_STATEMENTS,
+                         ids=[f"{s[1]}:{s[3]}" for s in KEY_STATEMENTS])
+def test_statement_uses_index(flask_app, login, measure, seed, user_id, url, fragment, index):
+    client = login(user_id)
+    flask_app.catalog_cache.clear() # 앞선 요청의 카탈로그 결과가 캐시되어 있으면 문장이 실행되지 않음
+    response, log = measure(client, 'get', url.format(**seed._asdict()))
+
+    statement = log.find(fragment)
+    used = plan_indexes(statement)
+    assert index in used, f"{statement.query[:200]}\n기대 인덱스 {index}, 실제 {sorted(used) or '인덱스 없음'}"
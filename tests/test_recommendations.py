@@ -0,0 +1,21 @@
+# ==========================================
+# 함께 빌린 물품 추천 (recommendation_job 계산부)
+# ==========================================
+# DB 없이 합성 대여 이력으로 계산부만 확인합니다.
+import numpy as np
+import pytest
+
+import recommendation_job
+
+@pytest.mark.filterwarnings('error::RuntimeWarning')
+def test_items_dropped_by_per_user_cap_are_not_scored(monkeypatch):
+    monkeypatch.setattr(recommendation_job, 'MAX_ITEMS_PER_USER', 2)
+    # 주민 1, 2는 물품 10/11을 함께 빌림. 주민 1이 오래전에 빌린 물품 12는 상한에 밀려 대여가 0건이 됨
+    borrowers = np.array([1, 1, 1, 2, 2])
+    items = np.array([10, 11, 12, 10, 11])
+    age_days = np.array([1, 2, 300, 1, 2])
+
+    source, rank, target, score = recommendation_job.item_cooccurrence(borrowers, items, age_days, 5)
+
+    assert sorted(zip(source.tolist(), target.tolist())) == [(10, 11), (11, 10)]
+    assert list(rank) == [1, 1] and np.all(np.isfinite(score)) and np.allclose(score, 1.0)
@@ -0,0 +1,35 @@
+# ==========================================
+# 데이터 접근 계층 (iter_rows는 서버 측 커서로 나눠 읽고, fetch_all은 컬럼 이름을 모델 필드와 맞춰 봄)
+# ==========================================
+import pytest
+
+import repository
+from conftest import superuser_connect
+
+def test_iter_rows_streams_from_server_cursor(pg_cluster):
+    conn = superuser_connect(pg_cluster)
+    try:
+        cur = conn.cursor()
+        rows = repository.iter_rows(cur, "SELECT g FROM generate_series(1, 7) g", size=3)
+        assert next(rows) == (1,)
+        # 첫 묶음을 받은 뒤에도 결과는 서버의 커서에 남아 있음
+        cur.execute("SELECT name FROM pg_cursors")
+        assert [r[0].startswith('iter_rows_') for r in cur.fetchall()] == [True]
+        assert [r[0] for r in rows] == [2, 3, 4, 5, 6, 7]
+        cur.execute("SELECT count(*) FROM pg_cursors")
+        assert cur.fetchone()[0] == 0
+    finally:
+        conn.close()
+
+def test_fetch_all_rejects_columns_out_of_model_order(pg_cluster):
+    conn = superuser_connect(pg_cluster)
+    try:
+        cur = conn.cursor()
+        rows = repository.fetch_all(cur, repository.OwnedItem,
+                                    "SELECT 1 AS item_id, '드릴' AS name, 100 AS rent_fee, 'available' AS status, NULL AS category")
+        assert rows[0].name == '드릴' and rows[0].category is None
+        with pytest.raises(ValueError):
+            repository.fetch_all(cur, repository.OwnedItem,
+                                 "SELECT 1 AS item_id, 100 AS rent_fee, '드릴' AS name, 'available' AS status, NULL AS category")
+    finally:
+        conn.close()
@@ -0,0 +1,152 @@
+# ==========================================
+# 포인트 정산 트랜잭션 (행 잠금 순서 + 교착/직렬화 실패 재시도)
+# ==========================================
+# 같은 물품의 경쟁 신청을 동시에 승인해도 교착 없이 한 건만 승인되어야 하고, 반납 신청을 두 번 보내도 배송비는 한 번만 결제되어야 합니다.
+# 재시도 실행기는 처음 몇 번 40001을 내는 임시 함수로 재시도/포기 횟수를 확인합니다.
+import threading
+import time
+from datetime import date, timedelta
+
+import psycopg2
+import pytest
+
+from conftest import superuser_connect
+
+def resident_id(cur, user_id):
+    cur.execute("SELECT resident_id FROM Residents WHERE user_id = %s", (user_id,))
+    return cur.fetchone()[0]
+
+def test_competing_approvals_do_not_deadlock(pg_cluster, seed):
+    conn = superuser_connect(pg_cluster, complex_id=seed.complex_id)
+    try:
+        cur = conn.cursor()
+        owner = resident_id(cur, 'user11')
+        cur.execute("""
+            INSERT INTO Items (owner_id, name, category, description, rent_fee)
+            VALUES (%s, '동시 승인 물품', '공구/수리', '-', 100) RETURNING item_id
+        """, (owner,))
+        item_id = cur.fetchone()[0]
+        rental_ids = []
+        for borrower in ('user12', 'user13'):
+            cur.execute("""
+                INSERT INTO Rentals (item_id, borrower_id, start_date, end_date, status, delivery_option, delivery_status)
+                VALUES (%s, %s, CURRENT_DATE, CURRENT_DATE + 2, 'requested', 'pickup', 'pending') RETURNING rental_id
+            """, (item_id, resident_id(cur, borrower)))
+            rental_ids.append(cur.fetchone()[0])
+        conn.commit()
+    finally:
+        conn.close()
+
+    # 물품 행을 잠가 두고 두 승인이 모두 잠금을 기다리게 한 뒤 풀어서, 두 트랜잭션이 확실히 겹치게 함
+    blocker = superuser_connect(pg_cluster, complex_id=seed.complex_id)
+    blocker_cur = blocker.cursor()
+    blocker_cur.execute("SELECT 1 FROM Items WHERE item_id = %s FOR UPDATE", (item_id,))
+
+    outcomes = {}
+    def approve(rental_id):
+        worker = superuser_connect(pg_cluster, complex_id=seed.complex_id)
+        try:
+            cur = worker.cursor()
+            cur.execute("SELECT approve_rental(%s, %s)", (rental_id, owner))
+            worker.commit()
+            outcomes[rental_id] = 'approved'
+        except psycopg2.Error as e:
+            worker.rollback()
+            outcomes[rental_id] = e.pgcode
+        finally:
+            worker.close()
+
+    threads = [threading.Thread(target=approve, args=(rental_id,)) for rental_id in rental_ids]
+    for t in threads:
+        t.start()
+    monitor = superuser_connect(pg_cluster)
+    monitor.autocommit = True
+    try:
+        cur = monitor.cursor()
+        for _ in range(500):
+            cur.execute("SELECT count(*) FROM pg_stat_activity WHERE query LIKE 'SELECT approve_rental%%' "
+                        "AND wait_event_type = 'Lock'")
+            if cur.fetchone()[0] == len(threads):
+                break
+            time.sleep(0.01)
+    finally:
+        monitor.close()
+    blocker.rollback()
+    blocker.close()
+    for t in threads:
+        t.join()
+
+    # 먼저 물품을 잠근 쪽만 승인, 다른 쪽은 자동 거절된 상태를 보고 P0001로 멈춤 (교착 40P01이 아님)
+    assert sorted(outcomes.values()) == ['P0001', 'approved'], outcomes
+    conn = superuser_connect(pg_cluster, complex_id=seed.complex_id)
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT status FROM Rentals WHERE rental_id = ANY(%s) ORDER BY status", (rental_ids,))
+        assert [r[0] for r in cur.fetchall()] == ['approved', 'rejected']
+    finally:
+        conn.close()
+
+def test_double_return_request_charges_once(login, pg_cluster, seed):
+    conn = superuser_connect(pg_cluster, complex_id=seed.complex_id)
+    try:
+        cur = conn.cursor()
+        borrower = resident_id(cur, 'user14')
+        cur.execute("""
+            INSERT INTO Items (owner_id, name, category, description, rent_fee, status)
+            VALUES (%s, '반납 신청 물품', '공구/수리', '-', 100, 'rented') RETURNING item_id
+        """, (resident_id(cur, 'user15'),))
+        cur.execute("""
+            INSERT INTO Rentals (item_id, borrower_id, start_date, end_date, status, delivery_option, delivery_status)
+            VALUES (%s, %s, %s, %s, 'rented', 'pickup', 'completed') RETURNING rental_id
+        """, (cur.fetchone()[0], borrower, date.today(), date.today() + timedelta(days=3)))
+        rental_id = cur.fetchone()[0]
+        cur.execute("SELECT points FROM Residents WHERE resident_id = %s", (borrower,))
+        before = cur.fetchone()[0]
+        conn.commit()
+
+        client = login('user14')
+        for _ in range(2):
+            response = client.post(f'/request_return/{rental_id}', data={'delivery_option': 'delivery'})
+            assert response.status_code == 302
+
+        cur.execute("SELECT points FROM Residents WHERE resident_id = %s", (borrower,))
+        assert cur.fetchone()[0] == before - 500
+        cur.execute("SELECT delivery_status, delivery_fee FROM Rentals WHERE rental_id = %s", (rental_id,))
+        assert cur.fetchone() == ('waiting_driver', 500)
+    finally:
+        conn.close()
+
+@pytest.fixture
+def flaky(flask_app, pg_cluster, seed, monkeypatch):
+    """처음 failures번 호출은 직렬화 실패(40001)를 내는 임시 함수가 있는 연결"""
+    monkeypatch.setitem(flask_app.TX_RETRY, 'base_delay_s', 0.001)
+    conn = superuser_connect(pg_cluster, complex_id=seed.complex_id)
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TEMP SEQUENCE flaky_calls;
+        CREATE FUNCTION pg_temp.flaky(failures INT) RETURNS INT LANGUAGE plpgsql AS $$
+        DECLARE n INT := nextval('flaky_calls');
+        BEGIN
+            IF n <= failures THEN RAISE EXCEPTION 'conflict' USING ERRCODE = '40001'; END IF;
+            RETURN n;
+        END $$;
+    """)
+    conn.commit()
+    cur.close()
+    with flask_app.app.test_request_context():
+        yield conn
+    conn.close()
+
+def test_runner_retries_serialization_failures(flask_app, flaky):
+    before = flask_app.transaction_stats()
+    assert flask_app.run_transition(flaky, "SELECT pg_temp.flaky(%s)", (2,)) == (3,)
+    after = flask_app.transaction_stats()
+    assert (after['retries'] - before['retries'], after['aborts'] - before['aborts']) == (2, 0)
+
+def test_runner_gives_up_after_max_attempts(flask_app, flaky):
+    before = flask_app.transaction_stats()
+    with pytest.raises(psycopg2.errors.SerializationFailure):
+        flask_app.run_transition(flaky, "SELECT pg_temp.flaky(%s)", (100,))
+    after = flask_app.transaction_stats()
+    attempts = flask_app.TX_RETRY['max_attempts']
+    assert (after['retries'] - before['retries'], after['aborts'] - before['aborts']) == (attempts - 1, 1)
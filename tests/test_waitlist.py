@@ -0,0 +1,39 @@
+# ==========================================
+# 대기열 (차례가 된 신청이 거절되면 다음 주민에게)
+# ==========================================
+from conftest import superuser_connect
+
+def test_rejecting_promoted_request_advances_the_queue(login, pg_cluster, seed):
+    conn = superuser_connect(pg_cluster, complex_id=seed.complex_id)
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT user_id, resident_id FROM Residents WHERE user_id IN ('user31', 'user32', 'user33')")
+        ids = dict(cur.fetchall())
+        cur.execute("""
+            INSERT INTO Items (owner_id, name, category, description, rent_fee, status)
+            VALUES (%s, '대기열 물품', '공구/수리', '-', 100, 'rented') RETURNING item_id
+        """, (ids['user31'],))
+        item_id = cur.fetchone()[0]
+        cur.executemany("INSERT INTO Waitlist (item_id, resident_id, days, delivery_option) VALUES (%s, %s, 2, 'pickup')",
+                        [(item_id, ids['user32']), (item_id, ids['user33'])])
+        cur.execute("UPDATE Items SET status = 'available' WHERE item_id = %s", (item_id,)) # 반납 확정과 같은 전이
+        conn.commit()
+
+        def queue():
+            cur.execute("""
+                SELECT w.resident_id, w.status, r.status FROM Waitlist w LEFT JOIN Rentals r ON r.rental_id = w.rental_id
+                WHERE w.item_id = %s ORDER BY w.entry_id
+            """, (item_id,))
+            rows = cur.fetchall()
+            conn.commit()
+            return rows
+
+        assert queue() == [(ids['user32'], 'promoted', 'requested'), (ids['user33'], 'waiting', None)]
+        cur.execute("SELECT rental_id FROM Waitlist WHERE item_id = %s AND status = 'promoted'", (item_id,))
+        promoted = cur.fetchone()[0]
+
+        login('user31').get(f'/reject_rental/{promoted}')
+
+        assert queue() == [(ids['user32'], 'promoted', 'rejected'), (ids['user33'], 'promoted', 'requested')]
+    finally:
+        conn.close()
@@ -0,0 +1,106 @@
+# ==========================================
+# 썸네일 생성 워커 (Thumbnail Worker)
+# ==========================================
+# 업로드 요청은 원본을 저장하고 Attachments에 thumb_status = 'pending' 행만 남깁니다.
+# 이 워커가 별도 프로세스로 대기 중인 행을 배치로 가져가 썸네일(JPEG)을 만들고 'ready'로 표시합니다.
+#   - 썸네일도 내용 해시 경로에 저장하므로, 같은 사진이 여러 번 첨부되어도 한 번만 만듭니다.
+#   - 여러 워커를 동시에 띄워도 FOR UPDATE SKIP LOCKED로 같은 행을 나눠 가지지 않습니다.
+#   - 썸네일이 만들어지기 전에는 /media/thumb/ 요청에 원본이 짧은 캐시로 제공됩니다.
+#   - 단지마다 접속을 따로 두고 번갈아 처리합니다. (새 단지를 추가하면 워커를 다시 시작)
+#
+# 사용법: python thumbnail_worker.py [--once]
+import os
+import sys
+import tempfile
+import time
+
+import media_store
+from app import MANAGER_CONF, connect_complex, list_complexes
+
+try:
+    from PIL import Image, ImageOps
+except ImportError: # 썸네일 워커에서만 쓰는 선택 의존성 (웹 서버에는 필요 없음)
+    raise SystemExit("[thumbnail_worker] Pillow가 필요합니다: pip install pillow")
+
+SETTINGS = {
+    'batch_size': 20,
+    'poll_interval_s': 2,
+    'jpeg_quality': 80,
+}
+
+def make_thumbnail(sha256):
+    """원본으로 썸네일 파일을 만듦 (이미 있으면 건너뜀)"""
+    dest = media_store.thumb_path(sha256)
+    if os.path.exists(dest):
+        return
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    with Image.open(media_store.original_path(sha256)) as img:
+        img.draft('RGB', media_store.SETTINGS['thumb_size']) # JPEG는 축소 디코딩으로 빠르게 읽음
+        img = ImageOps.exif_transpose(img)                   # 휴대폰 사진의 회전 정보 반영
+        img.thumbnail(media_store.SETTINGS['thumb_size'])
+        # 다 쓴 파일만 보이도록 임시 파일에 쓰고 이름을 바꿈
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dest), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                img.convert('RGB').save(out, 'JPEG', quality=SETTINGS['jpeg_quality'], optimize=True)
+            os.replace(tmp, dest)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+def drain_once(conn):
+    """대기 중인 썸네일을 한 배치 만들고 (성공 수, 실패 수)를 반환"""
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT attachment_id, sha256
+            FROM Attachments
+            WHERE thumb_status = 'pending'
+            ORDER BY attachment_id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        """, (SETTINGS['batch_size'],))
+        rows = cur.fetchall()
+
+        ready, failed = [], []
+        for attachment_id, sha256 in rows:
+            try:
+                make_thumbnail(sha256)
+                ready.append(attachment_id)
+            except Exception as e:
+                print(f"[thumbnail_worker] {sha256} 실패: {e}")
+                failed.append(attachment_id)
+
+        if ready:
+            cur.execute("UPDATE Attachments SET thumb_status = 'ready' WHERE attachment_id = ANY(%s)", (ready,))
+        if failed:
+            cur.execute("UPDATE Attachments SET thumb_status = 'failed' WHERE attachment_id = ANY(%s)", (failed,))
+        conn.commit()
+        return len(ready), len(failed)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+def run(once=False):
+    conns = {complex_id: connect_complex(MANAGER_CONF, complex_id) for complex_id, _ in list_complexes()}
+    try:
+        while True:
+            busy = False
+            for complex_id, conn in conns.items():
+                ready, failed = drain_once(conn)
+                if ready or failed:
+                    print(f"[thumbnail_worker:{complex_id}] 생성 {ready}건, 실패 {failed}건")
+                busy = busy or ready + failed >= SETTINGS['batch_size']
+            if busy:
+                continue
+            if once:
+                break
+            time.sleep(SETTINGS['poll_interval_s'])
+    finally:
+        for conn in conns.values():
+            conn.close()
+
+if __name__ == '__main__':
+    run(once='--once' in sys.argv)